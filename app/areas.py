@@ -0,0 +1,131 @@
+"""Дерево районов (pereval_areas) для GET /areas и выборки перевалов района со всеми подрайонами.
+
+Иерархия хранится списком смежности (id_parent) и таблицей замыкания pereval_area_closure:
+строка (ancestor_id, descendant_id, depth) на каждую пару "район - его потомок", включая
+сам район с depth = 0. Перевалы района и всех подрайонов выбираются одним запросом с JOIN
+по замыканию, без рекурсивного обхода. Таблицу замыкания ведут пути записи в app.crud;
+пересчитать ее целиком можно командой python -m app.manage rebuild-areas.
+
+Само дерево нужно для ответов GET /areas и проверки id района; оно кэшируется в памяти
+процесса (AreaTreeCache). Каждое изменение районов увеличивает номер версии дерева в БД,
+кэш сверяет его не чаще раза в AREA_TREE_CHECK_SECONDS и перечитывает дерево, если номер
+изменился; в процессе, который сам изменил районы, кэш сбрасывается сразу.
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from app.config import AREA_TREE_CHECK_SECONDS
+
+
+def parents(rows: Iterable[Tuple[int, int, Optional[str]]]) -> Dict[int, Optional[int]]:
+    """id района -> id родителя по строкам (id, id_parent, title); None - корень.
+
+    Как в исходных данных ФСТР, корнем считается район, у которого id_parent указывает на себя
+    или на несуществующий район (обычно 0).
+    """
+    rows = list(rows)
+    ids = {area_id for area_id, _, _ in rows}
+    return {area_id: parent_id if parent_id in ids and parent_id != area_id else None
+            for area_id, parent_id, _ in rows}
+
+
+def closure_rows(rows: Iterable[Tuple[int, int, Optional[str]]]) -> List[dict]:
+    """Строки pereval_area_closure для всего дерева - для полного пересчета."""
+    parent_of = parents(rows)
+    result = []
+    for area_id in parent_of:
+        ancestor_id, depth, seen = area_id, 0, set()
+        # seen: цикл в id_parent (ручная правка БД) не должен зациклить пересчет
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            result.append({"ancestor_id": ancestor_id, "descendant_id": area_id, "depth": depth})
+            ancestor_id, depth = parent_of[ancestor_id], depth + 1
+    return result
+
+
+class AreaTree:
+    """Неизменяемый снимок дерева районов с номером версии, из которой он прочитан."""
+
+    def __init__(self, version: int, rows: Iterable[Tuple[int, int, Optional[str]]]):
+        rows = list(rows)
+        self.version = version
+        self.titles = {area_id: title for area_id, _, title in rows}
+        self.parent_of = parents(rows)
+        self.children = defaultdict(list)
+        for area_id in sorted(self.parent_of):
+            self.children[self.parent_of[area_id]].append(area_id)
+
+    def __contains__(self, area_id: int) -> bool:
+        return area_id in self.parent_of
+
+    def path(self, area_id: int) -> List[dict]:
+        """Предки района от корня, без самого района."""
+        result = []
+        parent_id = self.parent_of[area_id]
+        while parent_id is not None and len(result) < len(self.parent_of):
+            result.append({"id": parent_id, "title": self.titles[parent_id]})
+            parent_id = self.parent_of[parent_id]
+        return result[::-1]
+
+    def node(self, area_id: int, depth: Optional[int] = None) -> dict:
+        """Район с вложенными подрайонами; depth ограничивает глубину (0 - без подрайонов)."""
+        children = []
+        if depth is None or depth > 0:
+            children = [self.node(child_id, None if depth is None else depth - 1)
+                        for child_id in self.children.get(area_id, ())]
+        return {"id": area_id, "title": self.titles[area_id], "parent_id": self.parent_of[area_id],
+                "children": children}
+
+    def roots(self, depth: Optional[int] = None) -> List[dict]:
+        return [self.node(area_id, depth) for area_id in self.children.get(None, ())]
+
+    def is_descendant(self, area_id: int, ancestor_id: int) -> bool:
+        """area_id совпадает с ancestor_id или лежит в его поддереве."""
+        seen = set()
+        while area_id is not None and area_id not in seen:
+            if area_id == ancestor_id:
+                return True
+            seen.add(area_id)
+            area_id = self.parent_of[area_id]
+        return False
+
+
+class AreaTreeCache:
+    """Дерево районов в памяти процесса с проверкой версии не чаще раза в check_seconds."""
+
+    def __init__(self, check_seconds: float = AREA_TREE_CHECK_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.check_seconds = check_seconds
+        self.clock = clock
+        self.loads = 0
+        self._tree = None
+        self._checked_at = 0.0
+        # Растет при каждом сбросе: дерево, прочитанное до сброса, не попадет в кэш после него
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, load_version: Callable[[], int],
+            load_rows: Callable[[], Iterable[Tuple[int, int, Optional[str]]]]) -> AreaTree:
+        with self._lock:
+            tree, checked_at, generation = self._tree, self._checked_at, self._generation
+        now = self.clock()
+        if tree is not None and now - checked_at < self.check_seconds:
+            return tree
+        # Версия читается до районов: дерево не старше своего номера версии
+        version = load_version()
+        if tree is None or tree.version != version:
+            tree = AreaTree(version, load_rows())
+            self.loads += 1
+        with self._lock:
+            if generation == self._generation:
+                self._tree, self._checked_at = tree, now
+        return tree
+
+    def invalidate(self) -> None:
+        """Вызывается после фиксации изменения районов в этом процессе."""
+        with self._lock:
+            self._tree = None
+            self._generation += 1
+
+
+area_tree = AreaTreeCache()
@@ -0,0 +1,217 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from app.config import CACHE_BACKEND, CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, REDIS_URL, USER_CACHE_SIZE
+
+
+class CacheBackend:
+    evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class NullCacheBackend(CacheBackend):
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """LRU в памяти процесса, ограниченный числом записей и суммарным размером, с TTL."""
+
+    def __init__(self, max_entries: int, max_bytes: int, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= self.clock():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (self.clock() + ttl, value)
+            self._bytes += len(value)
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= len(item[1])
+
+
+class RedisCacheBackend(CacheBackend):
+    """Обертка над клиентом с интерфейсом Redis (get, set с ex, delete, scan_iter).
+
+    Вытеснением и TTL управляет сам Redis (maxmemory-policy allkeys-lru).
+    """
+
+    def __init__(self, client, prefix: str = "fstr:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class ResponseCache:
+    """Кэш сериализованных ответов со счетчиками попаданий, промахов и сбросов.
+
+    Ключи включают версию записи (detail_cache_key), поэтому ответ для старой версии
+    не может быть отдан после изменения; сброс лишь освобождает место.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int, namespace: str):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key) -> Optional[bytes]:
+        value = self.backend.get(self._key(key))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value: bytes) -> None:
+        self.backend.set(self._key(key), value, self.ttl)
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self.invalidations += 1
+        self.backend.delete(self._key(key))
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class IdCache:
+    """Ограниченный LRU ключ -> id в памяти процесса, без TTL.
+
+    Подходит для неизменяемых соответствий (email -> id пользователя). Заполнять его
+    нужно только после фиксации транзакции, иначе после отката останется id несуществующей строки.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[int]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value: int) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def detail_cache_key(pereval_id: int, version: int) -> str:
+    return f"{pereval_id}:{version}"
+
+
+def build_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    if kind == "memory":
+        return InMemoryCacheBackend(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+    if kind == "redis":
+        import redis
+        return RedisCacheBackend(redis.Redis.from_url(REDIS_URL))
+    if kind == "none":
+        return NullCacheBackend()
+    raise ValueError(f"Неизвестный кэш: {kind}")
+
+
+pereval_cache = ResponseCache(build_backend(), CACHE_TTL, "pereval")
+user_id_cache = IdCache(USER_CACHE_SIZE)
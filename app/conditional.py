@@ -0,0 +1,24 @@
+import hashlib
+from typing import Iterable, Optional, Tuple
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Для If-None-Match применяется слабое сравнение: W/"x" совпадает с "x"
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def pereval_etag(pereval_id: int, version: int, fields: Optional[Iterable[str]] = None) -> str:
+    # Частичный ответ - другое представление, у него свой ETag
+    if fields is not None:
+        return f'"{pereval_id}-{version}-{"+".join(fields)}"'
+    return f'"{pereval_id}-{version}"'
+
+
+def list_etag(versions: Iterable[Tuple[int, int]]) -> str:
+    digest = hashlib.sha256(",".join(f"{pereval_id}-{version}" for pereval_id, version in versions).encode())
+    return f'"{digest.hexdigest()[:32]}"'
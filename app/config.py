@@ -0,0 +1,109 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv('.env')
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+DB_HOST = os.getenv("FSTR_DB_HOST")
+DB_PORT = os.getenv("FSTR_DB_PORT")
+DB_NAME = os.getenv("FSTR_DB_NAME")
+DB_LOGIN = os.getenv("FSTR_DB_LOGIN")
+DB_PASS = os.getenv("FSTR_DB_PASS")
+
+DATABASE_URL = os.getenv("FSTR_DB_URL") or f"postgresql://{DB_LOGIN}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Асинхронный режим: маршруты работают через AsyncSession и асинхронный драйвер (asyncpg)
+DB_ASYNC = env_bool("FSTR_DB_ASYNC")
+ASYNC_DATABASE_URL = (os.getenv("FSTR_DB_ASYNC_URL")
+                      or f"postgresql+asyncpg://{DB_LOGIN}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+# Реплики только для чтения (через запятую): GET и HEAD распределяются по ним по кругу
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("FSTR_DB_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_ASYNC_URLS = [url.strip() for url in os.getenv("FSTR_DB_REPLICA_ASYNC_URLS", "").split(",")
+                         if url.strip()]
+# Сколько секунд после записи чтения клиента идут на основную БД (задержка репликации)
+DB_REPLICA_STICKY_SECONDS = int(os.getenv("FSTR_DB_REPLICA_STICKY_SECONDS", 10))
+# Через сколько секунд снова пробовать недоступную реплику
+DB_REPLICA_RETRY_SECONDS = int(os.getenv("FSTR_DB_REPLICA_RETRY_SECONDS", 30))
+
+# Размер порции, которой изображение читается из БД и отдается клиенту
+IMAGE_CHUNK_SIZE = int(os.getenv("FSTR_IMAGE_CHUNK_SIZE", 64 * 1024))
+
+# Обработка изображений при приеме (app.imaging): процессов в пуле (0 - в потоке запроса),
+# предел размера в пикселях, сегмент EXIF больше этого числа байт удаляется (JPEG; сегмент - до 64 КБ)
+IMAGE_WORKERS = int(os.getenv("FSTR_IMAGE_WORKERS", os.cpu_count() or 1))
+IMAGE_MAX_PIXELS = int(os.getenv("FSTR_IMAGE_MAX_PIXELS", 50_000_000))
+IMAGE_MAX_EXIF_BYTES = int(os.getenv("FSTR_IMAGE_MAX_EXIF_BYTES", 16 * 1024))
+# Миниатюры GET /images/{id}/thumbnail: JPEG, вписанный в квадрат со стороной IMAGE_THUMBNAIL_SIZE
+IMAGE_THUMBNAIL_SIZE = int(os.getenv("FSTR_IMAGE_THUMBNAIL_SIZE", 256))
+IMAGE_THUMBNAIL_QUALITY = int(os.getenv("FSTR_IMAGE_THUMBNAIL_QUALITY", 80))
+
+# Хранилище содержимого изображений: db - таблица image_blobs, local - файлы в IMAGE_DIR
+IMAGE_STORAGE = os.getenv("FSTR_IMAGE_STORAGE", "db")
+IMAGE_DIR = os.getenv("FSTR_IMAGE_DIR", "media/images")
+
+# Максимальное число перевалов в одном запросе POST /submitData/batch
+BATCH_MAX_ITEMS = int(os.getenv("FSTR_BATCH_MAX_ITEMS", 1000))
+# Максимум записей в одном захвате и одном решении модератора
+MODERATION_MAX_ITEMS = int(os.getenv("FSTR_MODERATION_MAX_ITEMS", 100))
+
+# Размер страницы списка перевалов пользователя (GET /submitData/?user__email=)
+LIST_DEFAULT_LIMIT = int(os.getenv("FSTR_LIST_DEFAULT_LIMIT", 100))
+LIST_MAX_LIMIT = int(os.getenv("FSTR_LIST_MAX_LIMIT", 1000))
+
+# Кэш ответов GET /submitData/{id}: memory - LRU в процессе, redis - общий для всех воркеров, none - выключен
+CACHE_BACKEND = os.getenv("FSTR_CACHE_BACKEND", "memory")
+CACHE_TTL = int(os.getenv("FSTR_CACHE_TTL", 300))
+CACHE_MAX_ENTRIES = int(os.getenv("FSTR_CACHE_MAX_ENTRIES", 10000))
+CACHE_MAX_BYTES = int(os.getenv("FSTR_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Кэш email -> id пользователя в памяти процесса; 0 - выключен
+USER_CACHE_SIZE = int(os.getenv("FSTR_USER_CACHE_SIZE", 10000))
+REDIS_URL = os.getenv("FSTR_REDIS_URL", "redis://localhost:6379/0")
+
+# Число строк, которое выгрузка GET /export читает из БД за один раз
+EXPORT_CHUNK_SIZE = int(os.getenv("FSTR_EXPORT_CHUNK_SIZE", 1000))
+
+# GET /sync: изменений в одном ответе и сколько секунд курсор не сдвигается за свежие изменения.
+# Номер изменения берется до фиксации транзакции, поэтому запись с меньшим seq может стать
+# видна позже записи с большим; окно должно быть больше самой долгой пишущей транзакции
+SYNC_MAX_CHANGES = int(os.getenv("FSTR_SYNC_MAX_CHANGES", 500))
+SYNC_SETTLE_SECONDS = int(os.getenv("FSTR_SYNC_SETTLE_SECONDS", 30))
+
+# GET /stats: ширина диапазона высоты в метрах; после изменения нужен python -m app.manage rebuild-stats
+STATS_HEIGHT_BAND = int(os.getenv("FSTR_STATS_HEIGHT_BAND", 500))
+
+# Дерево районов (app.areas) кэшируется в памяти процесса; не чаще раза в столько секунд
+# сверяется номер версии дерева в БД, чтобы увидеть изменения, сделанные другими процессами
+AREA_TREE_CHECK_SECONDS = float(os.getenv("FSTR_AREA_TREE_CHECK_SECONDS", 5))
+
+# Прием POST /submitData/: sync - запись в БД в запросе; queue - в локальную очередь (app.ingest),
+# из которой фоновый поток переносит перевалы в БД пакетами, клиент получает 202 и квитанцию
+INGEST_MODE = os.getenv("FSTR_INGEST_MODE", "sync")
+INGEST_QUEUE_PATH = os.getenv("FSTR_INGEST_QUEUE_PATH", "ingest_queue.sqlite3")
+# Перевалов в одной транзакции записи в БД
+INGEST_BATCH_SIZE = int(os.getenv("FSTR_INGEST_BATCH_SIZE", 200))
+# Через сколько секунд взятые, но не записанные перевалы снова берутся в работу
+INGEST_LEASE_SECONDS = int(os.getenv("FSTR_INGEST_LEASE_SECONDS", 300))
+# Пауза после ошибки соединения с БД; удваивается до INGEST_RETRY_MAX_SECONDS
+INGEST_RETRY_SECONDS = float(os.getenv("FSTR_INGEST_RETRY_SECONDS", 1))
+INGEST_RETRY_MAX_SECONDS = float(os.getenv("FSTR_INGEST_RETRY_MAX_SECONDS", 60))
+# Сколько дней хранятся квитанции записанных и отклоненных перевалов
+INGEST_TICKET_DAYS = int(os.getenv("FSTR_INGEST_TICKET_DAYS", 7))
+
+# Запрос, выполнивший больше SQL-запросов, попадает в журнал с предупреждением (признак N+1)
+QUERY_COUNT_WARNING = int(os.getenv("FSTR_QUERY_COUNT_WARNING", 50))
+
+# Поиск по названиям: auto - tsvector/pg_trgm в PostgreSQL и индекс в памяти для остальных СУБД,
+# memory - всегда индекс в памяти процесса
+TEXT_SEARCH = os.getenv("FSTR_TEXT_SEARCH", "auto")
+# Сколько лучших совпадений из индекса в памяти проверяется при фильтре по высоте
+TEXT_SEARCH_CANDIDATES = int(os.getenv("FSTR_TEXT_SEARCH_CANDIDATES", 1000))
+# Сколько названий индекс в памяти проверяет на один запрос; остальные кандидаты - совпадения слабее найденных
+TEXT_SEARCH_MAX_CHECKED = int(os.getenv("FSTR_TEXT_SEARCH_MAX_CHECKED", 3000))
@@ -1,150 +1,855 @@
-from sqlalchemy.orm import Session, joinedload
-from app.schemas import PerevalCreate, PerevalResponse, PerevalUpdate
-from app.models import PerevalAdded, User, Coords, Image, PerevalImages
+from sqlalchemy.orm import Session, aliased, joinedload, load_only, noload, selectinload, undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from app.schemas import AreaCreate, AreaUpdate, PerevalCreate, PerevalResponse, PerevalUpdate
+from app.models import (PerevalAdded, PerevalAreaClosure, PerevalAreas, PerevalAreaVersion, PerevalChange,
+                        PerevalStat, User, Coords, Image, ImageBlob, PerevalImages)
+from app import areas, imaging, stats, storage
+from app.cache import pereval_cache, detail_cache_key, user_id_cache
+from app.database import dialect_insert
+from app.search import normalize, search_text, title_index
+from app.config import (LIST_DEFAULT_LIMIT, EXPORT_CHUNK_SIZE, TEXT_SEARCH, TEXT_SEARCH_CANDIDATES, SYNC_MAX_CHANGES,
+                        SYNC_SETTLE_SECONDS)
+from app.geo import (CELL_DEGREES, KM_PER_DEGREE, MAX_DISTANCE_KM, cell_of, grid_cells, haversine_km,
+                     longitude_ranges, radius_bbox)
+from sqlalchemy import bindparam, delete, func, insert, literal, literal_column, select, text, true, update, and_, or_
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
 import base64
+import io
+import math
 from fastapi import HTTPException
 
 
+@dataclass
+class ImageUpload:
+    """Изображение, поступившее в запросе: название и двоичный файл с содержимым.
+
+    processed заполняет app.imaging.prepare_uploads: размеры и миниатюра.
+    """
+    title: str
+    file: BinaryIO
+    processed: Optional[imaging.ProcessedImage] = None
+    _hashed: Optional[Tuple[BinaryIO, str]] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_base64(cls, img: str, title: str) -> "ImageUpload":
+        return cls(title=title, file=io.BytesIO(base64.b64decode(img, validate=True)))
+
+    def content_hash(self) -> str:
+        """SHA-256 содержимого; файл читается один раз (после удаления EXIF file - новый файл)."""
+        if self._hashed is None or self._hashed[0] is not self.file:
+            self._hashed = (self.file, storage.hash_file(self.file).content_hash)
+        return self._hashed[1]
+
+
+def _prepare_uploads(uploads: List[ImageUpload]) -> None:
+    """Проверяет изображения и строит миниатюры в пуле процессов; InvalidImage для первого некорректного."""
+    for error in imaging.prepare_uploads(uploads):
+        if error is not None:
+            raise error
+
+
+def _decode_batch_uploads(perevals: List[PerevalCreate]) -> list:
+    """Изображения каждого перевала пакета или текст ошибки декодирования."""
+    decoded = []
+    for pereval_data in perevals:
+        try:
+            decoded.append([ImageUpload.from_base64(image_data.img, image_data.title)
+                            for image_data in pereval_data.images])
+        except ValueError as e:
+            decoded.append(f"Ошибка декодирования изображения: {e}")
+    return decoded
+
+
+def _flat_uploads(decoded: list) -> List[ImageUpload]:
+    return [upload for item in decoded if not isinstance(item, str) for upload in item]
+
+
+def _with_image_errors(decoded: list, errors: list) -> list:
+    """Заменяет изображения перевала текстом ошибки, если хотя бы одно из них некорректно.
+
+    errors - результат prepare_uploads для _flat_uploads(decoded).
+    """
+    errors = iter(errors)
+    result = []
+    for item in decoded:
+        if isinstance(item, str):
+            result.append(item)
+            continue
+        error = next((error for error in [next(errors) for _ in item] if error is not None), None)
+        result.append(f"Некорректное изображение: {error}" if error is not None else item)
+    return result
+
+
+def _image_ref(image_id: int, title: Optional[str], size: Optional[int], content_hash: Optional[str],
+               mime_type: Optional[str], width: Optional[int], height: Optional[int],
+               thumbnail_hash: Optional[str]) -> dict:
+    return {"id": image_id, "title": title, "size": size, "content_hash": content_hash, "mime_type": mime_type,
+            "width": width, "height": height, "url": f"/images/{image_id}",
+            "thumbnail_url": f"/images/{image_id}/thumbnail" if thumbnail_hash else None}
+
+
+def _insert_images(db: Session, flat_uploads: List[Tuple[int, int, ImageUpload]]) -> None:
+    """Сохраняет изображения (id перевала, позиция в его списке, загрузка) многострочными
+    INSERT: число запросов не зависит от числа изображений."""
+    if not flat_uploads:
+        return
+    blobs = storage.store_blobs(db, [upload.file for _, _, upload in flat_uploads])
+    processed = [upload.processed for _, _, upload in flat_uploads]
+    thumbnails = storage.store_blobs(db, [io.BytesIO(item.thumbnail) for item in processed if item])
+    thumbnail_hashes = iter(thumbnail.content_hash for thumbnail in thumbnails)
+    image_ids = _insert_returning_ids(db, Image, [
+        {"title": upload.title, "size": blob.size, "content_hash": blob.content_hash,
+         "mime_type": blob.mime_type, "width": item.width if item else None,
+         "height": item.height if item else None,
+         "thumbnail_hash": next(thumbnail_hashes) if item else None}
+        for (_, _, upload), blob, item in zip(flat_uploads, blobs, processed)
+    ], ("title", "content_hash"))
+    db.execute(insert(PerevalImages), [
+        {"id_pereval": pereval_id, "id_image": image_id, "position": position}
+        for (pereval_id, position, _), image_id in zip(flat_uploads, image_ids)
+    ])
+
+
+def _image_hashes(db: Session, pereval_id: int) -> set:
+    return {content_hash for (content_hash,) in db.query(Image.content_hash).join(
+        PerevalImages, PerevalImages.id_image == Image.id).filter(PerevalImages.id_pereval == pereval_id)}
+
+
+def _replace_images(db: Session, pereval_id: int, uploads: List[ImageUpload],
+                    errors: Optional[list] = None) -> None:
+    """Приводит изображения перевала к списку uploads, сравнивая содержимое по SHA-256.
+
+    Изображения с тем же содержимым остаются на месте (меняются только название и позиция),
+    новые добавляются, лишние удаляются запросами над множествами; содержимое пишется только
+    для действительно новых изображений. Порядок изображений становится порядком uploads.
+    errors - уже известные ошибки обработки по позициям uploads (асинхронный вариант).
+    InvalidImage - новое изображение некорректно.
+    """
+    current = defaultdict(list)
+    for image in db.query(Image.id, Image.title, Image.content_hash, Image.thumbnail_hash,
+                          PerevalImages.position).join(
+            PerevalImages, PerevalImages.id_image == Image.id).filter(
+            PerevalImages.id_pereval == pereval_id).order_by(PerevalImages.position, Image.id):
+        current[image.content_hash].append(image)
+
+    def match(pending: List[Tuple[int, ImageUpload]]) -> List[Tuple[int, ImageUpload]]:
+        unmatched = []
+        for position, upload in pending:
+            same = current.get(upload.content_hash())
+            if same:
+                image = same.pop(0)
+                if image.title != upload.title:
+                    renamed.append({"id": image.id, "title": upload.title})
+                if image.position != position:
+                    moved.append({"image_id": image.id, "new_position": position})
+            else:
+                unmatched.append((position, upload))
+        return unmatched
+
+    renamed = []
+    moved = []
+    added = match(list(enumerate(uploads)))
+    if added:
+        # Некорректное изображение, уже разобранное асинхронным вариантом, повторно не разбирается
+        for position, _ in added:
+            if errors is not None and errors[position] is not None:
+                raise errors[position]
+        _prepare_uploads([upload for _, upload in added])
+        # Из JPEG с большим EXIF содержимое сохранялось уже без него: сравнивается еще раз
+        added = match(added)
+    removed = [image for images in current.values() for image in images]
+
+    if renamed:
+        db.execute(update(Image), renamed)
+    if moved:
+        links = PerevalImages.__table__
+        db.execute(update(links).where(links.c.id_pereval == pereval_id, links.c.id_image == bindparam("image_id"))
+                   .values(position=bindparam("new_position")), moved)
+    if removed:
+        removed_ids = [image.id for image in removed]
+        db.execute(delete(PerevalImages).where(PerevalImages.id_pereval == pereval_id,
+                                               PerevalImages.id_image.in_(removed_ids)))
+        db.execute(delete(Image).where(Image.id.in_(removed_ids)))
+        storage.release_blobs(db, [content_hash for image in removed
+                                   for content_hash in (image.content_hash, image.thumbnail_hash)])
+    _insert_images(db, [(pereval_id, position, upload) for position, upload in added])
+
+
+def _new_image(db: Session, upload: ImageUpload) -> Image:
+    blob = storage.store_blob(db, upload.file)
+    image = Image(
+        title=upload.title,
+        size=blob.size,
+        content_hash=blob.content_hash,
+        mime_type=blob.mime_type
+    )
+    processed = upload.processed
+    if processed is not None:
+        image.width = processed.width
+        image.height = processed.height
+        image.thumbnail_hash = storage.store_blob(db, io.BytesIO(processed.thumbnail)).content_hash
+    return image
+
+
+def _user_values(pereval_data: PerevalCreate) -> dict:
+    return {
+        "email": pereval_data.user.email,
+        "phone": pereval_data.user.phone,
+        "fam": pereval_data.user.fam,
+        "name": pereval_data.user.name,
+        "otc": pereval_data.user.otc
+    }
+
+
+def _upsert_users(db: Session, users: List[dict]) -> dict:
+    """email -> id для пользователей одним INSERT ... ON CONFLICT (email) DO UPDATE ... RETURNING.
+
+    Одновременные первые отправки с одного email не упираются в уникальный индекс. DO UPDATE
+    присваивает email самому себе: данные существующего пользователя не меняются, но его строка
+    попадает в RETURNING (с DO NOTHING ее бы там не было).
+    """
+    statement = dialect_insert(db, User).values(users)
+    statement = statement.on_conflict_do_update(
+        index_elements=[User.email], set_={"email": statement.excluded.email}
+    ).returning(User.email, User.id)
+    return dict(db.execute(statement).all())
+
+
+def _resolve_user_ids(db: Session, users: dict) -> dict:
+    """email -> id; пользователи из user_id_cache не запрашиваются вовсе."""
+    user_ids = {}
+    for email in users:
+        user_id = user_id_cache.get(email)
+        if user_id is not None:
+            user_ids[email] = user_id
+    missing = [values for email, values in users.items() if email not in user_ids]
+    if missing:
+        user_ids.update(_upsert_users(db, missing))
+    return user_ids
+
+
+def _coords_values(pereval_data: PerevalCreate) -> dict:
+    return {
+        "latitude": pereval_data.coords.latitude,
+        "longitude": pereval_data.coords.longitude,
+        "height": pereval_data.coords.height,
+        **grid_cells(pereval_data.coords.latitude, pereval_data.coords.longitude)
+    }
+
+
+def _pereval_values(pereval_data: PerevalCreate, user_id: int, coord_id: int,
+                    ingest_ticket: Optional[str] = None) -> dict:
+    return {
+        "beauty_title": pereval_data.beauty_title,
+        "title": pereval_data.title,
+        "other_titles": pereval_data.other_titles,
+        "connect": pereval_data.connect,
+        "add_time": pereval_data.add_time,
+        "user_id": user_id,
+        "coord_id": coord_id,
+        "level_spring": pereval_data.level.spring,
+        "level_summer": pereval_data.level.summer,
+        "level_autumn": pereval_data.level.autumn,
+        "level_winter": pereval_data.level.winter,
+        "status": "new",
+        # Время задается здесь, а не server_default: по нему сразу считается день в pereval_stats
+        "date_added": datetime.now(timezone.utc),
+        "search_text": search_text(pereval_data.title, pereval_data.beauty_title, pereval_data.other_titles),
+        "ingest_ticket": ingest_ticket,
+        "area_id": pereval_data.area_id
+    }
+
+
+def _insert_returning_ids(db: Session, model, rows: List[dict], key_columns: tuple) -> List[int]:
+    """Многострочный INSERT ... RETURNING id, возвращает id в порядке rows.
+
+    SQLite не гарантирует порядок RETURNING, поэтому id сопоставляются строкам по значениям
+    key_columns: строки с одинаковыми ключами взаимозаменяемы.
+    """
+    returned = db.execute(
+        insert(model).returning(model.id, *(getattr(model, column) for column in key_columns)), rows
+    ).all()
+    ids_by_key = defaultdict(list)
+    for row in returned:
+        ids_by_key[tuple(row[1:])].append(row[0])
+    return [ids_by_key[tuple(values[column] for column in key_columns)].pop() for values in rows]
+
+
+def _bump_version(pereval: PerevalAdded) -> None:
+    """Отмечает изменение перевала; вызывается всеми путями записи, включая смену изображений и статуса."""
+    pereval.version = PerevalAdded.version + 1
+    pereval.updated_at = func.now()
+
+
+def _version_bump_values() -> dict:
+    """То же, что _bump_version, для UPDATE по многим строкам."""
+    return {"version": PerevalAdded.version + 1, "updated_at": func.now()}
+
+
+def _in_new_queue():
+    """status = 'new' литералом, а не параметром: иначе планировщик (SQLite, подготовленные
+    запросы asyncpg) не может выбрать частичный индекс ix_pereval_added_new_queue."""
+    return PerevalAdded.status == literal_column("'new'")
+
+
+def _invalidate_bumped(rows) -> None:
+    """Сбрасывает кэш для строк (id, новая версия), возвращенных UPDATE ... RETURNING."""
+    for row in rows:
+        pereval_cache.invalidate(detail_cache_key(row.id, row.version - 1))
+
+
+def _bump_image_perevals(db: Session, image_ids: List[int]) -> list:
+    """Отмечает изменение перевалов, у которых служебная команда изменила изображения image_ids.
+
+    Версии и журнал pereval_changes пишутся в транзакции вызывающего; возвращает строки
+    (id, user_id, version) для _invalidate_bumped после фиксации.
+    """
+    if not image_ids:
+        return []
+    pereval_ids = select(PerevalImages.id_pereval).where(PerevalImages.id_image.in_(image_ids))
+    bumped = db.execute(
+        update(PerevalAdded).where(PerevalAdded.id.in_(pereval_ids.scalar_subquery()))
+        .values(**_version_bump_values())
+        .returning(PerevalAdded.id, PerevalAdded.user_id, PerevalAdded.version),
+        execution_options={"synchronize_session": False}
+    ).all()
+    _record_changes(db, bumped)
+    return bumped
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite возвращает CURRENT_TIMESTAMP (UTC) без часового пояса
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _record_changes(db: Session, changes) -> None:
+    """Пишет в журнал pereval_changes изменения (id перевала, id пользователя, новая версия).
+
+    Вызывается всеми путями записи в той же транзакции, что и само изменение.
+    """
+    rows = [{"pereval_id": pereval_id, "user_id": user_id, "version": version}
+            for pereval_id, user_id, version in changes]
+    if rows:
+        db.execute(insert(PerevalChange), rows)
+
+
+def _pereval_levels(pereval: PerevalAdded) -> dict:
+    return {season: getattr(pereval, f"level_{season}") for season in stats.SEASONS}
+
+
+def _new_pereval_buckets(values: dict, height: float) -> list:
+    """Группы pereval_stats для нового перевала по значениям _pereval_values."""
+    levels = {season: values[f"level_{season}"] for season in stats.SEASONS}
+    return stats.buckets(values["status"], levels, height, values["date_added"])
+
+
+def _update_stats(db: Session, added=(), removed=()) -> None:
+    """Применяет изменения счетчиков pereval_stats (см. app.stats) одним INSERT ... ON CONFLICT.
+
+    Вызывается всеми путями записи в той же транзакции, что и само изменение.
+    """
+    rows = stats.deltas(added, removed)
+    if not rows:
+        return
+    statement = dialect_insert(db, PerevalStat).values(rows)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[PerevalStat.dimension, PerevalStat.bucket],
+        set_={"count": PerevalStat.count + statement.excluded["count"]}
+    ))
+
+
+def _area_rows(db: Session) -> list:
+    return db.query(PerevalAreas.id, PerevalAreas.id_parent, PerevalAreas.title).all()
+
+
+def _area_tree(db: Session) -> areas.AreaTree:
+    """Дерево районов из кэша процесса; обычно без обращения к БД (см. app.areas)."""
+    return areas.area_tree.get(
+        lambda: db.query(PerevalAreaVersion.version).filter(PerevalAreaVersion.id == 1).scalar() or 0,
+        lambda: _area_rows(db))
+
+
+def _bump_area_version(db: Session) -> int:
+    """Увеличивает номер версии дерева районов и возвращает новый.
+
+    Строка версии блокируется до конца транзакции: изменения районов выполняются по одному,
+    и проверка переноса на цикл видит дерево, которое никто не меняет одновременно.
+    """
+    statement = dialect_insert(db, PerevalAreaVersion).values(id=1, version=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=[PerevalAreaVersion.id], set_={"version": PerevalAreaVersion.version + 1}
+    ).returning(PerevalAreaVersion.version)
+    return db.execute(statement).scalar_one()
+
+
+def _area_tree_or_404(db: Session, area_id: int) -> areas.AreaTree:
+    tree = _area_tree(db)
+    if area_id in tree:
+        return tree
+    if db.query(PerevalAreas.id).filter(PerevalAreas.id == area_id).scalar() is None:
+        raise HTTPException(status_code=404, detail="Район не найден")
+    # Район создан другим процессом после загрузки дерева в кэш
+    areas.area_tree.invalidate()
+    return _area_tree(db)
+
+
+def _move_area_closure(db: Session, area_id: int, parent_id: Optional[int]) -> None:
+    """Переносит поддерево area_id под parent_id в таблице замыкания двумя запросами над множествами:
+    удаляются пути от прежних предков к поддереву и добавляются пути от новых."""
+    closure = PerevalAreaClosure
+    subtree = select(closure.descendant_id).where(closure.ancestor_id == area_id)
+    db.execute(delete(closure).where(closure.descendant_id.in_(subtree), closure.ancestor_id.not_in(subtree)))
+    if parent_id is None:
+        return
+    above, below = aliased(closure), aliased(closure)
+    db.execute(insert(closure).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        # Все пары (новый предок, узел поддерева): декартово произведение намеренно
+        select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+        .select_from(above).join(below, true())
+        .where(above.descendant_id == parent_id, below.ancestor_id == area_id)
+    ))
+
+
+def _unknown_areas(db: Session, area_ids: Iterable[Optional[int]]) -> set:
+    """id районов, которых нет в БД. Район, созданный другим процессом после загрузки
+    дерева в кэш, проверяется запросом, а не отклоняется."""
+    area_ids = {area_id for area_id in area_ids if area_id is not None}
+    if not area_ids:
+        return set()
+    tree = _area_tree(db)
+    missing = {area_id for area_id in area_ids if area_id not in tree}
+    if missing:
+        missing -= {area_id for (area_id,) in db.query(PerevalAreas.id).filter(PerevalAreas.id.in_(missing))}
+    return missing
+
+
+
+def _filter_by_email(query, email: str, after_id: Optional[int], status: Optional[str],
+                     date_from: Optional[datetime], date_to: Optional[datetime]):
+    query = query.filter(User.email == email)
+    if after_id is not None:
+        query = query.filter(PerevalAdded.id > after_id)
+    if status is not None:
+        query = query.filter(PerevalAdded.status == status)
+    if date_from is not None:
+        query = query.filter(PerevalAdded.date_added >= date_from)
+    if date_to is not None:
+        query = query.filter(PerevalAdded.date_added < date_to)
+    return query.order_by(PerevalAdded.id)
+
+
+def _pereval_list_query(db: Session):
+    """Столбцы PerevalList одним запросом с JOIN users и coords."""
+    return db.query(
+        PerevalAdded.id,
+        PerevalAdded.title,
+        PerevalAdded.status,
+        PerevalAdded.date_added,
+        User.email.label("user_email"),
+        Coords.latitude,
+        Coords.longitude,
+        Coords.height
+    ).join(User, PerevalAdded.user_id == User.id).join(Coords, PerevalAdded.coord_id == Coords.id)
+
+
+def _area_query(db: Session, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                height_min: Optional[float], height_max: Optional[float]):
+    """Перевалы в прямоугольнике: сначала отбор по индексу ячеек, затем точная проверка координат."""
+    longitude_filters = [
+        and_(Coords.cell_lon.between(cell_of(low), cell_of(high)), Coords.longitude.between(low, high))
+        for low, high in longitude_ranges(min_lon, max_lon)
+    ]
+    query = _pereval_list_query(db).filter(
+        Coords.cell_lat.between(cell_of(min_lat), cell_of(max_lat)),
+        Coords.latitude.between(min_lat, max_lat),
+        or_(*longitude_filters)
+    )
+    if height_min is not None:
+        query = query.filter(Coords.height >= height_min)
+    if height_max is not None:
+        query = query.filter(Coords.height <= height_max)
+    return query
+
+
+def _within_radius(db: Session, latitude: float, longitude: float, radius_km: float,
+                   height_min: Optional[float], height_max: Optional[float]) -> list:
+    candidates = _area_query(db, *radius_bbox(latitude, longitude, radius_km), height_min, height_max).all()
+    result = []
+    for row in candidates:
+        distance = haversine_km(latitude, longitude, row.latitude, row.longitude)
+        if distance <= radius_km:
+            result.append({**row._asdict(), "distance_km": round(distance, 3)})
+    result.sort(key=lambda item: (item["distance_km"], item["id"]))
+    return result
+
+
+def text_search_backend(db: Session) -> str:
+    if TEXT_SEARCH == "auto" and db.get_bind().dialect.name == "postgresql":
+        return "postgresql"
+    return "memory"
+
+
+def _search_text_rows(db: Session):
+    """(id, search_text) всех перевалов порциями - для построения индекса в памяти."""
+    statement = select(PerevalAdded.id, PerevalAdded.search_text).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    for partition in db.execute(statement).partitions():
+        yield from partition
+
+
+def _text_search_postgresql_query(db: Session, query_text: str, limit: int, height_min: Optional[float],
+                                  height_max: Optional[float]):
+    """Полнотекстовое совпадение слов или похожесть по триграммам, по убыванию оценки.
+
+    Выражения совпадают с выражениями GIN-индексов миграции 0005, поэтому константы в них
+    задаются литералами, а не параметрами (иначе asyncpg передаст $1 и индекс не подойдет).
+    """
+    query_text = normalize(query_text)
+    document = func.to_tsvector(literal_column("'simple'"), func.coalesce(PerevalAdded.search_text, literal_column("''")))
+    ts_query = func.plainto_tsquery(literal_column("'simple'"), query_text)
+    similarity = func.word_similarity(query_text, PerevalAdded.search_text)
+    score = func.greatest(func.ts_rank(document, ts_query), similarity)
+    query = _pereval_list_query(db).add_columns(score.label("score")).filter(
+        or_(document.op("@@")(ts_query), literal(query_text).op("<%")(PerevalAdded.search_text)))
+    if height_min is not None:
+        query = query.filter(Coords.height >= height_min)
+    if height_max is not None:
+        query = query.filter(Coords.height <= height_max)
+    return query.order_by(score.desc(), PerevalAdded.id).limit(limit)
+
+
+def _text_search_postgresql(db: Session, *args) -> list:
+    return [row._asdict() for row in _text_search_postgresql_query(db, *args)]
+
+
+def _text_search_memory(db: Session, query_text: str, limit: int, height_min: Optional[float],
+                        height_max: Optional[float]) -> list:
+    title_index.load(lambda: _search_text_rows(db))
+    filtered = height_min is not None or height_max is not None
+    ranked = title_index.search(query_text, TEXT_SEARCH_CANDIDATES if filtered else limit)
+    if not ranked:
+        return []
+    scores = dict(ranked)
+    position = {pereval_id: index for index, (pereval_id, _) in enumerate(ranked)}
+    query = _pereval_list_query(db).filter(PerevalAdded.id.in_(scores))
+    if height_min is not None:
+        query = query.filter(Coords.height >= height_min)
+    if height_max is not None:
+        query = query.filter(Coords.height <= height_max)
+    # Индекс может содержать id, которых уже нет в БД: они отсеиваются здесь
+    rows = sorted(query, key=lambda row: position[row.id])
+    return [{**row._asdict(), "score": scores[row.id]} for row in rows[:limit]]
+
+
+# Поля ответа GET /submitData/{id} в порядке PerevalResponse: значение и столбцы pereval_added,
+# которые для него нужны. user, coords и images загружаются связями (_DETAIL_RELATIONSHIPS)
+_DETAIL_FIELDS = {
+    "beauty_title": (lambda pereval: pereval.beauty_title, (PerevalAdded.beauty_title,)),
+    "title": (lambda pereval: pereval.title, (PerevalAdded.title,)),
+    "other_titles": (lambda pereval: pereval.other_titles, (PerevalAdded.other_titles,)),
+    "connect": (lambda pereval: pereval.connect, (PerevalAdded.connect,)),
+    "add_time": (lambda pereval: pereval.add_time, (PerevalAdded.add_time,)),
+    "user": (lambda pereval: {"email": pereval.user.email, "phone": pereval.user.phone, "fam": pereval.user.fam,
+                              "name": pereval.user.name, "otc": pereval.user.otc},
+             (PerevalAdded.user_id,)),
+    # coords.height хранится как Float, а в схеме - int
+    "coords": (lambda pereval: {"latitude": pereval.coords.latitude, "longitude": pereval.coords.longitude,
+                                "height": int(pereval.coords.height)},
+               (PerevalAdded.coord_id,)),
+    "level": (lambda pereval: {"spring": pereval.level_spring, "summer": pereval.level_summer,
+                               "autumn": pereval.level_autumn, "winter": pereval.level_winter},
+              (PerevalAdded.level_spring, PerevalAdded.level_summer, PerevalAdded.level_autumn,
+               PerevalAdded.level_winter)),
+    "area_id": (lambda pereval: pereval.area_id, (PerevalAdded.area_id,)),
+    "images": (lambda pereval: [_image_ref(image.id, image.title, image.size, image.content_hash, image.mime_type,
+                                           image.width, image.height, image.thumbnail_hash)
+                                for image in pereval.images],
+               ()),
+    "id": (lambda pereval: pereval.id, ()),
+    "status": (lambda pereval: pereval.status, (PerevalAdded.status,)),
+    "date_added": (lambda pereval: pereval.date_added, (PerevalAdded.date_added,)),
+    "version": (lambda pereval: pereval.version, ()),
+}
+DETAIL_FIELDS = tuple(_DETAIL_FIELDS)
+# Изображения отдельным запросом по индексу pereval_images: при LEFT JOIN со связующей
+# таблицей SQLite материализует pereval_images JOIN images целиком
+_DETAIL_RELATIONSHIPS = {
+    "user": (PerevalAdded.user, joinedload),
+    "coords": (PerevalAdded.coords, joinedload),
+    "images": (PerevalAdded.images, selectinload),
+}
+
+
+def _detail_options(fields: Iterable[str]) -> list:
+    """load_only по столбцам запрошенных полей; связи загружаются только для запрошенных."""
+    columns = {PerevalAdded.id, PerevalAdded.version}
+    columns.update(column for field in fields for column in _DETAIL_FIELDS[field][1])
+    options = [load_only(*columns)]
+    for field, (relationship, loader) in _DETAIL_RELATIONSHIPS.items():
+        options.append(loader(relationship) if field in fields else noload(relationship))
+    return options
+
+
+def _pereval_response_data(pereval: PerevalAdded, fields: Iterable[str] = DETAIL_FIELDS) -> dict:
+    """Ответ GET /submitData/{id} словарем с полями в порядке PerevalResponse.
+
+    Данные из БД уже прошли валидацию при записи, поэтому словарь сериализуется
+    pydantic_core.to_json напрямую: без повторной проверки (EmailStr, ограничения полей)
+    и без создания вложенных моделей. Совпадение с PerevalResponse проверяет test_crud.
+    """
+    return {field: _DETAIL_FIELDS[field][0](pereval) for field in fields}
+
+
+def _export_statement(status: Optional[str], date_from: Optional[datetime], date_to: Optional[datetime],
+                      chunk_size: int):
+    statement = select(
+        PerevalAdded.id,
+        PerevalAdded.status,
+        PerevalAdded.version,
+        PerevalAdded.date_added,
+        PerevalAdded.beauty_title,
+        PerevalAdded.title,
+        PerevalAdded.other_titles,
+        PerevalAdded.connect,
+        PerevalAdded.add_time,
+        User.email.label("user_email"),
+        User.fam.label("user_fam"),
+        User.name.label("user_name"),
+        User.otc.label("user_otc"),
+        User.phone.label("user_phone"),
+        Coords.latitude,
+        Coords.longitude,
+        Coords.height,
+        PerevalAdded.level_spring,
+        PerevalAdded.level_summer,
+        PerevalAdded.level_autumn,
+        PerevalAdded.level_winter
+    ).outerjoin(User, PerevalAdded.user_id == User.id).outerjoin(Coords, PerevalAdded.coord_id == Coords.id)
+
+    if status is not None:
+        statement = statement.where(PerevalAdded.status == status)
+    if date_from is not None:
+        statement = statement.where(PerevalAdded.date_added >= date_from)
+    if date_to is not None:
+        statement = statement.where(PerevalAdded.date_added < date_to)
+    # yield_per: строки читаются порциями (в PostgreSQL - через серверный курсор)
+    return statement.order_by(PerevalAdded.id).execution_options(yield_per=chunk_size)
+
+
+def _attach_image_refs(db: Session, rows: List[dict]) -> None:
+    """Добавляет к строкам выгрузки ссылки на изображения одним запросом на порцию."""
+    images = defaultdict(list)
+    query = db.query(
+        PerevalImages.id_pereval, Image.id, Image.title, Image.size, Image.content_hash, Image.mime_type,
+        Image.width, Image.height, Image.thumbnail_hash
+    ).join(Image, PerevalImages.id_image == Image.id).filter(
+        PerevalImages.id_pereval.in_([row["id"] for row in rows])
+    ).order_by(PerevalImages.position, Image.id)
+    for pereval_id, *image in query:
+        images[pereval_id].append(_image_ref(*image))
+    for row in rows:
+        row["images"] = images[row["id"]]
+
+
 class PerevalRepository:
     @staticmethod
-    def create_pereval(db:Session, pereval_data: PerevalCreate) -> PerevalAdded:
-        user = db.query(User).filter(User.email == pereval_data.user.email).first()
+    def create_pereval(db:Session, pereval_data: PerevalCreate,
+                       image_files: Optional[List[ImageUpload]] = None) -> PerevalAdded:
+        uploads = [ImageUpload.from_base64(image_data.img, image_data.title) for image_data in pereval_data.images]
+        uploads.extend(image_files or [])
+        _prepare_uploads(uploads)
+        if _unknown_areas(db, [pereval_data.area_id]):
+            raise ValueError(f"Район {pereval_data.area_id} не найден")
 
-        if not user:
-            user = User(
-                email=pereval_data.user.email,
-                phone=pereval_data.user.phone,
-                fam=pereval_data.user.fam,
-                name=pereval_data.user.name,
-                otc=pereval_data.user.otc
-            )
-            db.add(user)
-            db.flush()
+        email = pereval_data.user.email
+        user_id = _resolve_user_ids(db, {email: _user_values(pereval_data)})[email]
 
-        coords = Coords(
-            latitude=pereval_data.coords.latitude,
-            longitude=pereval_data.coords.longitude,
-            height=pereval_data.coords.height
-        )
+        coords = Coords(**_coords_values(pereval_data))
         db.add(coords)
         db.flush()
 
-        pereval = PerevalAdded(
-            beauty_title=pereval_data.beauty_title,
-            title=pereval_data.title,
-            other_titles=pereval_data.other_titles,
-            connect=pereval_data.connect,
-            add_time=pereval_data.add_time,
-            user_id=user.id,
-            coord_id=coords.id,
-            level_spring=pereval_data.level.spring,
-            level_summer=pereval_data.level.summer,
-            level_autumn=pereval_data.level.autumn,
-            level_winter=pereval_data.level.winter,
-            status="new"
-        )
+        values = _pereval_values(pereval_data, user_id, coords.id)
+        pereval = PerevalAdded(**values)
         db.add(pereval)
         db.flush()
+        _record_changes(db, [(pereval.id, user_id, pereval.version)])
+        _update_stats(db, _new_pereval_buckets(values, coords.height))
 
-        for image_data in pereval_data.images:
-            try:
-                img_bytes = base64.b64decode(image_data.img)
-            except:
-                img_bytes = image_data.img.encode("utf-8")
-
-            image = Image(
-                img=img_bytes,
-                title=image_data.title
-            )
+        for position, upload in enumerate(uploads):
+            image = _new_image(db, upload)
             db.add(image)
             db.flush()
 
             pereval_image = PerevalImages(
                 id_pereval=pereval.id,
-                id_image=image.id
+                id_image=image.id,
+                position=position
             )
             db.add(pereval_image)
 
         db.commit()
+        user_id_cache.set(email, user_id)
+        title_index.add(pereval.id, pereval.search_text)
         db.refresh(pereval)
 
         return pereval
 
 
     @staticmethod
-    def get_pereval_or_404(db:Session, pereval_id:int) -> PerevalAdded:
-        pereval = db.query(PerevalAdded).options(
-            joinedload(PerevalAdded.user),
-            joinedload(PerevalAdded.user),
-            joinedload(PerevalAdded.coords),
-            joinedload(PerevalAdded.images)
-        ).filter(PerevalAdded.id == pereval_id).first()
+    def create_perevals_batch(db: Session, perevals: List[PerevalCreate],
+                              tickets: Optional[List[str]] = None, decoded: Optional[list] = None,
+                              image_errors: Optional[list] = None) -> List[dict]:
+        """Вставляет пакет перевалов в одной транзакции многострочными INSERT ... RETURNING.
+
+        Число обращений к БД не зависит от размера пакета. Возвращает результаты в порядке
+        входного списка: {"id": ..., "message": ...}; записи с ошибками в данных пропускаются.
+        tickets - квитанции очереди приема (app.ingest) в порядке perevals; decoded - уже
+        декодированные изображения (_decode_batch_uploads) и image_errors - результат их
+        обработки (prepare_uploads для _flat_uploads(decoded)), их передает асинхронный вариант.
+        """
+        results = []
+        accepted = []
+        tickets = tickets or [None] * len(perevals)
+        decoded = decoded if decoded is not None else _decode_batch_uploads(perevals)
+        if image_errors is None:
+            # Изображения всего пакета обрабатываются пулом процессов параллельно
+            image_errors = imaging.prepare_uploads(_flat_uploads(decoded))
+        decoded = _with_image_errors(decoded, image_errors)
+        unknown_areas = _unknown_areas(db, {pereval_data.area_id for pereval_data in perevals})
+        for pereval_data, ticket, uploads in zip(perevals, tickets, decoded):
+            if isinstance(uploads, str):
+                results.append({"id": None, "message": uploads})
+                continue
+            if pereval_data.area_id in unknown_areas:
+                results.append({"id": None, "message": f"Район {pereval_data.area_id} не найден"})
+                continue
+            accepted.append((len(results), pereval_data, uploads, ticket))
+            results.append(None)
+
+        if not accepted:
+            return results
+        perevals = [pereval_data for _, pereval_data, _, _ in accepted]
+        uploads = [item_uploads for _, _, item_uploads, _ in accepted]
+        tickets = [ticket for _, _, _, ticket in accepted]
+
+        users_data = {}
+        for pereval_data in perevals:
+            users_data.setdefault(pereval_data.user.email, _user_values(pereval_data))
+        user_ids = _resolve_user_ids(db, users_data)
+
+        coords_rows = [_coords_values(pereval_data) for pereval_data in perevals]
+        coord_ids = _insert_returning_ids(db, Coords, coords_rows, ("latitude", "longitude", "height"))
+
+        pereval_rows = [_pereval_values(pereval_data, user_ids[pereval_data.user.email], coord_id, ticket)
+                        for pereval_data, coord_id, ticket in zip(perevals, coord_ids, tickets)]
+        pereval_ids = _insert_returning_ids(db, PerevalAdded, pereval_rows, ("coord_id",))
+        _record_changes(db, [(pereval_id, user_ids[pereval_data.user.email], 1)
+                             for pereval_data, pereval_id in zip(perevals, pereval_ids)])
+        _update_stats(db, [bucket for values, coords_values in zip(pereval_rows, coords_rows)
+                           for bucket in _new_pereval_buckets(values, coords_values["height"])])
+
+        _insert_images(db, [(pereval_id, position, upload)
+                            for pereval_id, item_uploads in zip(pereval_ids, uploads)
+                            for position, upload in enumerate(item_uploads)])
+
+        db.commit()
+        for email, user_id in user_ids.items():
+            user_id_cache.set(email, user_id)
+        title_index.add_many((pereval_id, search_text(pereval_data.title, pereval_data.beauty_title,
+                                                      pereval_data.other_titles))
+                             for pereval_data, pereval_id in zip(perevals, pereval_ids))
+
+        for (position, _, _, _), pereval_id in zip(accepted, pereval_ids):
+            results[position] = {"id": pereval_id, "message": "Отправлено успешно"}
+        return results
+
+    @staticmethod
+    def get_ingested_ids(db: Session, tickets: List[str]) -> dict:
+        """Квитанция -> id для перевалов из очереди приема, уже записанных в БД."""
+        if not tickets:
+            return {}
+        return dict(db.query(PerevalAdded.ingest_ticket, PerevalAdded.id).filter(
+            PerevalAdded.ingest_ticket.in_(tickets)).all())
+
+    @staticmethod
+    def get_pereval_data_or_404(db: Session, pereval_id: int, fields: Optional[Iterable[str]] = None) -> dict:
+        """Поля перевала словарем; fields - подмножество DETAIL_FIELDS (id и version есть всегда)."""
+        if fields is not None:
+            requested = {"id", "version", *fields}
+            fields = tuple(field for field in DETAIL_FIELDS if field in requested)
+        else:
+            fields = DETAIL_FIELDS
+        pereval = db.query(PerevalAdded).options(*_detail_options(fields)).filter(
+            PerevalAdded.id == pereval_id).first()
         if not pereval:
             raise HTTPException(status_code=404, detail="Перевал не найден")
+        return _pereval_response_data(pereval, fields)
 
-        images_data = []
-        for image in pereval.images:
-            try:
-                img_base64 = base64.b64encode(image.img).decode("utf-8")
-            except:
-                img_base64 = ""
-
-            images_data.append({
-                "img": img_base64,
-                "title": image.title
-            })
-
-        response_data = {
-            "id": pereval.id,
-            "status": pereval.status,
-            "date_added": pereval.date_added,
-            "beauty_title": pereval.beauty_title,
-            "title": pereval.title,
-            "other_titles": pereval.other_titles,
-            "connect": pereval.connect,
-            "add_time": pereval.add_time,
-            "user": {
-                "email": pereval.user.email,
-                "phone": pereval.user.phone,
-                "fam": pereval.user.fam,
-                "name": pereval.user.name,
-                "otc": pereval.user.otc
-            },
-            "coords": {
-                "latitude": pereval.coords.latitude,
-                "longitude": pereval.coords.longitude,
-                "height": pereval.coords.height
-            },
-            "level": {
-                "spring": pereval.level_spring,
-                "summer": pereval.level_summer,
-                "autumn": pereval.level_autumn,
-                "winter": pereval.level_winter
-            },
-            "images": images_data
-        }
-
-        return PerevalResponse(**response_data)
-
-    @staticmethod
-    def update_pereval(db: Session, pereval_id:int, update_data:PerevalUpdate) -> dict:
+    @staticmethod
+    def get_pereval_or_404(db: Session, pereval_id: int) -> PerevalResponse:
+        return PerevalResponse.model_validate(PerevalRepository.get_pereval_data_or_404(db, pereval_id))
+
+    @staticmethod
+    def get_image_or_404(db: Session, image_id: int) -> Image:
+        image = db.query(Image).filter(Image.id == image_id).first()
+        if not image:
+            raise HTTPException(status_code=404, detail="Изображение не найдено")
+
+        if image.size is None:
+            image.size = db.query(func.length(Image.img)).filter(Image.id == image_id).scalar() or 0
+
+        return image
+
+    @staticmethod
+    def read_image_chunk(db: Session, image_id: int, offset: int, length: int) -> bytes:
+        image = db.get(Image, image_id)
+        blob = db.get(ImageBlob, image.content_hash) if image and image.content_hash else None
+        if blob is not None:
+            return storage.image_storage.read(db, blob, offset, length)
+
+        chunk = db.query(func.substr(Image.img, offset + 1, length)).filter(Image.id == image_id).scalar()
+        return bytes(chunk) if chunk else b""
+
+    @staticmethod
+    def read_thumbnail_or_404(db: Session, image_id: int) -> Tuple[str, bytes]:
+        """(thumbnail_hash, содержимое миниатюры); 404, если миниатюры нет."""
+        thumbnail_hash = db.query(Image.thumbnail_hash).filter(Image.id == image_id).scalar()
+        blob = db.get(ImageBlob, thumbnail_hash) if thumbnail_hash else None
+        if blob is None:
+            raise HTTPException(status_code=404, detail="Миниатюра не найдена")
+        return thumbnail_hash, storage.image_storage.read(db, blob, 0, blob.size)
+
+    @staticmethod
+    def update_pereval(db: Session, pereval_id:int, update_data:PerevalUpdate,
+                       image_files: Optional[List[ImageUpload]] = None, image_errors: Optional[list] = None) -> dict:
         pereval = db.query(PerevalAdded).filter(PerevalAdded.id == pereval_id).first()
 
         if not pereval:
             raise HTTPException(status_code=404, detail="Перевал не найден")
 
         if pereval.status != "new":
-            return {"status": 0, "message": f"Статус записи {pereval.status}. Редактирование невозможно"}
+            return {"state": 0, "message": f"Статус записи {pereval.status}. Редактирование невозможно"}
 
         try:
             update_dict = update_data.model_dump(exclude_none=True)
+            old_levels = _pereval_levels(pereval)
+            old_height = new_height = None
             if "coords" in update_dict:
                 coords = db.query(Coords).filter(Coords.id == pereval.coord_id).first()
                 if coords:
+                    old_height = coords.height
                     coords_data = update_dict["coords"]
                     coords.latitude = coords_data.get("latitude", coords.latitude)
                     coords.longitude = coords_data.get("longitude", coords.longitude)
                     coords.height = coords_data.get("height", coords.height)
+                    cells = grid_cells(coords.latitude, coords.longitude)
+                    coords.cell_lat = cells["cell_lat"]
+                    coords.cell_lon = cells["cell_lon"]
+                    new_height = coords.height
 
             if "title" in update_dict:
                 pereval.title = update_dict["title"]
@@ -156,11 +861,16 @@ class PerevalRepository:
                 pereval.connect = update_dict["connect"]
             if "add_time" in update_dict:
                 pereval.add_time = update_dict["add_time"]
+            if "area_id" in update_dict:
+                if _unknown_areas(db, [update_dict["area_id"]]):
+                    db.rollback()
+                    return {"state": 0, "message": f"Район {update_dict['area_id']} не найден"}
+                pereval.area_id = update_dict["area_id"]
 
             if "level" in update_dict:
                 level = update_dict["level"]
                 if "spring" in level:
-                    pereval.level_sprint = level["spring"]
+                    pereval.level_spring = level["spring"]
                 if "summer" in level:
                     pereval.level_summer = level["summer"]
                 if "winter" in level:
@@ -168,30 +878,35 @@ class PerevalRepository:
                 if "autumn" in level:
                     pereval.level_autumn = level["autumn"]
 
+            uploads = image_files
             if "images" in update_dict:
-                db.query(PerevalImages).filter(PerevalImages.id_pereval == pereval_id).delete()
-
-                old_images = db.query(Image).join(PerevalImages).filter(
-                    PerevalImages.id_pereval == pereval_id).all()
-
-                for old_img in old_images:
-                    db.delete(old_img)
+                try:
+                    uploads = [ImageUpload.from_base64(img_data["img"], img_data["title"])
+                               for img_data in update_dict["images"]] + (image_files or [])
+                except ValueError as e:
+                    db.rollback()
+                    return {"state": 0, "message": f"Ошибка декодирования изображения: {str(e)}"}
 
-                for img_data in update_dict["images"]:
-                    try:
-                        img_bytes = base64.b64decode(img_data["img"])
-                    except Exception as e:
-                        db.rollback()
-                        return {"state": 0, "message": f"Ошибка декодирования изображения: {str(e)}"}
+            if uploads is not None:
+                try:
+                    _replace_images(db, pereval_id, uploads, image_errors if uploads is image_files else None)
+                except imaging.InvalidImage as e:
+                    db.rollback()
+                    return {"state": 0, "message": f"Некорректное изображение: {e}"}
 
-                    image = Image(img=img_bytes, title=img_data["title"])
-                    db.add(image)
-                    db.flush()
-
-                    link = PerevalImages(id_pereval=pereval_id, id_image=image.id)
-                    db.add(link)
+            titles_changed = {"title", "beauty_title", "other_titles"} & update_dict.keys()
+            if titles_changed:
+                pereval.search_text = search_text(pereval.title, pereval.beauty_title, pereval.other_titles)
 
+            old_version = pereval.version
+            _bump_version(pereval)
+            _record_changes(db, [(pereval_id, pereval.user_id, old_version + 1)])
+            _update_stats(db, stats.buckets(levels=_pereval_levels(pereval), height=new_height),
+                          stats.buckets(levels=old_levels, height=old_height))
             db.commit()
+            pereval_cache.invalidate(detail_cache_key(pereval_id, old_version))
+            if titles_changed:
+                title_index.add(pereval_id, pereval.search_text)
             return {"state": 1, "message": "Обновлено"}
 
         except Exception as e:
@@ -199,29 +914,562 @@ class PerevalRepository:
             return {"state": 0, "message":f"Ошибка: {e}"}
 
     @staticmethod
-    def get_perevals_by_email(db: Session, email:str) -> list:
-        user = db.query(User).filter(User.email == email).first()
-        if not user:
+    def get_perevals_by_email(db: Session, email:str, limit: int = LIST_DEFAULT_LIMIT,
+                              after_id: Optional[int] = None, status: Optional[str] = None,
+                              date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> list:
+        """Страница перевалов пользователя по возрастанию id (keyset-пагинация по after_id).
+
+        Выбираются только столбцы PerevalList одним запросом с JOIN users и coords.
+        """
+        query = _filter_by_email(_pereval_list_query(db), email, after_id, status, date_from, date_to)
+        return [row._asdict() for row in query.limit(limit)]
+
+    @staticmethod
+    def get_pereval_versions_by_email(db: Session, email: str, limit: int = LIST_DEFAULT_LIMIT,
+                                      after_id: Optional[int] = None, status: Optional[str] = None,
+                                      date_from: Optional[datetime] = None,
+                                      date_to: Optional[datetime] = None) -> list:
+        """Пары (id, version) той же страницы, что и get_perevals_by_email, без JOIN coords."""
+        query = db.query(PerevalAdded.id, PerevalAdded.version).join(User, PerevalAdded.user_id == User.id)
+        query = _filter_by_email(query, email, after_id, status, date_from, date_to)
+        return [tuple(row) for row in query.limit(limit)]
+
+    @staticmethod
+    def get_pereval_version_or_404(db: Session, pereval_id: int) -> int:
+        version = db.query(PerevalAdded.version).filter(PerevalAdded.id == pereval_id).scalar()
+        if version is None:
+            raise HTTPException(status_code=404, detail="Перевал не найден")
+        return version
+
+
+    @staticmethod
+    def search_perevals_in_bbox(db: Session, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                                height_min: Optional[float] = None, height_max: Optional[float] = None,
+                                limit: int = LIST_DEFAULT_LIMIT) -> list:
+        query = _area_query(db, min_lon, min_lat, max_lon, max_lat, height_min, height_max)
+        return [row._asdict() for row in query.order_by(PerevalAdded.id).limit(limit)]
+
+    @staticmethod
+    def search_perevals_in_radius(db: Session, latitude: float, longitude: float, radius_km: float,
+                                  height_min: Optional[float] = None, height_max: Optional[float] = None,
+                                  limit: int = LIST_DEFAULT_LIMIT) -> list:
+        return _within_radius(db, latitude, longitude, radius_km, height_min, height_max)[:limit]
+
+    @staticmethod
+    def search_nearest_perevals(db: Session, latitude: float, longitude: float, k: int,
+                                height_min: Optional[float] = None, height_max: Optional[float] = None) -> list:
+        """k ближайших перевалов: радиус поиска удваивается, пока в круге не окажется k перевалов."""
+        radius_km = CELL_DEGREES * KM_PER_DEGREE
+        while True:
+            found = _within_radius(db, latitude, longitude, radius_km, height_min, height_max)
+            if len(found) >= k or radius_km >= MAX_DISTANCE_KM:
+                return found[:k]
+            radius_km *= 2
+
+    @staticmethod
+    def search_perevals_by_text(db: Session, query_text: str, limit: int = LIST_DEFAULT_LIMIT,
+                                height_min: Optional[float] = None, height_max: Optional[float] = None) -> list:
+        """Перевалы, названия которых похожи на query_text (с учетом транслитерации и опечаток)."""
+        search = _text_search_postgresql if text_search_backend(db) == "postgresql" else _text_search_memory
+        return search(db, query_text, limit, height_min, height_max)
+
+    @staticmethod
+    def claim_perevals(db: Session, moderator: str, limit: int) -> list:
+        """Переводит до limit самых старых перевалов new в pending за модератором одним UPDATE.
+
+        В PostgreSQL кандидаты выбираются FOR UPDATE SKIP LOCKED: одновременные захваты
+        получают разные записи и не ждут друг друга. SQLite сериализует запись сам.
+        """
+        candidates = select(PerevalAdded.id).where(_in_new_queue()).order_by(
+            PerevalAdded.id).limit(limit).with_for_update(skip_locked=True)
+        claimed = db.execute(
+            update(PerevalAdded).where(PerevalAdded.id.in_(candidates.scalar_subquery()))
+            .values(status="pending", moderator=moderator, claimed_at=func.now(), **_version_bump_values())
+            .returning(PerevalAdded.id, PerevalAdded.user_id, PerevalAdded.version),
+            execution_options={"synchronize_session": False}
+        ).all()
+        _record_changes(db, claimed)
+        _update_stats(db, [("status", "pending")] * len(claimed), [("status", "new")] * len(claimed))
+        db.commit()
+        _invalidate_bumped(claimed)
+        if not claimed:
             return []
+        query = _pereval_list_query(db).filter(PerevalAdded.id.in_([row.id for row in claimed]))
+        return [row._asdict() for row in query.order_by(PerevalAdded.id)]
+
+    @staticmethod
+    def decide_perevals(db: Session, ids: List[int], status: str, moderator: Optional[str] = None) -> dict:
+        """Принимает или отклоняет перевалы одним UPDATE.
 
-        perevals = db.query(PerevalAdded).options(
-            joinedload(PerevalAdded.user),
-            joinedload(PerevalAdded.coords),
-            joinedload(PerevalAdded.images),
-        ).filter(PerevalAdded.user_id == user.id).all()
-
-        result = []
-
-        for pereval in perevals:
-            result.append({
-                "id": pereval.id,
-                "title": pereval.title,
-                "status": pereval.status,
-                "date_added": pereval.date_added,
-                "user_email": pereval.user.email,
-                "latitude": pereval.coords.latitude,
-                "longitude": pereval.coords.longitude,
-                "height": pereval.coords.height
-            })
-
-        return result
\ No newline at end of file
+        Меняются только записи new и pending; если указан moderator - pending только его.
+        Остальные id (нет записи, уже рассмотрена, захвачена другим) возвращаются в skipped.
+        Прежние статусы для pereval_stats читаются перед UPDATE с блокировкой строк:
+        RETURNING отдает только новые значения.
+        """
+        claimed = PerevalAdded.status == "pending"
+        if moderator is not None:
+            claimed = and_(claimed, PerevalAdded.moderator == moderator)
+        decidable = and_(PerevalAdded.id.in_(ids), or_(PerevalAdded.status == "new", claimed))
+        old_statuses = dict(db.execute(
+            select(PerevalAdded.id, PerevalAdded.status).where(decidable).with_for_update()).all())
+        updated = []
+        if old_statuses:
+            updated = db.execute(
+                update(PerevalAdded).where(PerevalAdded.id.in_(list(old_statuses)), decidable)
+                .values(status=status, **_version_bump_values())
+                .returning(PerevalAdded.id, PerevalAdded.user_id, PerevalAdded.version),
+                execution_options={"synchronize_session": False}
+            ).all()
+        _record_changes(db, updated)
+        _update_stats(db, [("status", status)] * len(updated),
+                      [("status", old_statuses[row.id]) for row in updated])
+        db.commit()
+        _invalidate_bumped(updated)
+        updated_ids = {row.id for row in updated}
+        return {"updated": sorted(updated_ids), "skipped": [pereval_id for pereval_id in dict.fromkeys(ids)
+                                                           if pereval_id not in updated_ids]}
+
+    @staticmethod
+    def get_changes(db: Session, since: int, email: Optional[str] = None, limit: int = SYNC_MAX_CHANGES) -> dict:
+        """Перевалы, измененные после курсора since, в текущем состоянии.
+
+        Читается не больше limit строк журнала с seq > since по индексу, без группировки:
+        стоимость зависит от числа изменений, а не от числа перевалов. Перевал, измененный
+        несколько раз, приходит один раз. Возвращает {"cursor", "has_more", "retry_after", "changes"};
+        cursor передается в следующий запрос. Изменения моложе SYNC_SETTLE_SECONDS отдаются,
+        но курсор за них не сдвигается: их транзакции могли быть еще не видны целиком.
+        Тогда has_more = False, а retry_after - через сколько секунд курсор сможет сдвинуться.
+        """
+        changes = db.query(PerevalChange.seq, PerevalChange.pereval_id, PerevalChange.changed_at).filter(
+            PerevalChange.seq > since)
+        if email is not None:
+            user_id = user_id_cache.get(email) or db.query(User.id).filter(User.email == email).scalar()
+            if user_id is None:
+                return {"cursor": since, "has_more": False, "retry_after": None, "changes": []}
+            changes = changes.filter(PerevalChange.user_id == user_id)
+
+        rows = changes.order_by(PerevalChange.seq).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not rows:
+            return {"cursor": since, "has_more": False, "retry_after": None, "changes": []}
+
+        cursor = rows[-1].seq
+        retry_after = None
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS)
+        unsettled = [row for row in rows if _as_utc(row.changed_at) > cutoff]
+        if unsettled:
+            # Курсор - на последнем устоявшемся изменении. Дальше журнал еще не устоялся:
+            # с has_more клиент сразу запросил бы ту же порцию снова
+            cursor = max(since, unsettled[0].seq - 1)
+            has_more = False
+            retry_after = math.ceil((_as_utc(unsettled[0].changed_at) - cutoff).total_seconds())
+
+        pereval_ids = list(dict.fromkeys(row.pereval_id for row in rows))
+        perevals = db.query(PerevalAdded).options(*_detail_options(DETAIL_FIELDS)).filter(
+            PerevalAdded.id.in_(pereval_ids)).all()
+        by_id = {pereval.id: pereval for pereval in perevals}
+        return {"cursor": cursor, "has_more": has_more, "retry_after": retry_after,
+                "changes": [_pereval_response_data(by_id[pereval_id]) for pereval_id in pereval_ids
+                            if pereval_id in by_id]}
+
+    @staticmethod
+    def prune_changes(db: Session, older_than: timedelta) -> int:
+        """Удаляет из журнала старые изменения, кроме последнего изменения каждого перевала.
+
+        Клиент с любым старым курсором по-прежнему получит все перевалы, измененные после него.
+        """
+        newer = aliased(PerevalChange)
+        superseded = select(newer.seq).where(newer.pereval_id == PerevalChange.pereval_id,
+                                             newer.seq > PerevalChange.seq).exists()
+        result = db.execute(
+            delete(PerevalChange).where(PerevalChange.changed_at < datetime.now(timezone.utc) - older_than,
+                                        superseded),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        return result.rowcount
+
+    @staticmethod
+    def get_moderation_queue_stats(db: Session) -> dict:
+        """Глубина очереди (new и pending) и возраст самой старой записи new."""
+        counts = dict(db.query(PerevalAdded.status, func.count()).filter(
+            PerevalAdded.status.in_(("new", "pending"))).group_by(PerevalAdded.status).all())
+        oldest = db.query(PerevalAdded.id, PerevalAdded.date_added).filter(
+            _in_new_queue()).order_by(PerevalAdded.id).first()
+
+        stats = {"new": counts.get("new", 0), "pending": counts.get("pending", 0)}
+        if oldest is not None:
+            date_added = _as_utc(oldest.date_added)
+            stats.update(oldest_new_id=oldest.id, oldest_new_date=date_added,
+                         oldest_new_age_seconds=(datetime.now(timezone.utc) - date_added).total_seconds())
+        return stats
+
+    @staticmethod
+    def get_stats(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None) -> dict:
+        """Счетчики перевалов из pereval_stats; date_from и date_to ограничивают только разбивку по дням."""
+        query = db.query(PerevalStat.dimension, PerevalStat.bucket, PerevalStat.count)
+        if date_from is not None:
+            query = query.filter(or_(PerevalStat.dimension != "day", PerevalStat.bucket >= date_from.isoformat()))
+        if date_to is not None:
+            query = query.filter(or_(PerevalStat.dimension != "day", PerevalStat.bucket <= date_to.isoformat()))
+        return stats.render(query.all())
+
+    @staticmethod
+    def rebuild_stats(db: Session, chunk_size: int = EXPORT_CHUNK_SIZE) -> dict:
+        """Пересчитывает pereval_stats по всем перевалам в одной транзакции.
+
+        Таблица счетчиков блокируется до чтения перевалов (в SQLite запись и так одна):
+        одновременные записи ждут окончания пересчета и применяют свои изменения после
+        него, поэтому ни одно изменение не теряется и не учитывается дважды.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("LOCK TABLE pereval_stats IN EXCLUSIVE MODE"))
+        db.execute(delete(PerevalStat))
+        rows = db.execute(
+            select(PerevalAdded.status, *(getattr(PerevalAdded, f"level_{season}") for season in stats.SEASONS),
+                   Coords.height, PerevalAdded.date_added)
+            .outerjoin(Coords, Coords.id == PerevalAdded.coord_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        counts = stats.count_buckets(rows)
+        if counts:
+            db.execute(insert(PerevalStat), [{"dimension": dimension, "bucket": bucket, "count": count}
+                                             for (dimension, bucket), count in sorted(counts.items())])
+        db.commit()
+        return {"perevals": sum(count for (dimension, _), count in counts.items() if dimension == "status"),
+                "buckets": len(counts)}
+
+    @staticmethod
+    def migrate_legacy_images(db: Session, batch_size: int = 100) -> int:
+        """Переносит содержимое из images.img в хранилище пакетами, фиксируя каждый пакет отдельно.
+
+        content_hash, size и mime_type входят в ответ: версии перевалов пакета увеличиваются
+        в той же транзакции.
+        """
+        migrated = 0
+        while True:
+            batch = db.query(Image).options(undefer(Image.img)).filter(
+                Image.img.is_not(None)).order_by(Image.id).limit(batch_size).all()
+            if not batch:
+                return migrated
+
+            for image in batch:
+                blob = storage.store_blob(db, io.BytesIO(image.img))
+                image.content_hash = blob.content_hash
+                image.size = blob.size
+                image.mime_type = blob.mime_type
+                image.img = None
+            bumped = _bump_image_perevals(db, [image.id for image in batch])
+            db.commit()
+            _invalidate_bumped(bumped)
+            migrated += len(batch)
+            db.expunge_all()
+
+    @staticmethod
+    def generate_thumbnails(db: Session, batch_size: int = 100) -> dict:
+        """Строит миниатюры и размеры для изображений, загруженных до app.imaging.
+
+        Пакет изображений обрабатывается пулом процессов параллельно и фиксируется отдельно
+        вместе с новыми версиями перевалов этих изображений: размеры и thumbnail_url входят
+        в ответ. Содержимое, которое не удалось разобрать как изображение, пропускается и не меняется.
+        """
+        generated = invalid = 0
+        last_id = 0
+        while True:
+            batch = db.query(Image).filter(Image.id > last_id, Image.thumbnail_hash.is_(None),
+                                           Image.content_hash.is_not(None)).order_by(Image.id).limit(batch_size).all()
+            if not batch:
+                return {"generated": generated, "invalid": invalid}
+
+            blobs = {blob.content_hash: blob for blob in db.query(ImageBlob).filter(
+                ImageBlob.content_hash.in_({image.content_hash for image in batch}))}
+            images = [image for image in batch if image.content_hash in blobs]
+            sources = [storage.image_storage.source(db, blobs[image.content_hash]) for image in images]
+            changed = []
+            for image, result in zip(images, imaging.process_many(sources)):
+                if isinstance(result, imaging.InvalidImage):
+                    invalid += 1
+                    continue
+                image.width = result.width
+                image.height = result.height
+                image.thumbnail_hash = storage.store_blob(db, io.BytesIO(result.thumbnail)).content_hash
+                changed.append(image.id)
+            generated += len(changed)
+            bumped = _bump_image_perevals(db, changed)
+            db.commit()
+            _invalidate_bumped(bumped)
+            last_id = batch[-1].id
+            db.expunge_all()
+
+    @staticmethod
+    def get_area_tree(db: Session, depth: Optional[int] = None) -> list:
+        """Корневые районы с подрайонами до глубины depth (None - все уровни)."""
+        return _area_tree(db).roots(depth)
+
+    @staticmethod
+    def get_area_or_404(db: Session, area_id: int, depth: Optional[int] = None) -> dict:
+        tree = _area_tree_or_404(db, area_id)
+        return {**tree.node(area_id, depth), "path": tree.path(area_id)}
+
+    @staticmethod
+    def get_area_perevals(db: Session, area_id: int, limit: int = LIST_DEFAULT_LIMIT,
+                          after_id: Optional[int] = None) -> list:
+        """Перевалы района и всех его подрайонов по возрастанию id (keyset-пагинация по after_id).
+
+        Один запрос: JOIN по таблице замыкания вместо рекурсивного обхода дерева. Наличие
+        района проверяется по дереву в кэше процесса.
+        """
+        _area_tree_or_404(db, area_id)
+        query = _pereval_list_query(db).join(
+            PerevalAreaClosure, PerevalAreaClosure.descendant_id == PerevalAdded.area_id
+        ).filter(PerevalAreaClosure.ancestor_id == area_id)
+        if after_id is not None:
+            query = query.filter(PerevalAdded.id > after_id)
+        return [row._asdict() for row in query.order_by(PerevalAdded.id).limit(limit)]
+
+    @staticmethod
+    def create_area(db: Session, area_data: AreaCreate) -> dict:
+        parent_id = area_data.parent_id
+        if parent_id is not None and db.query(PerevalAreas.id).filter(PerevalAreas.id == parent_id).scalar() is None:
+            raise ValueError(f"Район {parent_id} не найден")
+        _bump_area_version(db)
+        area = PerevalAreas(title=area_data.title, id_parent=parent_id if parent_id is not None else 0)
+        db.add(area)
+        db.flush()
+        if parent_id is None:
+            # Корень ссылается сам на себя, как "Планета Земля" (id = id_parent = 0) в данных ФСТР
+            area.id_parent = area.id
+
+        closure = PerevalAreaClosure
+        db.execute(insert(closure).values(ancestor_id=area.id, descendant_id=area.id, depth=0))
+        if parent_id is not None:
+            db.execute(insert(closure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(closure.ancestor_id, literal(area.id), closure.depth + 1).where(closure.descendant_id == parent_id)
+            ))
+        db.commit()
+        areas.area_tree.invalidate()
+        return PerevalRepository.get_area_or_404(db, area.id)
+
+    @staticmethod
+    def update_area(db: Session, area_id: int, area_data: AreaUpdate) -> dict:
+        """Меняет название района и переносит его вместе с подрайонами под другого родителя.
+
+        Дерево для проверки переноса читается из БД после блокировки строки версии, а не из кэша.
+        """
+        tree = areas.AreaTree(_bump_area_version(db), _area_rows(db))
+        if area_id not in tree:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Район не найден")
+
+        if area_data.title is not None:
+            db.query(PerevalAreas).filter(PerevalAreas.id == area_id).update({PerevalAreas.title: area_data.title})
+        parent_id = area_data.parent_id
+        if "parent_id" in area_data.model_fields_set and parent_id != tree.parent_of[area_id]:
+            if parent_id is not None and parent_id not in tree:
+                db.rollback()
+                raise ValueError(f"Район {parent_id} не найден")
+            if parent_id is not None and tree.is_descendant(parent_id, area_id):
+                db.rollback()
+                raise ValueError("Район нельзя перенести в его собственный подрайон")
+            db.query(PerevalAreas).filter(PerevalAreas.id == area_id).update(
+                {PerevalAreas.id_parent: parent_id if parent_id is not None else area_id})
+            _move_area_closure(db, area_id, parent_id)
+
+        db.commit()
+        areas.area_tree.invalidate()
+        return PerevalRepository.get_area_or_404(db, area_id)
+
+    @staticmethod
+    def rebuild_area_closure(db: Session) -> dict:
+        """Пересчитывает pereval_area_closure по id_parent всех районов в одной транзакции."""
+        _bump_area_version(db)
+        rows = _area_rows(db)
+        closure = areas.closure_rows(rows)
+        db.execute(delete(PerevalAreaClosure))
+        if closure:
+            db.execute(insert(PerevalAreaClosure), closure)
+        db.commit()
+        areas.area_tree.invalidate()
+        return {"areas": len(rows), "closure": len(closure)}
+
+    @staticmethod
+    def iter_export(db: Session, status: Optional[str] = None, date_from: Optional[datetime] = None,
+                    date_to: Optional[datetime] = None, with_images: bool = True,
+                    chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[dict]]:
+        """Все перевалы по возрастанию id порциями по chunk_size строк; память не зависит от числа строк."""
+        result = db.execute(_export_statement(status, date_from, date_to, chunk_size))
+        for partition in result.partitions():
+            rows = [row._asdict() for row in partition]
+            if with_images:
+                _attach_image_refs(db, rows)
+            yield rows
+
+
+async def _run(db, method, *args, **kwargs):
+    """Выполняет синхронный метод репозитория, не блокируя цикл событий.
+
+    Для AsyncSession код ORM исполняется через run_sync поверх асинхронного драйвера,
+    для обычной Session - в пуле потоков.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(method, *args, **kwargs)
+    return await run_in_threadpool(method, db, *args, **kwargs)
+
+
+class AsyncPerevalRepository:
+    @staticmethod
+    async def create_pereval(db: AsyncSession, pereval_data: PerevalCreate,
+                             image_files: Optional[List[ImageUpload]] = None) -> PerevalAdded:
+        # Изображения обрабатываются до перехода в синхронный код: run_sync выполняется
+        # в потоке цикла событий, и ожидание пула процессов остановило бы его
+        uploads = [ImageUpload.from_base64(image_data.img, image_data.title) for image_data in pereval_data.images]
+        uploads.extend(image_files or [])
+        for error in await imaging.prepare_uploads_async(uploads):
+            if error is not None:
+                raise error
+        return await _run(db, PerevalRepository.create_pereval, pereval_data.model_copy(update={"images": []}),
+                          uploads)
+
+    @staticmethod
+    async def create_perevals_batch(db: AsyncSession, perevals: List[PerevalCreate]) -> List[dict]:
+        # Как и в create_pereval, изображения обрабатываются до run_sync; синхронный метод
+        # получает ошибки и не разбирает некорректные изображения повторно
+        decoded = _decode_batch_uploads(perevals)
+        image_errors = await imaging.prepare_uploads_async(_flat_uploads(decoded))
+        return await _run(db, PerevalRepository.create_perevals_batch, perevals, decoded=decoded,
+                          image_errors=image_errors)
+
+    @staticmethod
+    async def get_pereval_data_or_404(db: AsyncSession, pereval_id: int,
+                                      fields: Optional[Iterable[str]] = None) -> dict:
+        return await _run(db, PerevalRepository.get_pereval_data_or_404, pereval_id, fields)
+
+    @staticmethod
+    async def get_pereval_or_404(db: AsyncSession, pereval_id: int) -> PerevalResponse:
+        return await _run(db, PerevalRepository.get_pereval_or_404, pereval_id)
+
+    @staticmethod
+    async def search_perevals_in_bbox(db: AsyncSession, *bbox: float, **filters) -> list:
+        return await _run(db, PerevalRepository.search_perevals_in_bbox, *bbox, **filters)
+
+    @staticmethod
+    async def search_perevals_in_radius(db: AsyncSession, latitude: float, longitude: float, radius_km: float,
+                                        **filters) -> list:
+        return await _run(db, PerevalRepository.search_perevals_in_radius, latitude, longitude, radius_km,
+                          **filters)
+
+    @staticmethod
+    async def search_nearest_perevals(db: AsyncSession, latitude: float, longitude: float, k: int,
+                                      **filters) -> list:
+        return await _run(db, PerevalRepository.search_nearest_perevals, latitude, longitude, k, **filters)
+
+    @staticmethod
+    async def get_pereval_versions_by_email(db: AsyncSession, email: str, **filters) -> list:
+        return await _run(db, PerevalRepository.get_pereval_versions_by_email, email, **filters)
+
+    @staticmethod
+    async def get_pereval_version_or_404(db: AsyncSession, pereval_id: int) -> int:
+        return await _run(db, PerevalRepository.get_pereval_version_or_404, pereval_id)
+
+    @staticmethod
+    async def search_perevals_by_text(db: AsyncSession, query_text: str, **filters) -> list:
+        return await _run(db, PerevalRepository.search_perevals_by_text, query_text, **filters)
+
+    @staticmethod
+    async def claim_perevals(db: AsyncSession, moderator: str, limit: int) -> list:
+        return await _run(db, PerevalRepository.claim_perevals, moderator, limit)
+
+    @staticmethod
+    async def decide_perevals(db: AsyncSession, ids: List[int], status: str, moderator: Optional[str] = None) -> dict:
+        return await _run(db, PerevalRepository.decide_perevals, ids, status, moderator)
+
+    @staticmethod
+    async def get_changes(db: AsyncSession, since: int, email: Optional[str] = None,
+                          limit: int = SYNC_MAX_CHANGES) -> dict:
+        return await _run(db, PerevalRepository.get_changes, since, email, limit)
+
+    @staticmethod
+    async def get_moderation_queue_stats(db: AsyncSession) -> dict:
+        return await _run(db, PerevalRepository.get_moderation_queue_stats)
+
+    @staticmethod
+    async def get_stats(db: AsyncSession, date_from: Optional[date] = None, date_to: Optional[date] = None) -> dict:
+        return await _run(db, PerevalRepository.get_stats, date_from, date_to)
+
+    @staticmethod
+    async def iter_export(db: AsyncSession, status: Optional[str] = None, date_from: Optional[datetime] = None,
+                          date_to: Optional[datetime] = None, with_images: bool = True,
+                          chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[List[dict]]:
+        if not isinstance(db, AsyncSession):
+            chunks = PerevalRepository.iter_export(db, status, date_from, date_to, with_images, chunk_size)
+            async for rows in iterate_in_threadpool(chunks):
+                yield rows
+            return
+
+        result = await db.stream(_export_statement(status, date_from, date_to, chunk_size))
+        async for partition in result.partitions():
+            rows = [row._asdict() for row in partition]
+            if with_images:
+                await db.run_sync(_attach_image_refs, rows)
+            yield rows
+
+    @staticmethod
+    async def get_image_or_404(db: AsyncSession, image_id: int) -> Image:
+        return await _run(db, PerevalRepository.get_image_or_404, image_id)
+
+    @staticmethod
+    async def read_image_chunk(db: AsyncSession, image_id: int, offset: int, length: int) -> bytes:
+        return await _run(db, PerevalRepository.read_image_chunk, image_id, offset, length)
+
+    @staticmethod
+    async def read_thumbnail_or_404(db: AsyncSession, image_id: int) -> Tuple[str, bytes]:
+        return await _run(db, PerevalRepository.read_thumbnail_or_404, image_id)
+
+    @staticmethod
+    async def get_area_tree(db: AsyncSession, depth: Optional[int] = None) -> list:
+        return await _run(db, PerevalRepository.get_area_tree, depth)
+
+    @staticmethod
+    async def get_area_or_404(db: AsyncSession, area_id: int, depth: Optional[int] = None) -> dict:
+        return await _run(db, PerevalRepository.get_area_or_404, area_id, depth)
+
+    @staticmethod
+    async def get_area_perevals(db: AsyncSession, area_id: int, **filters) -> list:
+        return await _run(db, PerevalRepository.get_area_perevals, area_id, **filters)
+
+    @staticmethod
+    async def create_area(db: AsyncSession, area_data: AreaCreate) -> dict:
+        return await _run(db, PerevalRepository.create_area, area_data)
+
+    @staticmethod
+    async def update_area(db: AsyncSession, area_id: int, area_data: AreaUpdate) -> dict:
+        return await _run(db, PerevalRepository.update_area, area_id, area_data)
+
+    @staticmethod
+    async def update_pereval(db: AsyncSession, pereval_id: int, update_data: PerevalUpdate,
+                             image_files: Optional[List[ImageUpload]] = None) -> dict:
+        if update_data.images is not None:
+            try:
+                image_files = [ImageUpload.from_base64(image_data.img, image_data.title)
+                               for image_data in update_data.images] + (image_files or [])
+                update_data = update_data.model_copy(update={"images": None})
+            except ValueError:
+                # Ошибку вернет синхронный метод - после проверки, что перевал существует
+                pass
+        image_errors = None
+        if image_files:
+            # Обрабатываются только изображения, которых у перевала еще нет (см. _replace_images).
+            # SHA-256 запоминается в загрузке, ошибки передаются синхронному методу: в run_sync
+            # файлы не читаются и не разбираются повторно
+            stored = await _run(db, _image_hashes, pereval_id)
+            hashes = await run_in_threadpool(lambda: [upload.content_hash() for upload in image_files])
+            new = [upload for upload, content_hash in zip(image_files, hashes) if content_hash not in stored]
+            errors = dict(zip(map(id, new), await imaging.prepare_uploads_async(new)))
+            image_errors = [errors.get(id(upload)) for upload in image_files]
+        return await _run(db, PerevalRepository.update_pereval, pereval_id, update_data, image_files, image_errors)
+
+    @staticmethod
+    async def get_perevals_by_email(db: AsyncSession, email: str, **filters) -> list:
+        return await _run(db, PerevalRepository.get_perevals_by_email, email, **filters)
@@ -1,27 +1,79 @@
+import logging
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker
-import os
-from dotenv import load_dotenv
+from app.config import DATABASE_URL, ASYNC_DATABASE_URL, DB_ASYNC, DB_REPLICA_URLS, DB_REPLICA_ASYNC_URLS
+from app.metrics import instrument_engine
+from app.replicas import ReplicaPool, reads_from_replica
 
-load_dotenv('.env')
+logger = logging.getLogger(__name__)
 
-DB_HOST = os.getenv("FSTR_DB_HOST")
-DB_PORT = os.getenv("FSTR_DB_PORT")
-DB_NAME = os.getenv("FSTR_DB_NAME")
-DB_LOGIN = os.getenv("FSTR_DB_LOGIN")
-DB_PASS = os.getenv("FSTR_DB_PASS")
 
-DATABASE_URL = f"postgresql://{DB_LOGIN}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-print(DATABASE_URL)
+def dialect_insert(db, model):
+    """INSERT с поддержкой ON CONFLICT для СУБД сессии."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql_insert(model)
+    if dialect == "sqlite":
+        return sqlite_insert(model)
+    raise NotImplementedError(f"Upsert не поддерживается для {dialect}")
+
+
+# max_overflow пула, с которым create_engine создает QueuePool (значение SQLAlchemy по умолчанию);
+# по нему метрики считают емкость пула
+POOL_MAX_OVERFLOW = 10
 
 engine = create_engine(DATABASE_URL)
+instrument_engine(engine, "sync", POOL_MAX_OVERFLOW)
+# str(URL) скрывает пароль
+logger.info("База данных: %s", engine.url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL) if DB_ASYNC else None
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+) if DB_ASYNC else None
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine, "async", POOL_MAX_OVERFLOW)
+
+# pool_pre_ping: упавшая реплика обнаруживается при выдаче соединения, а не посреди запроса
+replica_pool = ReplicaPool([create_engine(url, pool_pre_ping=True) for url in DB_REPLICA_URLS])
+async_replica_pool = ReplicaPool([create_async_engine(url, pool_pre_ping=True) for url in DB_REPLICA_ASYNC_URLS]
+                                 if DB_ASYNC else [])
+for index, replica in enumerate(replica_pool.engines):
+    instrument_engine(replica, f"replica{index}", POOL_MAX_OVERFLOW)
+for index, replica in enumerate(async_replica_pool.engines):
+    instrument_engine(replica.sync_engine, f"async_replica{index}", POOL_MAX_OVERFLOW)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    connection = replica_pool.connect() if replica_pool and reads_from_replica(request) else None
+    db = SessionLocal(bind=connection) if connection is not None else SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+        if connection is not None:
+            connection.close()
+
+
+async def get_async_db(request: Request):
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Асинхронный режим выключен: задайте FSTR_DB_ASYNC=1")
+    connection = (await async_replica_pool.connect_async()
+                  if async_replica_pool and reads_from_replica(request) else None)
+    try:
+        async with (AsyncSessionLocal(bind=connection) if connection is not None else AsyncSessionLocal()) as db:
+            yield db
+    finally:
+        if connection is not None:
+            await connection.close()
+
+
+# Зависимость, которую используют маршруты: выбирается настройкой FSTR_DB_ASYNC.
+# Чтения (GET, HEAD) идут на реплики, если они заданы в FSTR_DB_REPLICA_URLS
+get_session = get_async_db if DB_ASYNC else get_db
@@ -0,0 +1,42 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import List
+
+EXPORT_COLUMNS = [
+    "id", "status", "version", "date_added", "beauty_title", "title", "other_titles", "connect", "add_time",
+    "user_email", "user_fam", "user_name", "user_otc", "user_phone",
+    "latitude", "longitude", "height",
+    "level_spring", "level_summer", "level_autumn", "level_winter",
+]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def ndjson_chunk(rows: List[dict]) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in rows).encode()
+
+
+def _csv_columns(with_images: bool) -> List[str]:
+    return EXPORT_COLUMNS + (["images"] if with_images else [])
+
+
+def csv_header(with_images: bool) -> bytes:
+    return (",".join(_csv_columns(with_images)) + "\r\n").encode()
+
+
+def csv_chunk(rows: List[dict], with_images: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=_csv_columns(with_images), extrasaction="ignore")
+    for row in rows:
+        values = {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+        if with_images:
+            # В CSV ссылки на изображения передаются одной ячейкой в JSON
+            values["images"] = json.dumps(row["images"], ensure_ascii=False)
+        writer.writerow(values)
+    return buffer.getvalue().encode()
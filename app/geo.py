@@ -0,0 +1,51 @@
+import math
+from typing import List, Tuple
+
+# Сторона ячейки сетки в градусах. Значение зашито в данные (coords.cell_lat/cell_lon):
+# при изменении нужно пересчитать ячейки командой python -m app.manage reindex-coords
+CELL_DEGREES = 0.1
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+
+def cell_of(value: float) -> int:
+    return math.floor(value / CELL_DEGREES)
+
+
+def grid_cells(latitude: float, longitude: float) -> dict:
+    return {"cell_lat": cell_of(latitude), "cell_lon": cell_of(longitude)}
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def longitude_ranges(min_lon: float, max_lon: float) -> List[Tuple[float, float]]:
+    """Диапазоны долгот; прямоугольник через 180-й меридиан делится на два."""
+    if min_lon <= max_lon:
+        return [(min_lon, max_lon)]
+    return [(min_lon, 180.0), (-180.0, max_lon)]
+
+
+def radius_bbox(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Прямоугольник (min_lon, min_lat, max_lon, max_lat), описанный вокруг круга радиуса radius_km."""
+    d_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - d_lat, latitude + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        # Круг накрывает полюс: подходят все долготы
+        return -180.0, max(min_lat, -90.0), 180.0, min(max_lat, 90.0)
+
+    d_lon = d_lat / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if d_lon >= 180:
+        return -180.0, min_lat, 180.0, max_lat
+    min_lon, max_lon = longitude - d_lon, longitude + d_lon
+    if min_lon < -180:
+        min_lon += 360
+    if max_lon > 180:
+        max_lon -= 360
+    return min_lon, min_lat, max_lon, max_lat
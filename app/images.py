@@ -0,0 +1,52 @@
+from typing import Optional, Tuple
+from app.config import IMAGE_CHUNK_SIZE
+from app.crud import AsyncPerevalRepository
+from app.models import Image
+
+
+def image_etag(image: Image) -> Optional[str]:
+    if not image.content_hash:
+        return None
+    return f'"{image.content_hash}"'
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Разбирает заголовок Range и возвращает включительные границы (start, end).
+
+    None - заголовка нет, он некорректен или содержит несколько диапазонов:
+    в этих случаях отдается весь файл. ValueError - диапазон невыполним (416).
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.partition("-")
+    first, last = first.strip(), last.strip()
+    if not sep or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+        return None
+    if first == "":
+        if last == "":
+            return None
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("Пустой диапазон")
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and start > end:
+        return None
+    if start >= size:
+        raise ValueError("Диапазон за пределами файла")
+    return start, min(end, size - 1)
+
+
+async def iter_image_chunks(db, image_id: int, start: int, end: int, chunk_size: int = IMAGE_CHUNK_SIZE):
+    offset = start
+    while offset <= end:
+        length = min(chunk_size, end - offset + 1)
+        chunk = await AsyncPerevalRepository.read_image_chunk(db, image_id, offset, length)
+        if not chunk:
+            break
+        yield chunk
+        offset += len(chunk)
@@ -0,0 +1,293 @@
+"""Обработка изображений при приеме: проверка формата, удаление большого EXIF, миниатюры.
+
+Декодирование выполняется в пуле процессов (IMAGE_WORKERS): ни цикл событий, ни потоки
+запросов не заняты работой с пикселями, а изображения одного запроса или пакета
+обрабатываются параллельно. При IMAGE_WORKERS=0 обработка идет в вызывающем потоке.
+
+Исходное содержимое сохраняется байт в байт; меняется только JPEG, в котором сегмент EXIF
+больше IMAGE_MAX_EXIF_BYTES: сегмент заменяется минимальным, с одной ориентацией.
+
+Загрузка целиком в память не читается: процесс пула получает путь к файлу загрузки и сам
+открывает его (байты передаются, только если загрузка не больше SPOOL_MAX_SIZE), Pillow читает
+файл по мере разбора, а JPEG для миниатюры декодируется сразу в уменьшенном масштабе.
+"""
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import struct
+import tempfile
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import BinaryIO, List, Optional, Tuple, Union
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette.concurrency import run_in_threadpool
+from app.config import (IMAGE_WORKERS, IMAGE_MAX_PIXELS, IMAGE_MAX_EXIF_BYTES, IMAGE_THUMBNAIL_SIZE,
+                        IMAGE_THUMBNAIL_QUALITY, IMAGE_CHUNK_SIZE)
+
+# Формат Pillow -> MIME-тип; остальные форматы отклоняются
+FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp"}
+THUMBNAIL_MIME_TYPE = "image/jpeg"
+
+_EXIF_HEADER = b"Exif\x00\x00"
+_ORIENTATION = 0x0112
+# Копия JPEG без EXIF до этого размера держится в памяти, больше - во временном файле;
+# загрузка до этого размера передается пулу байтами (столько же Starlette держит в памяти
+# от части multipart)
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# Содержимое изображения: путь к файлу, байты или открытый файл
+Source = Union[str, bytes, BinaryIO]
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+@dataclass
+class ProcessedImage:
+    mime_type: str
+    width: int
+    height: int
+    thumbnail: bytes
+    # Замены (начало, конец, новые байты), которые удаляют большой EXIF; пусто - содержимое не меняется
+    exif_edits: List[Tuple[int, int, bytes]] = field(default_factory=list)
+
+
+def _jpeg_segments(file: BinaryIO):
+    """Сегменты JPEG до начала сжатых данных (SOS): (маркер, начало, конец)."""
+    position = 2
+    while True:
+        file.seek(position)
+        header = file.read(4)
+        if len(header) < 4 or header[0] != 0xFF or header[1] == 0xDA:
+            return
+        length = struct.unpack(">H", header[2:])[0]
+        yield header[1], position, position + 2 + length
+        position += 2 + length
+
+
+def exif_edits(file: BinaryIO, orientation: int,
+               max_bytes: int = IMAGE_MAX_EXIF_BYTES) -> List[Tuple[int, int, bytes]]:
+    """Замены, удаляющие из JPEG сегменты EXIF больше max_bytes; читаются только заголовки сегментов.
+
+    Ориентация сохраняется: иначе снимок с повернутой камеры отображался бы боком.
+    """
+    oversized = []
+    for marker, start, end in list(_jpeg_segments(file)):
+        if marker == 0xE1 and end - start > max_bytes:
+            file.seek(start + 4)
+            if file.read(len(_EXIF_HEADER)) == _EXIF_HEADER:
+                oversized.append((start, end))
+    if not oversized:
+        return []
+    replacement = b""
+    if orientation not in (0, 1):
+        exif = Image.Exif()
+        exif[_ORIENTATION] = orientation
+        payload = exif.tobytes()
+        replacement = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+    return [(start, end, replacement if index == 0 else b"") for index, (start, end) in enumerate(oversized)]
+
+
+def _copy(source: BinaryIO, target: BinaryIO, length: Optional[int] = None) -> None:
+    while length is None or length > 0:
+        chunk = source.read(IMAGE_CHUNK_SIZE if length is None else min(IMAGE_CHUNK_SIZE, length))
+        if not chunk:
+            return
+        target.write(chunk)
+        if length is not None:
+            length -= len(chunk)
+
+
+def rewrite(file: BinaryIO, edits: List[Tuple[int, int, bytes]]) -> BinaryIO:
+    """Копия file с заменами edits, порциями по IMAGE_CHUNK_SIZE; позиция копии - в начале."""
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    position = 0
+    for start, end, replacement in edits:
+        file.seek(position)
+        _copy(file, output, start - position)
+        output.write(replacement)
+        position = end
+    file.seek(position)
+    _copy(file, output)
+    file.seek(0)
+    output.seek(0)
+    return output
+
+
+def _open(source: Source):
+    if isinstance(source, str):
+        return open(source, "rb")
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    # Файл вызывающего кода остается открытым
+    source.seek(0)
+    return contextlib.nullcontext(source)
+
+
+def _thumbnail(image: Image.Image, size: int, quality: int) -> bytes:
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((size, size))
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def process_image(source: Source, thumbnail_size: int = IMAGE_THUMBNAIL_SIZE,
+                  thumbnail_quality: int = IMAGE_THUMBNAIL_QUALITY, max_pixels: int = IMAGE_MAX_PIXELS,
+                  max_exif_bytes: int = IMAGE_MAX_EXIF_BYTES) -> ProcessedImage:
+    """Проверяет изображение и строит миниатюру; выполняется в процессе пула."""
+    try:
+        with _open(source) as file:
+            with Image.open(file) as image:
+                if image.format not in FORMATS:
+                    raise InvalidImage(f"Формат {image.format} не поддерживается")
+                # Размер известен из заголовка: огромное изображение отклоняется до декодирования
+                if image.width * image.height > max_pixels:
+                    raise InvalidImage(f"Изображение больше {max_pixels} пикселей")
+                image.verify()
+            file.seek(0)
+            with Image.open(file) as image:
+                result = ProcessedImage(FORMATS[image.format], image.width, image.height, b"")
+                orientation = image.getexif().get(_ORIENTATION, 1)
+                # JPEG декодируется сразу с уменьшением до 1/8: полный растр для миниатюры не нужен
+                image.draft(None, (thumbnail_size * 2, thumbnail_size * 2))
+                image.load()
+                result.thumbnail = _thumbnail(image, thumbnail_size, thumbnail_quality)
+            if result.mime_type == "image/jpeg":
+                result.exif_edits = exif_edits(file, orientation, max_exif_bytes)
+    except InvalidImage:
+        raise
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError, Image.DecompressionBombError) as error:
+        raise InvalidImage(f"Файл не является изображением JPEG, PNG, GIF или WebP: {error}") from None
+    return result
+
+
+def _process_or_error(source: Source):
+    # Исключения возвращаются, а не выбрасываются: ошибка одного изображения пакета не прерывает остальные
+    try:
+        return process_image(source)
+    except InvalidImage as error:
+        return error
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool() -> Optional[Executor]:
+    """Общий пул процессов; None при IMAGE_WORKERS=0."""
+    global _pool
+    if IMAGE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: fork процесса с потоками (пул соединений, потоки запросов) может зависнуть
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def _picklable(source: Source) -> bool:
+    return isinstance(source, (str, bytes))
+
+
+def process_many(sources: List[Source], executor: Optional[Executor] = None) -> list:
+    """ProcessedImage или InvalidImage для каждого источника, в том же порядке.
+
+    Пути и байты обрабатываются в пуле; открытые файлы передать в другой процесс нельзя,
+    они обрабатываются в вызывающем потоке, пока пул занят остальными.
+    """
+    executor = executor or pool()
+    if executor is None:
+        return [_process_or_error(source) for source in sources]
+    futures = [executor.submit(_process_or_error, source) if _picklable(source) else None for source in sources]
+    return [future.result() if future is not None else _process_or_error(source)
+            for future, source in zip(futures, sources)]
+
+
+async def process_many_async(sources: List[Source], executor: Optional[Executor] = None) -> list:
+    executor = executor or pool()
+    if executor is None:
+        return await run_in_threadpool(process_many, sources)
+    loop = asyncio.get_running_loop()
+    return list(await asyncio.gather(*(
+        loop.run_in_executor(executor, _process_or_error, source) if _picklable(source)
+        else run_in_threadpool(_process_or_error, source) for source in sources
+    )))
+
+
+def _pending(uploads) -> list:
+    return [upload for upload in uploads if upload.processed is None]
+
+
+def _apply(uploads, results) -> List[Optional[InvalidImage]]:
+    errors = []
+    for upload, result in zip(uploads, results):
+        if isinstance(result, InvalidImage):
+            errors.append(result)
+            continue
+        if result.exif_edits:
+            upload.file = rewrite(upload.file, result.exif_edits)
+            result.exif_edits = []
+        upload.processed = result
+        errors.append(None)
+    return errors
+
+
+def _source(upload) -> Source:
+    """Что передать процессу пула вместо чтения загрузки в память.
+
+    Файл на диске с именем передается путем. Загрузка не больше SPOOL_MAX_SIZE передается
+    байтами. Больший файл без имени (часть multipart, которую Starlette сбросила во временный
+    файл) копируется порциями в NamedTemporaryFile; он заменяет upload.file и передается путем.
+    """
+    file = upload.file
+    name = getattr(file, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    if size <= SPOOL_MAX_SIZE:
+        return file.read()
+    named = tempfile.NamedTemporaryFile(prefix="upload-")
+    _copy(file, named)
+    named.flush()
+    named.seek(0)
+    upload.file = named
+    return named.name
+
+
+def prepare_uploads(uploads) -> List[Optional[InvalidImage]]:
+    """Обрабатывает еще не обработанные загрузки (ImageUpload): заполняет upload.processed
+    и при удалении EXIF заменяет upload.file. Возвращает ошибки по позициям uploads."""
+    pending = _pending(uploads)
+    errors = dict(zip(map(id, pending), _apply(pending, process_many([_source(upload) for upload in pending]))))
+    return [errors.get(id(upload)) for upload in uploads]
+
+
+async def prepare_uploads_async(uploads) -> List[Optional[InvalidImage]]:
+    pending = _pending(uploads)
+    # Копирование большой загрузки в именованный файл - тоже вне цикла событий
+    sources = await run_in_threadpool(lambda: [_source(upload) for upload in pending])
+    results = await process_many_async(sources)
+    # Копия без EXIF пишется порциями, возможно на диск: вне цикла событий
+    errors = dict(zip(map(id, pending), await run_in_threadpool(_apply, pending, results)))
+    return [errors.get(id(upload)) for upload in uploads]
@@ -0,0 +1,315 @@
+"""Очередь приема перевалов (FSTR_INGEST_MODE=queue).
+
+POST /submitData/ проверяет данные, дописывает перевал в локальную очередь - файл SQLite
+в режиме WAL с synchronous=FULL, то есть запись переживает падение процесса и питания, - и
+сразу отвечает 202 с квитанцией. Фоновый поток (IngestWorker) забирает перевалы пакетами по
+INGEST_BATCH_SIZE и записывает каждый пакет в БД одной транзакцией
+(PerevalRepository.create_perevals_batch). Пока БД недоступна, перевалы копятся в очереди.
+
+Запись из очереди берется в работу на INGEST_LEASE_SECONDS. Если процесс упал, ее снова
+возьмет в работу этот или другой процесс: при запуске сразу (владелец уже не существует),
+иначе - когда истечет срок. Квитанция сохраняется в перевале (pereval_added.ingest_ticket),
+поэтому перевал, записанный в БД перед падением, повторно не вставляется.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from app.config import (INGEST_MODE, INGEST_QUEUE_PATH, INGEST_BATCH_SIZE, INGEST_LEASE_SECONDS,
+                        INGEST_RETRY_SECONDS, INGEST_RETRY_MAX_SECONDS, INGEST_TICKET_DAYS)
+from app.crud import PerevalRepository
+from app.database import SessionLocal
+from app.schemas import PerevalCreate
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_queue (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket TEXT NOT NULL UNIQUE,
+    payload TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    owner INTEGER,
+    leased_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    pereval_id INTEGER,
+    message TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_ingest_queue_status_seq ON ingest_queue (status, seq);
+"""
+
+
+@dataclass
+class QueuedPereval:
+    seq: int
+    ticket: str
+    payload: str
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+
+class IngestQueue:
+    """Очередь перевалов в файле SQLite. Статусы записи: queued -> processing -> done или failed."""
+
+    def __init__(self, path: str, lease_seconds: int = INGEST_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # isolation_level=None: каждый оператор фиксируется сразу, транзакции - явным BEGIN
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL FULL синхронизирует журнал на диск при каждой фиксации
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def put(self, pereval: PerevalCreate) -> str:
+        """Дописывает перевал в очередь и возвращает квитанцию; после возврата запись на диске."""
+        ticket = uuid.uuid4().hex
+        with self._lock:
+            self._connection.execute("INSERT INTO ingest_queue (ticket, payload, created_at) VALUES (?, ?, ?)",
+                                     (ticket, pereval.model_dump_json(), time.time()))
+        self.wake()
+        return ticket
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def wait(self, timeout: float) -> None:
+        """Ждет новой записи в очереди (в этом процессе) не дольше timeout секунд."""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def take(self, limit: int) -> List[QueuedPereval]:
+        """Берет в работу до limit самых старых записей queued."""
+        with self._lock:
+            rows = self._connection.execute(
+                "UPDATE ingest_queue SET status = 'processing', owner = ?, leased_until = ?, attempts = attempts + 1 "
+                "WHERE seq IN (SELECT seq FROM ingest_queue WHERE status = 'queued' ORDER BY seq LIMIT ?) "
+                "RETURNING seq, ticket, payload",
+                (os.getpid(), time.time() + self.lease_seconds, limit)
+            ).fetchall()
+        # SQLite не гарантирует порядок RETURNING
+        return [QueuedPereval(*row) for row in sorted(rows)]
+
+    def release(self, seqs: List[int]) -> None:
+        """Возвращает записи в очередь (БД недоступна)."""
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE ingest_queue SET status = 'queued', owner = NULL, leased_until = NULL WHERE seq = ?",
+                [(seq,) for seq in seqs])
+
+    def finish(self, done: List[Tuple[int, int]], failed: List[Tuple[int, str]]) -> None:
+        """Отмечает записанные (seq, id перевала) и отклоненные (seq, причина) записи."""
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    "UPDATE ingest_queue SET status = 'done', pereval_id = ?, payload = NULL, owner = NULL, "
+                    "leased_until = NULL, finished_at = ? WHERE seq = ?",
+                    [(pereval_id, now, seq) for seq, pereval_id in done])
+                self._connection.executemany(
+                    "UPDATE ingest_queue SET status = 'failed', message = ?, owner = NULL, leased_until = NULL, "
+                    "finished_at = ? WHERE seq = ?",
+                    [(message, now, seq) for seq, message in failed])
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def recover(self, startup: bool = False) -> int:
+        """Возвращает в очередь записи с истекшим сроком, а при запуске - и записи
+        завершившихся процессов. Возвращает число записей."""
+        with self._lock:
+            # Свой pid при запуске - от прежнего процесса: в контейнере pid после перезапуска тот же
+            owners = [] if not startup else [
+                owner for (owner,) in self._connection.execute(
+                    "SELECT DISTINCT owner FROM ingest_queue WHERE status = 'processing'")
+                if owner == os.getpid() or not _process_alive(owner)]
+            placeholders = ", ".join("?" * len(owners))
+            dead = f" OR owner IN ({placeholders})" if owners else ""
+            cursor = self._connection.execute(
+                "UPDATE ingest_queue SET status = 'queued', owner = NULL, leased_until = NULL "
+                f"WHERE status = 'processing' AND (leased_until < ?{dead})", (time.time(), *owners))
+        return cursor.rowcount
+
+    def prune(self, days: int = INGEST_TICKET_DAYS) -> int:
+        """Удаляет квитанции записей, завершенных больше days дней назад."""
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM ingest_queue WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - days * 86400,))
+        return cursor.rowcount
+
+    def status(self, ticket: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT status, pereval_id, message, created_at, finished_at FROM ingest_queue WHERE ticket = ?",
+                (ticket,)).fetchone()
+        if row is None:
+            return None
+        status, pereval_id, message, created_at, finished_at = row
+        return {"ticket": ticket, "status": status, "id": pereval_id, "message": message,
+                "created_at": _timestamp(created_at), "finished_at": _timestamp(finished_at)}
+
+    def depth(self) -> int:
+        """Записи, еще не попавшие в БД (queued и processing)."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT count(*) FROM ingest_queue WHERE status IN ('queued', 'processing')").fetchone()[0]
+
+
+class RetryLater(Exception):
+    """БД недоступна: записи возвращены в очередь."""
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, (OperationalError, InterfaceError, OSError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class IngestWorker:
+    """Фоновый поток, переносящий перевалы из очереди в БД пакетами."""
+
+    def __init__(self, queue: IngestQueue, session_factory: Callable = SessionLocal,
+                 batch_size: int = INGEST_BATCH_SIZE, idle_seconds: float = 1.0):
+        self.queue = queue
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.idle_seconds = idle_seconds
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        recovered = self.queue.recover(startup=True)
+        if recovered:
+            logger.info("Очередь приема: %s перевалов возвращено в обработку после сбоя", recovered)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30) -> None:
+        self._stopping.set()
+        self.queue.wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        delay = INGEST_RETRY_SECONDS
+        last_maintenance = 0.0
+        while not self._stopping.is_set():
+            try:
+                processed = self.drain_once()
+                delay = INGEST_RETRY_SECONDS
+            except RetryLater as error:
+                logger.warning("Очередь приема: БД недоступна, повтор через %s с: %s", delay, error.__cause__)
+                self._stopping.wait(delay)
+                delay = min(delay * 2, INGEST_RETRY_MAX_SECONDS)
+                continue
+            except Exception:
+                logger.exception("Очередь приема: ошибка обработки")
+                self._stopping.wait(delay)
+                continue
+            if processed:
+                continue
+            if time.monotonic() - last_maintenance > 60:
+                self.queue.recover()
+                self.queue.prune()
+                last_maintenance = time.monotonic()
+            self.queue.wait(self.idle_seconds)
+
+    def drain_once(self) -> int:
+        """Записывает в БД один пакет из очереди; возвращает число взятых записей."""
+        items = self.queue.take(self.batch_size)
+        if not items:
+            return 0
+        done, failed = [], []
+        db = self.session_factory()
+        try:
+            existing = PerevalRepository.get_ingested_ids(db, [item.ticket for item in items])
+            done.extend((item.seq, existing[item.ticket]) for item in items if item.ticket in existing)
+            self._store(db, [item for item in items if item.ticket not in existing], done, failed)
+        except RetryLater:
+            # Часть записей могла быть записана по одной до потери соединения
+            handled = {seq for seq, _ in done + failed}
+            self.queue.finish(done, failed)
+            self.queue.release([item.seq for item in items if item.seq not in handled])
+            raise
+        except Exception as error:
+            if not _is_transient(error):
+                raise
+            self.queue.release([item.seq for item in items])
+            raise RetryLater() from error
+        finally:
+            db.close()
+        self.queue.finish(done, failed)
+        return len(items)
+
+    def _store(self, db, items: List[QueuedPereval], done: list, failed: list) -> None:
+        """Записывает items одной транзакцией. Если пакет отвергнут из-за данных, записи
+        повторяются по одной, чтобы одна ошибочная не задерживала остальные."""
+        if not items:
+            return
+        try:
+            perevals = [PerevalCreate.model_validate_json(item.payload) for item in items]
+            results = PerevalRepository.create_perevals_batch(db, perevals, [item.ticket for item in items])
+        except ValidationError as error:
+            if len(items) == 1:
+                failed.append((items[0].seq, f"Некорректные данные: {error}"))
+                return
+            for item in items:
+                self._store(db, [item], done, failed)
+            return
+        except Exception as error:
+            db.rollback()
+            if _is_transient(error):
+                raise RetryLater() from error
+            if len(items) == 1:
+                # Нарушение уникальности квитанции: перевал уже записал другой процесс
+                existing = PerevalRepository.get_ingested_ids(db, [items[0].ticket])
+                if existing:
+                    done.append((items[0].seq, existing[items[0].ticket]))
+                    return
+                logger.warning("Очередь приема: перевал %s отклонен: %s", items[0].ticket, error)
+                failed.append((items[0].seq, f"Ошибка: {error}"))
+                return
+            for item in items:
+                self._store(db, [item], done, failed)
+            return
+        for item, result in zip(items, results):
+            if result["id"] is None:
+                failed.append((item.seq, result["message"]))
+            else:
+                done.append((item.seq, result["id"]))
+
+
+ingest_queue = IngestQueue(INGEST_QUEUE_PATH) if INGEST_MODE == "queue" else None
+ingest_worker = IngestWorker(ingest_queue) if ingest_queue is not None else None
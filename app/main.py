@@ -1,17 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status, File, Form, UploadFile, Body, Query
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.database import get_db, engine
-from app.models import Base
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_session, replica_pool, async_replica_pool
 from app.schemas import (PerevalCreate, SubmitResponse, ErrorResponse, PerevalResponse, PerevalList, PerevalUpdate,
-                     UpdateResponse)
-from app.crud import PerevalRepository
-from typing import List
+                     UpdateResponse, BatchItemResult, BatchSubmitResponse, PerevalStatus,
+                     PerevalSearchResult, CacheStats, ModerationClaim, ModerationDecision,
+                     ModerationDecisionResponse, ModerationQueueStats, SyncResponse, PerevalStats,
+                         QueuedSubmitResponse, IngestTicket, AreaNode, AreaDetail, AreaCreate, AreaUpdate)
+from app.config import BATCH_MAX_ITEMS, LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT, DB_ASYNC, SYNC_MAX_CHANGES
+from app.crud import AsyncPerevalRepository, ImageUpload, DETAIL_FIELDS
+from app.cache import pereval_cache, detail_cache_key
+from app.images import image_etag, parse_range, iter_image_chunks
+from app.conditional import etag_matches, pereval_etag, list_etag
+from app.export import ndjson_chunk, csv_header, csv_chunk
+from app.metrics import MetricsMiddleware, render_metrics
+from app.replicas import StickyPrimaryMiddleware
+from app import imaging, ingest
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Literal, Optional
+from datetime import date, datetime
+from pydantic import ValidationError
+from pydantic_core import to_json
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Очередь приема (FSTR_INGEST_MODE=queue): при запуске дописывает в БД то, что не успел прежний процесс
+    if ingest.ingest_worker is not None:
+        ingest.ingest_worker.start()
+    yield
+    if ingest.ingest_worker is not None:
+        ingest.ingest_worker.stop()
+    imaging.shutdown()
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="FSTR Pereval API", version="1.0",
+# Схема БД создается и обновляется миграциями: alembic upgrade head
+app = FastAPI(title="FSTR Pereval API", version="1.0", lifespan=lifespan,
               description="""
     REST API для управления информацией о горных перевалах.
     
@@ -30,6 +57,73 @@ app = FastAPI(title="FSTR Pereval API", version="1.0",
     3. accepted - одобрено
     4. rejected - отклонено
     """)
+app.add_middleware(StickyPrimaryMiddleware, pool=async_replica_pool if DB_ASYNC else replica_pool)
+app.add_middleware(MetricsMiddleware)
+
+
+async def _submit(db, pereval: PerevalCreate, image_files: Optional[List[ImageUpload]] = None) -> SubmitResponse:
+    try:
+        db_pereval = await AsyncPerevalRepository.create_pereval(db, pereval, image_files)
+
+        return SubmitResponse(
+            id=db_pereval.id,
+            message="Отправлено успешно"
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+                                "status":400,
+                                "message": "Некорректные данные",
+                                "detail": str(e)})
+
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail={
+                                "status":500,
+                                "message": "Внутренняя ошибка сервера",
+                                "detail": str(e)})
+
+
+async def _update(db, pereval_id: int, update_data: PerevalUpdate,
+                  image_files: Optional[List[ImageUpload]] = None) -> UpdateResponse:
+    try:
+        result = await AsyncPerevalRepository.update_pereval(db, pereval_id, update_data, image_files)
+
+        if result["state"] == 0:
+            raise HTTPException(
+                status_code=status.HTTP_204_NO_CONTENT,
+                detail={
+                    "status": 400,
+                    "message": result["message"]
+                }
+            )
+
+        return UpdateResponse(**result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail={
+                                "status": 500,
+                                "message": "Внутренняя ошибка сервера",
+                                "detail": str(e)
+                            })
+
+
+def _parse_form_json(model, data: str):
+    try:
+        return model.model_validate_json(data)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+
+def _image_uploads(images: List[UploadFile], titles: List[str]) -> List[ImageUpload]:
+    return [
+        ImageUpload(title=titles[i] if i < len(titles) else (image.filename or f"Изображение {i + 1}"),
+                    file=image.file)
+        for i, image in enumerate(images)
+    ]
+
 
 @app.post(
     "/submitData/",
@@ -38,11 +132,12 @@ app = FastAPI(title="FSTR Pereval API", version="1.0",
     summary="Предложить новый перевал",
     response_description="ID созданного перевала",
     responses={
+        202: {"model": QueuedSubmitResponse, "description": "Перевал принят в очередь (FSTR_INGEST_MODE=queue)"},
         400: {"model": ErrorResponse, "description": "Некорректные данные"},
         500: {"model": ErrorResponse, "description": "Внутренняя ошибка сервера"}
     }
 )
-def submit_data(pereval: PerevalCreate, db: Session = Depends(get_db)):
+async def submit_data(pereval: PerevalCreate, db: Session | AsyncSession = Depends(get_session)):
     """
     Добавляет информацию о новом перевале в базу данных.
 
@@ -54,33 +149,61 @@ def submit_data(pereval: PerevalCreate, db: Session = Depends(get_db)):
     - **images**: Изображения в base64 (опционально)
 
     Статус перевала автоматически устанавливается в 'new'.
+
+    В режиме очереди приема перевал записывается в БД в фоне: ответ 202 содержит квитанцию,
+    по которой `GET /tickets/{ticket}` возвращает статус записи и ID перевала.
     """
-    try:
-        db_pereval = PerevalRepository.create_pereval(db, pereval)
+    if ingest.ingest_queue is not None:
+        ticket = await run_in_threadpool(ingest.ingest_queue.put, pereval)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED,
+                            content=QueuedSubmitResponse(ticket=ticket).model_dump())
+    return await _submit(db, pereval)
 
-        return SubmitResponse(
-            id=db_pereval.id,
-            message="Отправлено успешно"
-        )
 
-    except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
-                                "status":400,
-                                "message": "Некорректные данные",
-                                "detail": str(e)})
+@app.get("/tickets/{ticket}", response_model=IngestTicket,
+         summary="Статус перевала в очереди приема", response_description="Статус и ID перевала",
+         responses={404: {"model": ErrorResponse, "description": "Квитанция не найдена"}})
+async def ingest_ticket(ticket: str):
+    """
+    Статус перевала, принятого `POST /submitData/` в режиме очереди:
+    **queued**, **processing**, **done** (с ID перевала) или **failed** (с причиной).
+    Квитанции хранятся `FSTR_INGEST_TICKET_DAYS` дней после записи.
+    """
+    result = await run_in_threadpool(ingest.ingest_queue.status, ticket) if ingest.ingest_queue is not None else None
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail={
+                                "status": 404,
+                                "message": "Квитанция не найдена"})
+    return result
 
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail={
-                                "status":500,
-                                "message": "Внутренняя ошибка сервера",
-                                "detail": str(e)})
+
+def _parse_detail_fields(fields: Optional[str], include: Optional[str]) -> Optional[List[str]]:
+    """Запрошенные поля ответа или None для полного ответа."""
+    included = {name.strip() for name in include.split(",") if name.strip()} if include else set()
+    if included - {"images"}:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+                                "status": 400,
+                                "message": "include поддерживает только images"})
+    if fields is None:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()} | included
+    unknown = selected - set(DETAIL_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+                                "status": 400,
+                                "message": f"Неизвестные поля: {', '.join(sorted(unknown))}"})
+    return list(selected)
 
 
 @app.get("/submitData/{pereval_id}", response_model=PerevalResponse,
          response_description="Полная информация о перевале",
          summary="Получить перевал по ID",
          responses={404:{"model": ErrorResponse, "description": "Перевал не найден"}})
-def get_detail_data(pereval_id: int, db: Session = Depends(get_db)):
+async def get_detail_data(pereval_id: int, request: Request,
+                          fields: Optional[str] = Query(None, description="Поля ответа через запятую, например "
+                                                                          "status,coords; id и version есть всегда"),
+                          include: Optional[str] = Query(None, description="images - добавить изображения к fields"),
+                          db: Session | AsyncSession = Depends(get_session)):
     """
     Возвращает полную информацию о перевале по его ID.
 
@@ -89,10 +212,43 @@ def get_detail_data(pereval_id: int, db: Session = Depends(get_db)):
     - Данные пользователя
     - Координаты
     - Уровни сложности
-    - Изображения (если есть)
+    - Метаданные изображений (id, название, размер, хеш) и ссылки на них
     - Текущий статус модерации
+
+    Сами изображения отдаются отдельно через `GET /images/{id}`.
+
+    Заголовок **ETag** меняется при каждом изменении перевала (включая статус и изображения).
+    При совпадении с **If-None-Match** возвращается 304 без загрузки данных перевала.
+    Ответ кэшируется по паре (ID, версия).
+
+    С параметром **fields** возвращаются только перечисленные поля, и из БД читаются только
+    нужные для них столбцы и связи: `?fields=status` - один запрос к одной таблице.
+    Изображения в частичный ответ попадают с `images` в **fields** или с **include=images**.
     """
-    return PerevalRepository.get_pereval_or_404(db, pereval_id)
+    selected = _parse_detail_fields(fields, include)
+    if selected is not None:
+        pereval = await AsyncPerevalRepository.get_pereval_data_or_404(db, pereval_id, selected)
+        etag = pereval_etag(pereval_id, pereval["version"], pereval.keys())
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response(content=to_json(pereval), media_type="application/json", headers={"ETag": etag})
+
+    version = await AsyncPerevalRepository.get_pereval_version_or_404(db, pereval_id)
+    etag = pereval_etag(pereval_id, version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cached = pereval_cache.get(detail_cache_key(pereval_id, version))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json", headers={"ETag": etag})
+
+    # Данные из БД не валидируются повторно: словарь сразу сериализуется в bytes
+    pereval = await AsyncPerevalRepository.get_pereval_data_or_404(db, pereval_id)
+    body = to_json(pereval)
+    # Перевал мог измениться между запросами: ETag и ключ берутся по версии загруженных данных
+    pereval_cache.set(detail_cache_key(pereval_id, pereval["version"]), body)
+    return Response(content=body, media_type="application/json",
+                    headers={"ETag": pereval_etag(pereval_id, pereval["version"])})
 
 
 @app.patch("/submitData/{pereval_id}", response_model=UpdateResponse,
@@ -101,7 +257,7 @@ def get_detail_data(pereval_id: int, db: Session = Depends(get_db)):
                400: {"model": ErrorResponse, "description": "Некорректные данные"},
                404: {"model": ErrorResponse, "description": "Перевал не найден"}
            })
-def update_data(pereval_id :int, update_data: PerevalUpdate,  db: Session = Depends(get_db)):
+async def update_data(pereval_id :int, update_data: PerevalUpdate,  db: Session | AsyncSession = Depends(get_session)):
     """
     Обновляет информацию о перевале.
 
@@ -119,37 +275,124 @@ def update_data(pereval_id :int, update_data: PerevalUpdate,  db: Session = Depe
     - **state**: 1 - успех, 0 - ошибка
     - **message**: Описание результата
     """
-    try:
-        result = PerevalRepository.update_pereval(db, pereval_id, update_data)
+    return await _update(db, pereval_id, update_data)
 
-        if result["state"] == 0:
-            raise HTTPException(
-                status_code=status.HTTP_204_NO_CONTENT,
-                detail={
-                    "status": 400,
-                    "message": result["message"]
-                }
-            )
 
-        return UpdateResponse(**result)
+@app.post(
+    "/submitData/upload",
+    response_model=SubmitResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Предложить новый перевал (multipart/form-data)",
+    response_description="ID созданного перевала",
+    responses={
+        400: {"model": ErrorResponse, "description": "Некорректные данные"},
+        500: {"model": ErrorResponse, "description": "Внутренняя ошибка сервера"}
+    }
+)
+async def submit_data_upload(data: str = Form(..., description="Данные перевала (PerevalCreate) в JSON"),
+                             images: List[UploadFile] = File(default=[], description="Файлы изображений"),
+                             titles: List[str] = Form(default=[], description="Названия изображений по порядку"),
+                             db: Session | AsyncSession = Depends(get_session)):
+    """
+    То же, что `POST /submitData/`, но изображения передаются двоичными частями multipart,
+    а не строками base64 внутри JSON.
 
-    except HTTPException:
-        raise
+    - **data**: JSON с данными перевала (поле images можно не указывать)
+    - **images**: файлы изображений; каждая часть пишется во временный файл, а не держится в памяти
+    - **titles**: названия изображений в том же порядке (по умолчанию - имя файла)
+    """
+    pereval = _parse_form_json(PerevalCreate, data)
+    return await _submit(db, pereval, _image_uploads(images, titles))
+
+
+@app.post(
+    "/submitData/batch",
+    response_model=BatchSubmitResponse,
+    summary="Предложить пакет перевалов",
+    response_description="Результат по каждому перевалу пакета",
+    responses={
+        413: {"model": ErrorResponse, "description": "Слишком большой пакет"},
+        500: {"model": ErrorResponse, "description": "Внутренняя ошибка сервера"}
+    }
+)
+async def submit_data_batch(items: List[Dict[str, Any]] = Body(..., description="Список перевалов (PerevalCreate)"),
+                            db: Session | AsyncSession = Depends(get_session)):
+    """
+    Добавляет сразу несколько перевалов - например, при синхронизации после экспедиции.
+
+    Каждый элемент проверяется отдельно: некорректные элементы возвращаются с ошибкой,
+    а корректные вставляются в одной транзакции многострочными INSERT.
+
+    Для каждого элемента возвращается:
+    - **index**: позиция в запросе
+    - **status**: 201 - создан, 422 - ошибка валидации, 400 - некорректные данные
+    - **id**: ID созданного перевала
+    - **message**: Описание результата
+    """
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail={
+                                "status": 413,
+                                "message": f"В пакете не больше {BATCH_MAX_ITEMS} перевалов"})
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, PerevalCreate.model_validate(item)))
+        except ValidationError as e:
+            results[index] = BatchItemResult(index=index, status=422, message=str(e))
+
+    try:
+        created = await AsyncPerevalRepository.create_perevals_batch(db, [pereval for _, pereval in valid])
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail={
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail={
                                 "status": 500,
                                 "message": "Внутренняя ошибка сервера",
-                                "detail": str(e)
-                            })
+                                "detail": str(e)})
+
+    for (index, _), result in zip(valid, created):
+        results[index] = BatchItemResult(index=index, status=201 if result["id"] else 400, **result)
+
+    created_count = sum(1 for result in results if result.id is not None)
+    return BatchSubmitResponse(created=created_count, failed=len(results) - created_count, items=results)
+
+
+@app.patch("/submitData/{pereval_id}/upload", response_model=UpdateResponse,
+           summary="Обновить перевал (multipart/form-data)", response_description="Результат обновления",
+           responses={
+               400: {"model": ErrorResponse, "description": "Некорректные данные"},
+               404: {"model": ErrorResponse, "description": "Перевал не найден"}
+           })
+async def update_data_upload(pereval_id: int,
+                             data: str = Form(default="{}", description="Изменения (PerevalUpdate) в JSON"),
+                             images: Optional[List[UploadFile]] = File(default=None,
+                                                                       description="Новый набор изображений"),
+                             titles: List[str] = Form(default=[], description="Названия изображений по порядку"),
+                             db: Session | AsyncSession = Depends(get_session)):
+    """
+    То же, что `PATCH /submitData/{id}`, но изображения передаются двоичными частями multipart.
+
+    Если переданы файлы **images**, они заменяют все изображения перевала.
+    """
+    update = _parse_form_json(PerevalUpdate, data)
+    image_files = _image_uploads(images, titles) if images else None
+    return await _update(db, pereval_id, update, image_files)
 
 
 @app.get("/submitData/", response_model=List[PerevalList],
          summary="Получить перевалы по email", response_description="Список перевалов",
          responses={400:{"model": ErrorResponse, "description": "Некорректный email"}})
-def get_email_data(user__email: str, db: Session = Depends(get_db)):
+async def get_email_data(request: Request, response: Response, user__email: str,
+                         limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT,
+                                            description="Размер страницы"),
+                         after_id: Optional[int] = Query(None, description="Вернуть перевалы с ID больше этого"),
+                         status_filter: Optional[PerevalStatus] = Query(None, alias="status",
+                                                                        description="Фильтр по статусу"),
+                         date_from: Optional[datetime] = Query(None, description="Добавлены не раньше"),
+                         date_to: Optional[datetime] = Query(None, description="Добавлены раньше"),
+                         db: Session | AsyncSession = Depends(get_session)):
     """
-    Возвращает список всех перевалов, отправленных указанным пользователем.
+    Возвращает перевалы, отправленные указанным пользователем, страницами по возрастанию ID.
 
     Для каждого перевала возвращается:
     - ID и название
@@ -157,5 +400,344 @@ def get_email_data(user__email: str, db: Session = Depends(get_db)):
     - Дата добавления
     - Координаты (широта, долгота, высота)
     - Email пользователя
+
+    Если страница заполнена целиком, заголовок **X-Next-After-Id** содержит значение
+    `after_id` для запроса следующей страницы.
+
+    Заголовок **ETag** вычисляется по ID и версиям перевалов страницы; при совпадении
+    с **If-None-Match** возвращается 304.
+    """
+    filters = {"limit": limit, "after_id": after_id, "status": status_filter,
+               "date_from": date_from, "date_to": date_to}
+    versions = await AsyncPerevalRepository.get_pereval_versions_by_email(db, user__email, **filters)
+    etag = list_etag(versions)
+    headers = {"ETag": etag}
+    if len(versions) == limit:
+        headers["X-Next-After-Id"] = str(versions[-1][0])
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    perevals = await AsyncPerevalRepository.get_perevals_by_email(db, user__email, **filters)
+    response.headers.update(headers)
+    return perevals
+
+
+def _parse_bbox(bbox: str) -> tuple:
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+                                "status": 400,
+                                "message": "bbox задается как min_lon,min_lat,max_lon,max_lat"})
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+                                "status": 400,
+                                "message": "Координаты bbox вне допустимого диапазона"})
+    return min_lon, min_lat, max_lon, max_lat
+
+
+@app.get("/perevals/search", response_model=List[PerevalSearchResult],
+         summary="Поиск перевалов по названию или области", response_description="Найденные перевалы",
+         responses={400: {"model": ErrorResponse, "description": "Некорректные параметры поиска"}})
+async def search_perevals(q: Optional[str] = Query(None, min_length=2, max_length=200,
+                                                   description="Название перевала (допускаются опечатки и транслит)"),
+                          bbox: Optional[str] = Query(None, description="Область: min_lon,min_lat,max_lon,max_lat"),
+                          lat: Optional[float] = Query(None, ge=-90, le=90, description="Широта точки"),
+                          lon: Optional[float] = Query(None, ge=-180, le=180, description="Долгота точки"),
+                          radius_km: Optional[float] = Query(None, gt=0, description="Радиус вокруг точки, км"),
+                          k: Optional[int] = Query(None, ge=1, le=LIST_MAX_LIMIT,
+                                                   description="Число ближайших к точке перевалов"),
+                          height_min: Optional[float] = Query(None, description="Минимальная высота"),
+                          height_max: Optional[float] = Query(None, description="Максимальная высота"),
+                          limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+                          db: Session | AsyncSession = Depends(get_session)):
+    """
+    Ищет перевалы по названию или координатам. Режим выбирается параметрами:
+
+    - **q** - перевалы с похожим названием (title, beauty_title, other_titles), по убыванию **score**;
+      "Kazbek", "Казбек" и "Казбэк" находят одно и то же
+    - **bbox** - все перевалы в прямоугольнике (например, видимая область карты), по возрастанию ID;
+      прямоугольник может пересекать 180-й меридиан (min_lon > max_lon)
+    - **lat**, **lon**, **radius_km** - перевалы в круге, по возрастанию расстояния
+    - **lat**, **lon**, **k** - k ближайших перевалов
+
+    Во всех режимах можно ограничить высоту: **height_min**, **height_max**.
+    Для режимов с точкой в ответе есть **distance_km**.
+    """
+    filters = {"height_min": height_min, "height_max": height_max}
+    if q is not None:
+        if bbox is not None or lat is not None or lon is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+                                    "status": 400,
+                                    "message": "q нельзя сочетать с bbox, lat и lon"})
+        return await AsyncPerevalRepository.search_perevals_by_text(db, q, limit=limit, **filters)
+    if bbox is not None:
+        return await AsyncPerevalRepository.search_perevals_in_bbox(db, *_parse_bbox(bbox), limit=limit, **filters)
+    if lat is not None and lon is not None and (radius_km is None) != (k is None):
+        if radius_km is not None:
+            return await AsyncPerevalRepository.search_perevals_in_radius(db, lat, lon, radius_km,
+                                                                          limit=limit, **filters)
+        return await AsyncPerevalRepository.search_nearest_perevals(db, lat, lon, k, **filters)
+
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={
+                            "status": 400,
+                            "message": "Укажите q, bbox, либо lat и lon вместе с radius_km или k"})
+
+
+@app.get("/sync", response_model=SyncResponse,
+         summary="Изменения перевалов после курсора", response_description="Измененные перевалы и новый курсор")
+async def sync(since: int = Query(0, ge=0, description="Курсор из прошлого ответа; 0 - все перевалы"),
+               user__email: Optional[str] = Query(None, description="Только перевалы этого пользователя"),
+               limit: int = Query(SYNC_MAX_CHANGES, ge=1, le=SYNC_MAX_CHANGES),
+               db: Session | AsyncSession = Depends(get_session)):
+    """
+    Возвращает перевалы, созданные или измененные (данные, изображения, статус) после курсора,
+    в текущем состоянии - как `GET /submitData/{id}`. Каждый перевал приходит один раз.
+
+    - **cursor** - передать как **since** в следующий запрос
+    - **has_more** - изменений больше, чем **limit**: запросить следующую порцию сразу
+    - **retry_after** - курсор остановлен на изменениях последних секунд: повторить запрос
+      не раньше чем через столько секунд (заголовок `Retry-After` - то же значение)
+
+    Изменения последних секунд могут прийти повторно: клиенту достаточно заменять
+    локальную запись по id, если **version** больше.
+    """
+    result = await AsyncPerevalRepository.get_changes(db, since, user__email, limit)
+    headers = {"Retry-After": str(result["retry_after"])} if result["retry_after"] is not None else None
+    return Response(content=to_json(result), media_type="application/json", headers=headers)
+
+
+@app.post("/moderation/claim", response_model=List[PerevalList],
+          summary="Взять перевалы на модерацию", response_description="Захваченные перевалы")
+async def moderation_claim(claim: ModerationClaim, db: Session | AsyncSession = Depends(get_session)):
+    """
+    Переводит до `limit` самых старых перевалов со статусом **new** в **pending** за модератором.
+
+    Одновременные запросы разных модераторов получают разные записи и не блокируют друг друга.
+    Если новых записей нет, возвращается пустой список.
+    """
+    return await AsyncPerevalRepository.claim_perevals(db, claim.moderator, claim.limit)
+
+
+@app.post("/moderation/decision", response_model=ModerationDecisionResponse,
+          summary="Принять или отклонить перевалы", response_description="Обновленные и пропущенные ID")
+async def moderation_decision(decision: ModerationDecision, db: Session | AsyncSession = Depends(get_session)):
+    """
+    Переводит перевалы из списка `ids` в статус `accepted` или `rejected` одним запросом.
+
+    Меняются только записи **new** и **pending** (если указан `moderator` - только захваченные им).
+    Остальные ID возвращаются в `skipped`.
+    """
+    return await AsyncPerevalRepository.decide_perevals(db, decision.ids, decision.status, decision.moderator)
+
+
+@app.get("/moderation/queue", response_model=ModerationQueueStats,
+         summary="Состояние очереди модерации", response_description="Глубина и возраст очереди")
+async def moderation_queue(db: Session | AsyncSession = Depends(get_session)):
+    """
+    Число перевалов в статусах **new** и **pending**, ID, дата и возраст (в секундах)
+    самого старого перевала **new**.
+    """
+    return await AsyncPerevalRepository.get_moderation_queue_stats(db)
+
+
+@app.get("/stats", response_model=PerevalStats,
+         summary="Статистика перевалов", response_description="Число перевалов по группам")
+async def pereval_stats(date_from: Optional[date] = Query(None, description="Разбивка по дням: с этого дня"),
+                        date_to: Optional[date] = Query(None, description="Разбивка по дням: по этот день"),
+                        db: Session | AsyncSession = Depends(get_session)):
+    """
+    Число перевалов по статусам, по категориям трудности в каждый сезон, по диапазонам высоты
+    и по дням добавления (UTC).
+
+    Счетчики обновляются вместе с каждой записью, поэтому ответ не пересчитывает перевалы
+    и не зависит от их числа.
+    """
+    return await AsyncPerevalRepository.get_stats(db, date_from, date_to)
+
+
+def _area_error(error: ValueError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"status": 400, "message": str(error)})
+
+
+@app.get("/areas", response_model=List[AreaNode],
+         summary="Дерево районов", response_description="Корневые районы с подрайонами")
+async def get_areas(depth: Optional[int] = Query(None, ge=0, description="Глубина вложенности (по умолчанию - все уровни)"),
+                    db: Session | AsyncSession = Depends(get_session)):
+    """
+    Возвращает дерево районов: корневые районы с вложенными подрайонами.
+
+    Дерево хранится в памяти процесса и перечитывается из БД только после изменения районов.
+    """
+    return await AsyncPerevalRepository.get_area_tree(db, depth)
+
+
+@app.get("/areas/{area_id}", response_model=AreaDetail,
+         summary="Получить район", response_description="Район, его подрайоны и путь от корня",
+         responses={404: {"model": ErrorResponse, "description": "Район не найден"}})
+async def get_area(area_id: int, depth: Optional[int] = Query(None, ge=0, description="Глубина вложенности"),
+                   db: Session | AsyncSession = Depends(get_session)):
+    return await AsyncPerevalRepository.get_area_or_404(db, area_id, depth)
+
+
+@app.get("/areas/{area_id}/perevals", response_model=List[PerevalList],
+         summary="Перевалы района", response_description="Перевалы района и всех его подрайонов",
+         responses={404: {"model": ErrorResponse, "description": "Район не найден"}})
+async def get_area_perevals(area_id: int, response: Response,
+                            limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT, description="Размер страницы"),
+                            after_id: Optional[int] = Query(None, description="Вернуть перевалы с ID больше этого"),
+                            db: Session | AsyncSession = Depends(get_session)):
+    """
+    Возвращает перевалы района и всех его подрайонов страницами по возрастанию ID.
+
+    Подрайоны не обходятся рекурсивно: страница выбирается одним запросом по таблице замыкания дерева.
+    Если страница заполнена целиком, заголовок **X-Next-After-Id** содержит значение `after_id`
+    для запроса следующей страницы.
+    """
+    perevals = await AsyncPerevalRepository.get_area_perevals(db, area_id, limit=limit, after_id=after_id)
+    if len(perevals) == limit:
+        response.headers["X-Next-After-Id"] = str(perevals[-1]["id"])
+    return perevals
+
+
+@app.post("/areas", response_model=AreaDetail, status_code=status.HTTP_201_CREATED,
+          summary="Добавить район", response_description="Созданный район",
+          responses={400: {"model": ErrorResponse, "description": "Родительский район не найден"}})
+async def create_area(area: AreaCreate, db: Session | AsyncSession = Depends(get_session)):
+    """
+    Добавляет район; без `parent_id` район становится корневым.
+    """
+    try:
+        return await AsyncPerevalRepository.create_area(db, area)
+    except ValueError as e:
+        raise _area_error(e)
+
+
+@app.patch("/areas/{area_id}", response_model=AreaDetail,
+           summary="Изменить район", response_description="Измененный район",
+           responses={400: {"model": ErrorResponse, "description": "Перенос невозможен"},
+                      404: {"model": ErrorResponse, "description": "Район не найден"}})
+async def update_area(area_id: int, area: AreaUpdate, db: Session | AsyncSession = Depends(get_session)):
+    """
+    Меняет название района или переносит его вместе с подрайонами под другой район
+    (`"parent_id": null` - в корень). Перенос района в его собственный подрайон отклоняется.
+    """
+    try:
+        return await AsyncPerevalRepository.update_area(db, area_id, area)
+    except ValueError as e:
+        raise _area_error(e)
+
+
+async def _export_body(chunks, export_format: str, with_images: bool):
+    if export_format == "csv":
+        yield csv_header(with_images)
+    async for rows in chunks:
+        yield csv_chunk(rows, with_images) if export_format == "csv" else ndjson_chunk(rows)
+
+
+@app.get("/export", response_class=StreamingResponse,
+         summary="Выгрузить каталог перевалов", response_description="Перевалы в формате NDJSON или CSV")
+async def export_perevals(export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format",
+                                                                          description="Формат выгрузки"),
+                          images: Literal["ref", "none"] = Query("ref", description="Ссылки на изображения или без них"),
+                          status_filter: Optional[PerevalStatus] = Query(None, alias="status",
+                                                                         description="Фильтр по статусу"),
+                          date_from: Optional[datetime] = Query(None, description="Добавлены не раньше"),
+                          date_to: Optional[datetime] = Query(None, description="Добавлены раньше"),
+                          db: Session | AsyncSession = Depends(get_session)):
+    """
+    Выгружает все перевалы по возрастанию ID потоком, порциями по `FSTR_EXPORT_CHUNK_SIZE` строк.
+
+    - `format=ndjson` - по одному JSON-объекту на строку, `format=csv` - CSV с заголовком
+    - `images=ref` - к каждому перевалу добавляются метаданные и URL изображений (без содержимого),
+      `images=none` - без изображений
+    - `status`, `date_from`, `date_to` - фильтры, как в `GET /submitData/`
+    """
+    with_images = images == "ref"
+    chunks = AsyncPerevalRepository.iter_export(db, status_filter, date_from, date_to, with_images)
+    media_type = "text/csv; charset=utf-8" if export_format == "csv" else "application/x-ndjson"
+    extension = "csv" if export_format == "csv" else "ndjson"
+    return StreamingResponse(_export_body(chunks, export_format, with_images), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="perevals.{extension}"'})
+
+
+@app.get("/cache/stats", response_model=CacheStats, summary="Статистика кэша перевалов",
+         response_description="Счетчики кэша")
+async def cache_stats():
+    """
+    Счетчики кэша ответов `GET /submitData/{id}` с момента запуска процесса:
+    попадания, промахи, вытеснения (LRU) и сбросы при изменении перевала.
+    """
+    return pereval_cache.stats()
+
+
+@app.get("/metrics", response_class=Response, summary="Метрики в формате Prometheus",
+         response_description="Метрики в текстовом формате Prometheus")
+async def metrics():
+    """
+    Гистограммы времени ответа, числа SQL-запросов и времени в БД по маршрутам,
+    ожидание соединения из пула и его заполненность, счетчики кэша перевалов.
+    """
+    return Response(render_metrics(pereval_cache.stats()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/images/{image_id}", response_class=StreamingResponse,
+         summary="Получить изображение", response_description="Содержимое изображения",
+         responses={
+             206: {"description": "Часть изображения (запрос с заголовком Range)"},
+             304: {"description": "Изображение не изменилось"},
+             404: {"model": ErrorResponse, "description": "Изображение не найдено"},
+             416: {"description": "Запрошенный диапазон невыполним"}
+         })
+async def get_image(image_id: int, request: Request, db: Session | AsyncSession = Depends(get_session)):
+    """
+    Отдает содержимое изображения порциями, не загружая его в память целиком.
+
+    - Заголовок **ETag** содержит SHA-256 содержимого; при совпадении с **If-None-Match** возвращается 304
+    - Поддерживаются запросы части файла через заголовок **Range** (`bytes=start-end`)
+    """
+    image = await AsyncPerevalRepository.get_image_or_404(db, image_id)
+    headers = {"Accept-Ranges": "bytes"}
+    etag = image_etag(image)
+    if etag:
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    size = image.size
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE, headers=headers)
+
+    status_code = status.HTTP_200_OK
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(iter_image_chunks(db, image_id, start, end), status_code=status_code,
+                             media_type=image.mime_type or "application/octet-stream", headers=headers)
+
+
+@app.get("/images/{image_id}/thumbnail", response_class=Response,
+         summary="Получить миниатюру изображения", response_description="Миниатюра JPEG",
+         responses={
+             304: {"description": "Миниатюра не изменилась"},
+             404: {"model": ErrorResponse, "description": "Миниатюра не найдена"}
+         })
+async def get_image_thumbnail(image_id: int, request: Request, db: Session | AsyncSession = Depends(get_session)):
+    """
+    Отдает миниатюру JPEG, построенную при загрузке изображения (сторона не больше FSTR_IMAGE_THUMBNAIL_SIZE).
+
+    - Заголовок **ETag** содержит SHA-256 миниатюры; при совпадении с **If-None-Match** возвращается 304
+    - Для изображений, загруженных до появления миниатюр, их строит `python -m app.manage generate-thumbnails`
     """
-    return PerevalRepository.get_perevals_by_email(db, user__email)
\ No newline at end of file
+    thumbnail_hash, content = await AsyncPerevalRepository.read_thumbnail_or_404(db, image_id)
+    headers = {"ETag": f'"{thumbnail_hash}"'}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content, media_type=imaging.THUMBNAIL_MIME_TYPE, headers=headers)
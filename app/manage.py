@@ -0,0 +1,96 @@
+"""Служебные команды: python -m app.manage <команда>."""
+import argparse
+import json
+from datetime import timedelta
+from sqlalchemy import update
+from app.database import SessionLocal
+from app import storage
+from app.crud import PerevalRepository
+from app.geo import grid_cells
+from app.models import Coords
+
+
+def gc_images(args):
+    with SessionLocal() as db:
+        return storage.collect_garbage(db, grace_seconds=args.grace_seconds)
+
+
+def migrate_images(args):
+    with SessionLocal() as db:
+        return {"migrated": PerevalRepository.migrate_legacy_images(db, batch_size=args.batch_size)}
+
+
+def generate_thumbnails(args):
+    with SessionLocal() as db:
+        return PerevalRepository.generate_thumbnails(db, batch_size=args.batch_size)
+
+
+def reindex_coords(args):
+    """Пересчитывает ячейки сетки для координат (после обновления схемы или смены CELL_DEGREES)."""
+    updated = 0
+    last_id = 0
+    with SessionLocal() as db:
+        while True:
+            batch = db.query(Coords.id, Coords.latitude, Coords.longitude).filter(
+                Coords.id > last_id).order_by(Coords.id).limit(args.batch_size).all()
+            if not batch:
+                return {"updated": updated}
+            db.execute(update(Coords), [{"id": row.id, **grid_cells(row.latitude, row.longitude)} for row in batch])
+            db.commit()
+            updated += len(batch)
+            last_id = batch[-1].id
+
+
+def prune_changes(args):
+    with SessionLocal() as db:
+        return {"deleted": PerevalRepository.prune_changes(db, timedelta(days=args.keep_days))}
+
+
+def rebuild_stats(args):
+    with SessionLocal() as db:
+        return PerevalRepository.rebuild_stats(db, chunk_size=args.batch_size)
+
+
+def rebuild_areas(args):
+    with SessionLocal() as db:
+        return PerevalRepository.rebuild_area_closure(db)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("gc-images", help="Удалить содержимое изображений, на которое нет ссылок")
+    command.add_argument("--grace-seconds", type=int, default=3600,
+                         help="Не трогать файлы без записи в БД моложе этого возраста")
+    command.set_defaults(handler=gc_images)
+
+    command = commands.add_parser("migrate-images", help="Перенести images.img в хранилище изображений")
+    command.add_argument("--batch-size", type=int, default=100)
+    command.set_defaults(handler=migrate_images)
+
+    command = commands.add_parser("generate-thumbnails", help="Построить миниатюры для изображений без них")
+    command.add_argument("--batch-size", type=int, default=100)
+    command.set_defaults(handler=generate_thumbnails)
+
+    command = commands.add_parser("reindex-coords", help="Пересчитать ячейки сетки для поиска по координатам")
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.set_defaults(handler=reindex_coords)
+
+    command = commands.add_parser("prune-changes", help="Удалить из журнала для /sync старые промежуточные изменения")
+    command.add_argument("--keep-days", type=int, default=30)
+    command.set_defaults(handler=prune_changes)
+
+    command = commands.add_parser("rebuild-stats", help="Пересчитать счетчики для GET /stats по всем перевалам")
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.set_defaults(handler=rebuild_stats)
+
+    command = commands.add_parser("rebuild-areas", help="Пересчитать таблицу замыкания дерева районов")
+    command.set_defaults(handler=rebuild_areas)
+
+    args = parser.parse_args(argv)
+    print(json.dumps(args.handler(args), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Метрики запросов и БД в текстовом формате Prometheus (GET /metrics)."""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Iterable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.config import QUERY_COUNT_WARNING
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _format_labels(labelnames: Iterable[str], labelvalues: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин и набором меток."""
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float], labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            counts, total = self._series.get(labelvalues, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._series[labelvalues] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labelvalues, (counts, total) in series:
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+def _counter(name: str, documentation: str, value: float) -> List[str]:
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} counter", f"{name} {_format_number(value)}"]
+
+
+request_latency = Histogram("fstr_http_request_duration_seconds", "Время обработки запроса",
+                            LATENCY_BUCKETS, ("method", "route", "status"))
+request_queries = Histogram("fstr_http_request_queries", "Число SQL-запросов на HTTP-запрос",
+                            QUERY_COUNT_BUCKETS, ("method", "route"))
+request_db_time = Histogram("fstr_http_request_db_seconds", "Суммарное время SQL-запросов на HTTP-запрос",
+                            LATENCY_BUCKETS, ("method", "route"))
+pool_checkout_wait = Histogram("fstr_db_pool_checkout_wait_seconds", "Ожидание соединения из пула",
+                               LATENCY_BUCKETS, ("engine",))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+# Статистика текущего HTTP-запроса. Контекст копируется в пул потоков (run_in_threadpool)
+# и в greenlet асинхронного движка, поэтому события движка видят тот же объект
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("fstr_request_stats", default=None)
+# Момент, с которого коду может понадобиться соединение из пула (запрос или flush сессии,
+# engine.connect() в app.replicas): ожидание соединения - время до события checkout пула
+_connection_wanted_at: ContextVar[Optional[float]] = ContextVar("fstr_connection_wanted_at", default=None)
+
+# имя -> (движок, max_overflow его пула)
+_engines = {}
+
+
+def mark_connection_wanted(*args) -> None:
+    """Отмечает начало получения соединения; вызывается перед engine.connect() вне сессии."""
+    _connection_wanted_at.set(time.perf_counter())
+
+
+# do_orm_execute и before_flush срабатывают до того, как сессия берет соединение у движка
+event.listen(Session, "do_orm_execute", mark_connection_wanted)
+event.listen(Session, "before_flush", mark_connection_wanted)
+
+
+def _checkout_listener(name: str):
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        wanted_at = _connection_wanted_at.get()
+        if wanted_at is not None:
+            _connection_wanted_at.set(None)
+            pool_checkout_wait.observe(time.perf_counter() - wanted_at, name)
+    return checkout
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Соединение уже есть: отметка, после которой checkout не понадобился, больше не нужна
+    _connection_wanted_at.set(None)
+    conn.info.setdefault("fstr_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["fstr_query_start"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("fstr_query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine, name: str, max_overflow: int = 0) -> None:
+    """Подключает к движку подсчет SQL-запросов и замер ожидания соединения из пула.
+
+    max_overflow - значение, с которым создан пул движка: емкость пула в метриках
+    считается как pool.size() + max_overflow.
+    """
+    if name in _engines:
+        return
+    _engines[name] = (engine, max_overflow)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(engine, "checkout", _checkout_listener(name))
+
+
+def _pool_lines() -> List[str]:
+    gauges = {
+        "fstr_db_pool_checked_out": ("Выданные соединения пула", []),
+        "fstr_db_pool_capacity": ("Емкость пула с учетом max_overflow", []),
+        "fstr_db_pool_saturation": ("Доля занятых соединений пула", []),
+    }
+    for name, (engine, max_overflow) in sorted(_engines.items()):
+        pool = engine.pool
+        # SingletonThreadPool/StaticPool (SQLite) не ограничены по размеру
+        if not hasattr(pool, "checkedout"):
+            continue
+        checked_out = pool.checkedout()
+        capacity = pool.size() + max(max_overflow, 0)
+        gauges["fstr_db_pool_checked_out"][1].append((name, checked_out))
+        gauges["fstr_db_pool_capacity"][1].append((name, capacity))
+        gauges["fstr_db_pool_saturation"][1].append((name, checked_out / capacity if capacity else 0.0))
+
+    lines = []
+    for metric, (documentation, values) in gauges.items():
+        if values:
+            lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} gauge"]
+            lines += [f'{metric}{{engine="{name}"}} {_format_number(value)}' for name, value in values]
+    return lines
+
+
+def render_metrics(cache_stats: Optional[dict] = None) -> str:
+    lines = []
+    for histogram in (request_latency, request_queries, request_db_time, pool_checkout_wait):
+        lines += histogram.render()
+    lines += _pool_lines()
+    for key, value in sorted((cache_stats or {}).items()):
+        lines += _counter(f"fstr_cache_{key}_total", f"Кэш перевалов: {key}", value)
+    return "\n".join(lines) + "\n"
+
+
+def _route_label(scope) -> str:
+    # Шаблон пути, а не сам путь: у /submitData/{pereval_id} должна быть одна серия
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время запроса, число SQL-запросов и время в БД.
+
+    Замер заканчивается после отправки последней части тела, поэтому потоковые ответы
+    (выгрузка, изображения) учитываются целиком.
+    """
+
+    def __init__(self, app, query_count_warning: int = QUERY_COUNT_WARNING):
+        self.app = app
+        self.query_count_warning = query_count_warning
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            method, route = scope["method"], _route_label(scope)
+            request_latency.observe(elapsed, method, route, str(status_code))
+            request_queries.observe(stats.queries, method, route)
+            request_db_time.observe(stats.db_time, method, route)
+            if stats.queries > self.query_count_warning:
+                logger.warning("%s %s: %d SQL-запросов (%.3f с в БД, %.3f с всего) - возможен N+1",
+                               method, scope["path"], stats.queries, stats.db_time, elapsed)
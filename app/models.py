@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, CheckConstraint, LargeBinary
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import (Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, CheckConstraint, LargeBinary,
+                        Index)
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, text
 from app.database import Base
 
 class User(Base):
@@ -23,6 +24,13 @@ class Coords(Base):
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     height = Column(Float, nullable=False)
+    # Ячейка сетки app.geo для поиска по области: floor(координата / CELL_DEGREES)
+    cell_lat = Column(Integer)
+    cell_lon = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_coords_cell", "cell_lat", "cell_lon"),
+    )
 
     perevals = relationship("PerevalAdded", back_populates="coords")
 
@@ -38,23 +46,51 @@ class PerevalAdded(Base):
     connect = Column(String)
     add_time = Column(DateTime(timezone=True))
     user_id = Column(Integer, ForeignKey("users.id"))
-    coord_id = Column(Integer, ForeignKey("coords.id"))
+    coord_id = Column(Integer, ForeignKey("coords.id"), index=True)
     level_spring = Column(String(2))
     level_summer = Column(String(2))
     level_winter = Column(String(2))
     level_autumn = Column(String(2))
     status = Column(String, nullable=False, default="new", server_default="new")
+    # Увеличивается при каждом изменении перевала: данных, координат, изображений, статуса
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Модератор, взявший запись в работу (new -> pending), и время захвата
+    moderator = Column(String)
+    claimed_at = Column(DateTime(timezone=True))
+    # Названия в единой латинской записи для нечеткого поиска (app.search.search_text).
+    # В PostgreSQL по нему построены GIN-индексы tsvector и pg_trgm (миграция 0005)
+    search_text = Column(String)
+    # Квитанция очереди приема (app.ingest), по которой повторная обработка находит уже записанный перевал
+    ingest_ticket = Column(String(32))
+    # Район (pereval_areas); перевалы района с подрайонами выбираются через pereval_area_closure
+    area_id = Column(Integer, ForeignKey("pereval_areas.id"))
 
     __table_args__ = (
         CheckConstraint(
             "status IN ('new', 'pending', 'accepted', 'rejected')",
             name="check_status_values"
         ),
+        # keyset-пагинация перевалов пользователя: WHERE user_id = ? AND id > ? ORDER BY id
+        Index("ix_pereval_added_user_id_id", "user_id", "id"),
+        # перевалы пользователя за период: WHERE user_id = ? AND date_added >= ?
+        Index("ix_pereval_added_user_id_date_added", "user_id", "date_added"),
+        # фильтр по статусу в выгрузке и модерации, ORDER BY id
+        Index("ix_pereval_added_status_id", "status", "id"),
+        Index("ix_pereval_added_date_added", "date_added"),
+        # очередь модерации: только записи new, WHERE status = 'new' ORDER BY id LIMIT n
+        Index("ix_pereval_added_new_queue", "id", postgresql_where=text("status = 'new'"),
+              sqlite_where=text("status = 'new'")),
+        Index("uq_pereval_added_ingest_ticket", "ingest_ticket", unique=True),
+        # перевалы района: JOIN pereval_area_closure ON descendant_id = area_id ... ORDER BY id
+        Index("ix_pereval_added_area_id_id", "area_id", "id"),
     )
 
     user = relationship("User", back_populates="perevals")
     coords = relationship("Coords", back_populates="perevals")
-    images = relationship("Image", secondary="pereval_images", back_populates="perevals")
+    # Порядок изображений - как в запросе, которым они добавлены (pereval_images.position)
+    images = relationship("Image", secondary="pereval_images", back_populates="perevals",
+                          order_by=lambda: (PerevalImages.position, PerevalImages.id_image))
 
 
 class Image(Base):
@@ -62,18 +98,86 @@ class Image(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     date_added = Column(DateTime(timezone=True), server_default=func.now())
-    img = Column(LargeBinary, nullable=False)
+    # Содержимое хранится в image_blobs/хранилище по content_hash; img остался для записей до миграции
+    img = deferred(Column(LargeBinary, nullable=True))
     title = Column(String)
+    size = Column(Integer)
+    content_hash = Column(String(64), index=True)
+    mime_type = Column(String)
+    width = Column(Integer)
+    height = Column(Integer)
+    # Миниатюра JPEG (app.imaging) хранится как обычное содержимое в image_blobs
+    thumbnail_hash = Column(String(64), index=True)
 
     perevals = relationship("PerevalAdded", secondary="pereval_images", back_populates="images")
 
 
+class ImageBlob(Base):
+    __tablename__ = "image_blobs"
+
+    content_hash = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    mime_type = Column(String)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    date_added = Column(DateTime(timezone=True), server_default=func.now())
+    # Хранилище db: содержимое в image_blob_chunks порциями по chunk_size байт.
+    # У записей до миграции 0012 chunk_size пуст, а содержимое лежит целиком в data
+    chunk_size = Column(Integer)
+    data = deferred(Column(LargeBinary))
+
+
+class ImageBlobChunk(Base):
+    """Порция содержимого image_blobs для хранилища db; seq - номер порции от 0."""
+    __tablename__ = "image_blob_chunks"
+
+    content_hash = Column(String(64), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+
 class PerevalImages(Base):
     __tablename__ = "pereval_images"
 
     id = Column(Integer, primary_key=True, index=True)
     id_pereval = Column(Integer, ForeignKey("pereval_added.id", ondelete="CASCADE"))
     id_image = Column(Integer, ForeignKey("images.id", ondelete="CASCADE"))
+    # Позиция изображения в списке перевала; у записей до миграции 0011 - 0, порядок по id_image
+    position = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # изображения перевала: WHERE id_pereval = ?; заодно запрещает повторную привязку
+        Index("uq_pereval_images_pereval_image", "id_pereval", "id_image", unique=True),
+        Index("ix_pereval_images_id_image", "id_image"),
+    )
+
+
+class PerevalChange(Base):
+    """Журнал изменений перевалов для GET /sync: строка на каждую запись, seq только растет."""
+    __tablename__ = "pereval_changes"
+
+    # В SQLite - INTEGER PRIMARY KEY AUTOINCREMENT: номера удаленных строк не переиспользуются
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    pereval_id = Column(Integer, ForeignKey("pereval_added.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    version = Column(Integer, nullable=False)
+    changed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # изменения пользователя после курсора: WHERE user_id = ? AND seq > ?
+        Index("ix_pereval_changes_user_id_seq", "user_id", "seq"),
+        # очистка журнала: последнее изменение каждого перевала
+        Index("ix_pereval_changes_pereval_id_seq", "pereval_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class PerevalStat(Base):
+    """Число перевалов в группе для GET /stats, ведется путями записи (app.stats)."""
+    __tablename__ = "pereval_stats"
+
+    dimension = Column(String(32), primary_key=True)
+    bucket = Column(String(64), primary_key=True)
+    count = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0, server_default="0")
 
 
 class PerevalAreas(Base):
@@ -84,6 +188,28 @@ class PerevalAreas(Base):
     title = Column(String)
 
 
+class PerevalAreaClosure(Base):
+    """Таблица замыкания дерева районов: пара (предок, потомок) на каждый путь, включая (id, id)."""
+    __tablename__ = "pereval_area_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("pereval_areas.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("pereval_areas.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # предки района при переносе поддерева: WHERE descendant_id = ?
+        Index("ix_pereval_area_closure_descendant_id", "descendant_id", "ancestor_id"),
+    )
+
+
+class PerevalAreaVersion(Base):
+    """Номер версии дерева районов (одна строка): растет при каждом изменении pereval_areas."""
+    __tablename__ = "pereval_area_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0, server_default="0")
+
+
 class SprActivitiesTypes(Base):
     __tablename__ = "spr_activities_types"
 
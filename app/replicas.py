@@ -0,0 +1,111 @@
+"""Чтение с реплик: GET и HEAD идут на реплики по кругу, остальные запросы - на основную БД.
+
+После записи клиент получает cookie, и его чтения до ее истечения идут на основную БД:
+иначе только что отправленный перевал мог бы еще не дойти до реплики. Реплика, к которой
+не удалось подключиться, пропускается на DB_REPLICA_RETRY_SECONDS; если недоступны все,
+чтение идет на основную БД.
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+from sqlalchemy.exc import DBAPIError
+from app.config import DB_REPLICA_STICKY_SECONDS, DB_REPLICA_RETRY_SECONDS
+from app.metrics import mark_connection_wanted
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = frozenset(("GET", "HEAD"))
+STICKY_COOKIE = "fstr_primary_until"
+
+
+class ReplicaPool:
+    """Движки реплик с выбором по кругу и временным исключением недоступных."""
+
+    def __init__(self, engines: Optional[list] = None, retry_seconds: float = DB_REPLICA_RETRY_SECONDS):
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self.set_engines(engines or [])
+
+    def set_engines(self, engines: list) -> None:
+        with self._lock:
+            self.engines = list(engines)
+            self._down_until = {}
+            self._counter = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def is_down(self, engine) -> bool:
+        return self._down_until.get(engine, 0) > time.monotonic()
+
+    def _candidates(self) -> List:
+        with self._lock:
+            if not self.engines:
+                return []
+            start = next(self._counter) % len(self.engines)
+            ordered = self.engines[start:] + self.engines[:start]
+        return [engine for engine in ordered if not self.is_down(engine)]
+
+    def _mark_down(self, engine, error: Exception) -> None:
+        logger.warning("Реплика %s недоступна, следующая попытка через %s с: %s",
+                       engine.url, self.retry_seconds, error)
+        with self._lock:
+            self._down_until[engine] = time.monotonic() + self.retry_seconds
+
+    def connect(self):
+        """Соединение со следующей доступной репликой или None, если доступных нет."""
+        for engine in self._candidates():
+            try:
+                mark_connection_wanted()
+                return engine.connect()
+            except DBAPIError as error:
+                self._mark_down(engine, error)
+        return None
+
+    async def connect_async(self):
+        for engine in self._candidates():
+            try:
+                mark_connection_wanted()
+                return await engine.connect()
+            except DBAPIError as error:
+                self._mark_down(engine, error)
+        return None
+
+
+def reads_from_replica(request) -> bool:
+    if request.method not in READ_METHODS:
+        return False
+    primary_until = request.cookies.get(STICKY_COOKIE)
+    if not primary_until:
+        return True
+    try:
+        return float(primary_until) <= time.time()
+    except ValueError:
+        return True
+
+
+class StickyPrimaryMiddleware:
+    """ASGI-middleware: после успешной записи ставит cookie, по которой чтения клиента
+    DB_REPLICA_STICKY_SECONDS секунд идут на основную БД."""
+
+    def __init__(self, app, pool: ReplicaPool, sticky_seconds: int = DB_REPLICA_STICKY_SECONDS):
+        self.app = app
+        self.pool = pool
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in READ_METHODS or not self.pool:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time()) + self.sticky_seconds
+                cookie = (f"{STICKY_COOKIE}={until}; Max-Age={self.sticky_seconds}; Path=/; HttpOnly; "
+                          f"SameSite=Lax")
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,6 +1,9 @@
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from typing import Optional, List
+from typing import Dict, Optional, List, Literal
 from datetime import datetime
+from app.config import MODERATION_MAX_ITEMS
+
+PerevalStatus = Literal["new", "pending", "accepted", "rejected"]
 
 
 class UserCreate(BaseModel):
@@ -38,6 +41,8 @@ class PerevalCreate(BaseModel):
     user: UserCreate
     coords: CoordsCreate
     level: LevelCreate
+    # Район из GET /areas
+    area_id: Optional[int] = None
     images: List[ImageCreate] = []
 
 
@@ -47,16 +52,60 @@ class SubmitResponse(BaseModel):
     id: int
 
 
+class QueuedSubmitResponse(BaseModel):
+    status: int = 202
+    message: str = "Принято в очередь"
+    ticket: str
+
+
+class IngestTicket(BaseModel):
+    ticket: str
+    # queued - ждет записи, processing - записывается, done - записан (id), failed - отклонен (message)
+    status: Literal["queued", "processing", "done", "failed"]
+    id: Optional[int] = None
+    message: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: int
+    id: Optional[int] = None
+    message: str
+
+
+class BatchSubmitResponse(BaseModel):
+    status: int = 200
+    created: int
+    failed: int
+    items: List[BatchItemResult]
+
+
 class ErrorResponse(BaseModel):
     status: int
     message: str
     detail: Optional[str] = None
 
 
+class ImageInfo(BaseModel):
+    id: int
+    title: Optional[str] = None
+    size: Optional[int] = None
+    content_hash: Optional[str] = None
+    mime_type: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    url: str
+    thumbnail_url: Optional[str] = None
+
+
 class PerevalResponse(PerevalCreate):
     id: int
     status: str
     date_added: datetime
+    version: int
+    images: List[ImageInfo] = []
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -74,6 +123,92 @@ class PerevalList(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class PerevalSearchResult(PerevalList):
+    distance_km: Optional[float] = None
+    score: Optional[float] = None
+
+
+class SyncResponse(BaseModel):
+    cursor: int
+    has_more: bool
+    # Секунд до того, как неустоявшиеся изменения порции позволят сдвинуть курсор
+    retry_after: Optional[int] = None
+    changes: List[PerevalResponse]
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+
+class ModerationClaim(BaseModel):
+    moderator: str = Field(..., min_length=1)
+    limit: int = Field(10, ge=1, le=MODERATION_MAX_ITEMS)
+
+
+class ModerationDecision(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MODERATION_MAX_ITEMS)
+    status: Literal["accepted", "rejected"]
+    moderator: Optional[str] = None
+
+
+class ModerationDecisionResponse(BaseModel):
+    updated: List[int]
+    skipped: List[int]
+
+
+class ModerationQueueStats(BaseModel):
+    new: int
+    pending: int
+    oldest_new_id: Optional[int] = None
+    oldest_new_date: Optional[datetime] = None
+    oldest_new_age_seconds: Optional[float] = None
+
+
+class PerevalStats(BaseModel):
+    total: int
+    status: Dict[str, int]
+    # сезон (spring, summer, autumn, winter) -> категория трудности -> число перевалов
+    level: Dict[str, Dict[str, int]]
+    # диапазон высоты "3000-3500" (нижняя граница включительно) -> число перевалов
+    height: Dict[str, int]
+    # день добавления (UTC) -> число перевалов
+    day: Dict[str, int]
+
+
+class AreaRef(BaseModel):
+    id: int
+    title: Optional[str] = None
+
+
+class AreaNode(AreaRef):
+    # None - корневой район
+    parent_id: Optional[int] = None
+    children: List["AreaNode"] = []
+
+
+class AreaDetail(AreaNode):
+    # Предки района от корня
+    path: List[AreaRef] = []
+
+
+class AreaCreate(BaseModel):
+    title: str = Field(..., min_length=1)
+    parent_id: Optional[int] = None
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class AreaUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1)
+    # Явный null переносит район в корень; отсутствие поля оставляет родителя прежним
+    parent_id: Optional[int] = None
+
+    model_config = ConfigDict(extra="forbid")
+
+
 class PerevalUpdate(BaseModel):
     beauty_title: Optional[str] = None
     title: Optional[str] = None
@@ -82,6 +217,7 @@ class PerevalUpdate(BaseModel):
     add_time: Optional[datetime] = None
     coords: Optional[CoordsCreate] = None
     level: Optional[LevelCreate] = None
+    area_id: Optional[int] = None
     images: Optional[List[ImageCreate]] = None
 
     model_config = ConfigDict(extra="forbid")
@@ -0,0 +1,196 @@
+"""Нечеткий поиск по названиям перевалов.
+
+Названия приводятся к единой латинской записи (транслитерация кириллицы, нижний регистр),
+поэтому "Kazbek", "казбек" и "Казбэк" дают близкие наборы триграмм. В PostgreSQL по этой
+записи (pereval_added.search_text) строятся индексы tsvector и pg_trgm, в остальных СУБД
+используется инвертированный индекс триграмм в памяти процесса (NgramIndex).
+"""
+import math
+import re
+import threading
+from array import array
+from itertools import islice
+from typing import Callable, Iterable, List, Optional, Tuple
+from app.config import TEXT_SEARCH_MAX_CHECKED
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "c", "ч": "ch", "ш": "sh", "щ": "sh",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+# Разные латинские записи одних звуков: Khan/Han, Tsey/Cei, Jalovchat/Yalovchat
+_LATIN_VARIANTS = (("kh", "h"), ("ts", "c"), ("shch", "sh"), ("j", "y"), ("w", "v"), ("x", "ks"), ("iy", "i"),
+                   ("ii", "i"), ("ay", "ai"), ("ey", "ei"), ("oy", "oi"), ("uy", "ui"))
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+# Общие слова из названий ("Перевал Казбек", "Седловина Эльбруса") почти ничего не различают,
+# но их триграммы есть у большей части записей
+STOP_WORDS = frozenset(("pereval", "per", "sedlovina", "sedl", "pass", "pas"))
+
+# Доля триграмм запроса, которые должны найтись в названии; как pg_trgm.word_similarity_threshold
+MIN_SCORE = 0.6
+
+
+def normalize(text: Optional[str]) -> str:
+    text = (text or "").lower().translate(_TRANSLIT)
+    for variant, canonical in _LATIN_VARIANTS:
+        text = text.replace(variant, canonical)
+    words = _NON_WORD.sub(" ", text).split()
+    # Название из одних общих слов оставляется как есть
+    return " ".join([word for word in words if word not in STOP_WORDS] or words)
+
+
+def search_text(*titles: Optional[str]) -> str:
+    """Значение pereval_added.search_text для названий перевала."""
+    return " ".join(part for part in (normalize(title) for title in titles) if part)
+
+
+def trigrams(text: str) -> set:
+    """Триграммы слов как в pg_trgm: слово дополняется двумя пробелами слева и одним справа."""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class NgramIndex:
+    """Инвертированный индекс триграмм search_text -> id перевала.
+
+    Оценка совпадения - доля триграмм запроса, найденных в названии (как word_similarity
+    в pg_trgm); при равенстве выше более короткие названия. Кандидаты берутся только из
+    списков самых редких триграмм запроса: название с долей не меньше MIN_SCORE обязано
+    содержать хотя бы одну из них, поэтому частые триграммы ("per" из "pereval") не читаются.
+    На один запрос проверяется не больше max_checked названий: списки читаются от редких
+    триграмм к частым, и непроверенными остаются кандидаты на все более слабые совпадения.
+
+    Индекс строится при первом поиске функцией load; изменения, пришедшие во время
+    построения, применяются после него.
+    """
+
+    def __init__(self, max_checked: int = TEXT_SEARCH_MAX_CHECKED):
+        self.max_checked = max_checked
+        self._trigram_ids = {}
+        self._postings = {}
+        self._documents = {}
+        self._pending = []
+        self._ready = False
+        self._building = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _encode(self, text: str) -> array:
+        ids = array("I")
+        for trigram in trigrams(text):
+            trigram_id = self._trigram_ids.get(trigram)
+            if trigram_id is None:
+                trigram_id = self._trigram_ids[trigram] = len(self._trigram_ids)
+            ids.append(trigram_id)
+        return ids
+
+    def _add(self, doc_id: int, text: str) -> None:
+        encoded = self._encode(text)
+        previous = self._documents.get(doc_id)
+        self._documents[doc_id] = encoded
+        # Старые записи в списках не удаляются: кандидаты проверяются по текущим триграммам
+        known = set(previous) if previous is not None else ()
+        for trigram_id in encoded:
+            if trigram_id not in known:
+                self._postings.setdefault(trigram_id, array("I")).append(doc_id)
+
+    def add(self, doc_id: int, text: str) -> None:
+        with self._lock:
+            if self._ready:
+                self._add(doc_id, text)
+            elif self._building:
+                self._pending.append((doc_id, text))
+
+    def add_many(self, documents: Iterable[Tuple[int, str]]) -> None:
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+
+    def load(self, rows: Callable[[], Iterable[Tuple[int, str]]]) -> None:
+        """Строит индекс по (id, search_text) из rows(), если он еще не построен."""
+        if self._ready:
+            return
+        with self._build_lock:
+            if self._ready:
+                return
+            with self._lock:
+                self._building = True
+            try:
+                for doc_id, text in rows():
+                    self._add(doc_id, text or "")
+                with self._lock:
+                    for doc_id, text in self._pending:
+                        self._add(doc_id, text)
+                    self._pending.clear()
+                    self._ready = True
+            finally:
+                with self._lock:
+                    self._building = False
+
+    def clear(self) -> None:
+        with self._build_lock, self._lock:
+            self._trigram_ids.clear()
+            self._postings.clear()
+            self._documents.clear()
+            self._pending.clear()
+            self._ready = False
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """Пары (id, оценка) по убыванию оценки, не больше limit."""
+        query_trigrams = trigrams(normalize(query))
+        if not query_trigrams:
+            return []
+        total = len(query_trigrams)
+        min_required = math.ceil(MIN_SCORE * total)
+        with self._lock:
+            known = [trigram_id for trigram_id in (self._trigram_ids.get(trigram) for trigram in query_trigrams)
+                     if trigram_id is not None]
+            if len(known) < min_required:
+                return []
+            known.sort(key=lambda trigram_id: len(self._postings.get(trigram_id, ())))
+            query_ids = set(known)
+            shared_by_doc = {}
+            checked = set()
+            count_shared = query_ids.intersection
+            documents = self._documents
+            scanned = 0
+            # Порог снижается от полного совпадения до MIN_SCORE: для порога required достаточно
+            # len(known) - required + 1 самых редких списков. Как только найдено limit названий
+            # с порогом не ниже текущего, более слабые совпадения в ответ уже не попадут
+            for required in range(len(known), min_required - 1, -1):
+                fresh = set()
+                budget = self.max_checked - len(checked)
+                for trigram_id in known[scanned:len(known) - required + 1]:
+                    postings = self._postings.get(trigram_id, ())
+                    # islice: длинный список не копируется целиком ради нескольких кандидатов
+                    fresh.update(islice(postings, budget - len(fresh)) if len(postings) > budget else postings)
+                    fresh.difference_update(checked)
+                    if len(fresh) >= budget:
+                        break
+                exhausted = len(fresh) >= budget
+                fresh = set(islice(fresh, budget)) if exhausted else fresh
+                checked |= fresh
+                for doc_id in fresh:
+                    shared = len(count_shared(documents[doc_id]))
+                    if shared >= min_required:
+                        shared_by_doc[doc_id] = shared
+                scanned = len(known) - required + 1
+                if exhausted or sum(shared >= required for shared in shared_by_doc.values()) >= limit:
+                    break
+            scored = [(shared / total, shared / (total + len(self._documents[doc_id]) - shared), doc_id)
+                      for doc_id, shared in shared_by_doc.items()]
+        scored.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [(doc_id, round(score, 4)) for score, _, doc_id in scored[:limit]]
+
+
+title_index = NgramIndex()
@@ -0,0 +1,81 @@
+"""Счетчики перевалов для GET /stats.
+
+Таблица pereval_stats хранит число перевалов в каждой группе (dimension, bucket): по статусу,
+по категории трудности в каждый сезон, по диапазону высоты и по дню добавления. Пути записи
+в app.crud меняют счетчики в той же транзакции, что и сами перевалы, поэтому ответ читает
+только строки счетчиков и не зависит от числа перевалов. Если счетчики разошлись с данными
+(ручная правка БД, смена STATS_HEIGHT_BAND), таблица пересчитывается командой
+python -m app.manage rebuild-stats.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+from app.config import STATS_HEIGHT_BAND
+
+SEASONS = ("spring", "summer", "autumn", "winter")
+
+
+def height_band(height: float) -> str:
+    """Диапазон высоты "нижняя-верхняя" шириной STATS_HEIGHT_BAND метров: 3000-3500."""
+    low = int(height // STATS_HEIGHT_BAND * STATS_HEIGHT_BAND)
+    return f"{low}-{low + STATS_HEIGHT_BAND}"
+
+
+def day_of(value: datetime) -> str:
+    # SQLite возвращает время в UTC без часового пояса, PostgreSQL - в часовом поясе сессии
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date().isoformat()
+
+
+def buckets(status: Optional[str] = None, levels: Optional[dict] = None, height: Optional[float] = None,
+            date_added: Optional[datetime] = None) -> List[Tuple[str, str]]:
+    """Группы (dimension, bucket), в которые входит перевал; не указанные признаки пропускаются."""
+    result = []
+    if status is not None:
+        result.append(("status", status))
+    for season, level in (levels or {}).items():
+        if level:
+            result.append((f"level_{season}", level))
+    if height is not None:
+        result.append(("height", height_band(height)))
+    if date_added is not None:
+        result.append(("day", day_of(date_added)))
+    return result
+
+
+def count_buckets(rows: Iterable) -> Counter:
+    """Счетчики по строкам (status, level_spring, level_summer, level_autumn, level_winter,
+    height, date_added) - для полного пересчета."""
+    counts = Counter()
+    for status, *levels, height, date_added in rows:
+        counts.update(buckets(status, dict(zip(SEASONS, levels)), height, date_added))
+    return counts
+
+
+def deltas(added: Iterable[Tuple[str, str]] = (), removed: Iterable[Tuple[str, str]] = ()) -> List[dict]:
+    """Ненулевые изменения счетчиков, отсортированные по ключу.
+
+    Порядок строк одинаков во всех транзакциях, поэтому одновременные записи блокируют
+    строки счетчиков в одном порядке и не взаимоблокируются.
+    """
+    counts = Counter(added)
+    counts.subtract(removed)
+    return [{"dimension": dimension, "bucket": bucket, "count": count}
+            for (dimension, bucket), count in sorted(counts.items()) if count]
+
+
+def render(rows: Iterable[Tuple[str, str, int]]) -> dict:
+    """Ответ GET /stats из строк (dimension, bucket, count)."""
+    result = {"total": 0, "status": {}, "level": {season: {} for season in SEASONS}, "height": {}, "day": {}}
+    for dimension, bucket, count in rows:
+        if count <= 0:
+            continue
+        if dimension.startswith("level_"):
+            result["level"][dimension.removeprefix("level_")][bucket] = count
+        else:
+            result[dimension][bucket] = count
+    result["total"] = sum(result["status"].values())
+    result["height"] = dict(sorted(result["height"].items(), key=lambda item: int(item[0].rsplit("-", 1)[0])))
+    result["day"] = dict(sorted(result["day"].items()))
+    return result
@@ -0,0 +1,310 @@
+import hashlib
+import os
+import tempfile
+import time
+from collections import Counter
+from typing import BinaryIO, Iterator, List, NamedTuple, Tuple
+from sqlalchemy import bindparam, func, or_, update
+from sqlalchemy.orm import Session
+from app.config import IMAGE_STORAGE, IMAGE_DIR, IMAGE_CHUNK_SIZE
+from app.database import dialect_insert
+from app.models import Image, ImageBlob, ImageBlobChunk
+from app import imaging
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Хранилище db копит порции до CHUNKS_PER_INSERT * IMAGE_CHUNK_SIZE байт на один INSERT
+CHUNKS_PER_INSERT = 16
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_mime(head: bytes) -> str:
+    for signature, mime_type in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1"):
+        return "image/heic"
+    return "application/octet-stream"
+
+
+class BlobInfo(NamedTuple):
+    content_hash: str
+    size: int
+    mime_type: str
+
+
+def hash_file(file: BinaryIO) -> BlobInfo:
+    """Считает SHA-256, размер и MIME-тип файла, читая его порциями. Позиция возвращается в начало."""
+    file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    while chunk := file.read(HASH_CHUNK_SIZE):
+        if not head:
+            head = chunk[:16]
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return BlobInfo(digest.hexdigest(), size, sniff_mime(head))
+
+
+class ImageStorage:
+    """Хранилище содержимого изображений, адресуемое SHA-256.
+
+    Учет ссылок ведется в таблице image_blobs; хранилище отвечает только за байты.
+    """
+
+    def write(self, db: Session, blob: ImageBlob, file: BinaryIO) -> None:
+        raise NotImplementedError
+
+    def write_many(self, db: Session, items: List[Tuple[ImageBlob, BinaryIO]]) -> None:
+        for blob, file in items:
+            self.write(db, blob, file)
+
+    def read(self, db: Session, blob: ImageBlob, offset: int, length: int) -> bytes:
+        raise NotImplementedError
+
+    def source(self, db: Session, blob: ImageBlob) -> imaging.Source:
+        """Содержимое для app.imaging: путь к файлу, если он есть, иначе байты."""
+        return self.read(db, blob, 0, blob.size)
+
+    def delete(self, content_hash: str) -> None:
+        raise NotImplementedError
+
+    def orphans(self, known_hashes: set, grace_seconds: int) -> Iterator[str]:
+        """Ключи содержимого, на которые нет записей в image_blobs."""
+        return iter(())
+
+
+class DatabaseImageStorage(ImageStorage):
+    """Содержимое хранится в таблице image_blob_chunks порциями по IMAGE_CHUNK_SIZE байт.
+
+    Файлы читаются порциями, а порции всех файлов пачки пишутся общими INSERT: в памяти
+    не больше CHUNKS_PER_INSERT порций, а мелкие файлы не добавляют по запросу на каждый.
+    Записи до миграции 0012 (chunk_size не задан) читаются из столбца image_blobs.data.
+    """
+
+    def write(self, db: Session, blob: ImageBlob, file: BinaryIO) -> None:
+        self.write_many(db, [(blob, file)])
+
+    def write_many(self, db: Session, items: List[Tuple[ImageBlob, BinaryIO]]) -> None:
+        # Те же порции может одновременно писать первая загрузка того же содержимого (см. store_blobs)
+        statement = dialect_insert(db, ImageBlobChunk).on_conflict_do_nothing()
+        rows, buffered = [], 0
+        for blob, file in items:
+            blob.chunk_size = IMAGE_CHUNK_SIZE
+            file.seek(0)
+            seq = 0
+            while chunk := file.read(IMAGE_CHUNK_SIZE):
+                rows.append({"content_hash": blob.content_hash, "seq": seq, "data": chunk})
+                seq, buffered = seq + 1, buffered + len(chunk)
+                if buffered >= CHUNKS_PER_INSERT * IMAGE_CHUNK_SIZE:
+                    db.execute(statement, rows)
+                    rows, buffered = [], 0
+        if rows:
+            db.execute(statement, rows)
+
+    def read(self, db: Session, blob: ImageBlob, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        if not blob.chunk_size:
+            chunk = db.query(func.substr(ImageBlob.data, offset + 1, length)).filter(
+                ImageBlob.content_hash == blob.content_hash).scalar()
+            return bytes(chunk) if chunk else b""
+        first, last = offset // blob.chunk_size, (offset + length - 1) // blob.chunk_size
+        chunks = db.query(ImageBlobChunk.data).filter(
+            ImageBlobChunk.content_hash == blob.content_hash, ImageBlobChunk.seq.between(first, last)
+        ).order_by(ImageBlobChunk.seq)
+        data = b"".join(bytes(chunk) for (chunk,) in chunks)
+        start = offset - first * blob.chunk_size
+        return data[start:start + length]
+
+    def delete(self, content_hash: str) -> None:
+        # Порции удаляются вместе со строкой image_blobs (collect_garbage)
+        pass
+
+
+class LocalImageStorage(ImageStorage):
+    """Содержимое хранится в файлах root/ab/cd/<sha256>."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash)
+
+    def write(self, db: Session, blob: ImageBlob, file: BinaryIO) -> None:
+        path = self.path(blob.content_hash)
+        try:
+            # Файл уже есть (его строку мог только что удалить сборщик): свежее время изменения
+            # защищает файл от удаления на grace_seconds, пока эта транзакция не зафиксирована
+            os.utime(path)
+            return
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while chunk := file.read(HASH_CHUNK_SIZE):
+                    tmp.write(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def read(self, db: Session, blob: ImageBlob, offset: int, length: int) -> bytes:
+        with open(self.path(blob.content_hash), "rb") as file:
+            file.seek(offset)
+            return file.read(length)
+
+    def source(self, db: Session, blob: ImageBlob) -> imaging.Source:
+        return self.path(blob.content_hash)
+
+    def orphans(self, known_hashes: set, grace_seconds: int) -> Iterator[str]:
+        # Свежие файлы не трогаем: их могла записать еще не завершенная транзакция
+        deadline = time.time() - grace_seconds
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.startswith(".tmp-") or name in known_hashes:
+                    continue
+                if os.path.getmtime(os.path.join(dirpath, name)) <= deadline:
+                    yield name
+
+    def delete(self, content_hash: str) -> None:
+        try:
+            os.unlink(self.path(content_hash))
+        except FileNotFoundError:
+            pass
+
+
+def _stored_hashes(db: Session, hashes: set) -> set:
+    return {content_hash for (content_hash,) in
+            db.query(ImageBlob.content_hash).filter(ImageBlob.content_hash.in_(hashes))}
+
+
+def _write_blobs(db: Session, storage: ImageStorage, files: List[BinaryIO], infos: List[BlobInfo],
+                 hashes: set) -> None:
+    """Записывает содержимое hashes и вставляет для него строки image_blobs с ref_count = 0.
+
+    INSERT ... ON CONFLICT DO NOTHING: одновременная первая загрузка того же содержимого
+    в другой транзакции не приводит к ошибке первичного ключа.
+    """
+    new_blobs, writes = {}, []
+    for file, info in zip(files, infos):
+        if info.content_hash not in hashes or info.content_hash in new_blobs:
+            continue
+        blob = ImageBlob(content_hash=info.content_hash, size=info.size, mime_type=info.mime_type, ref_count=0)
+        writes.append((blob, file))
+        new_blobs[info.content_hash] = blob
+    storage.write_many(db, writes)
+    if new_blobs:
+        db.execute(dialect_insert(db, ImageBlob).on_conflict_do_nothing(index_elements=[ImageBlob.content_hash]), [
+            {"content_hash": blob.content_hash, "size": blob.size, "mime_type": blob.mime_type, "ref_count": 0,
+             "chunk_size": blob.chunk_size} for blob in new_blobs.values()
+        ])
+
+
+def _add_refs(db: Session, refs: Counter) -> None:
+    blobs = ImageBlob.__table__
+    db.execute(
+        update(blobs).where(blobs.c.content_hash == bindparam("blob_hash"))
+        .values(ref_count=blobs.c.ref_count + bindparam("refs")),
+        [{"blob_hash": content_hash, "refs": count} for content_hash, count in refs.items()]
+    )
+
+
+def store_blobs(db: Session, files: List[BinaryIO], storage: ImageStorage = None) -> List[BlobInfo]:
+    """Сохраняет содержимое (один раз на каждый SHA-256) и увеличивает счетчики ссылок.
+
+    Новое содержимое пишется и вставляется одним INSERT, счетчики обновляются одним executemany.
+    Между проверкой существования и UPDATE сборщик мусора мог удалить строку с ref_count = 0:
+    UPDATE ее уже не найдет. Поэтому после UPDATE строки проверяются еще раз, и удаленное
+    содержимое записывается заново (число строк executemany не во всех драйверах надежно).
+    """
+    storage = storage or image_storage
+    infos = [hash_file(file) for file in files]
+    if not infos:
+        return infos
+
+    refs = Counter(info.content_hash for info in infos)
+    _write_blobs(db, storage, files, infos, set(refs) - _stored_hashes(db, set(refs)))
+    _add_refs(db, refs)
+    # Строки, которые нашел UPDATE, заблокированы этой транзакцией, и ref_count у них уже > 0:
+    # сборщик их не удалит. Отсутствующие удалены им после проверки выше
+    collected = set(refs) - _stored_hashes(db, set(refs))
+    if collected:
+        _write_blobs(db, storage, files, infos, collected)
+        _add_refs(db, Counter({content_hash: refs[content_hash] for content_hash in collected}))
+    return infos
+
+
+def store_blob(db: Session, file: BinaryIO, storage: ImageStorage = None) -> BlobInfo:
+    return store_blobs(db, [file], storage)[0]
+
+
+def release_blobs(db: Session, content_hashes: List[str]) -> None:
+    """Уменьшает счетчики ссылок одним executemany; само содержимое удаляет сборщик мусора."""
+    refs = Counter(content_hash for content_hash in content_hashes if content_hash)
+    if not refs:
+        return
+    blobs = ImageBlob.__table__
+    db.execute(
+        update(blobs).where(blobs.c.content_hash == bindparam("blob_hash"))
+        .values(ref_count=blobs.c.ref_count - bindparam("refs")),
+        [{"blob_hash": content_hash, "refs": count} for content_hash, count in refs.items()]
+    )
+
+
+def collect_garbage(db: Session, storage: ImageStorage = None, grace_seconds: int = 3600) -> dict:
+    """Удаляет содержимое, на которое не ссылается ни одно изображение.
+
+    Строки image_blobs (и порции хранилища db) удаляются в одной транзакции. Файлы хранилища
+    local удаляются после фиксации общим проходом по файлам без строк, только если они не
+    менялись grace_seconds: файл удаленной строки могла только что снова записать store_blobs.
+    """
+    storage = storage or image_storage
+    referenced = db.query(Image.id).filter(or_(Image.content_hash == ImageBlob.content_hash,
+                                               Image.thumbnail_hash == ImageBlob.content_hash)).exists()
+    unreferenced = db.query(ImageBlob).filter(ImageBlob.ref_count <= 0, ~referenced).all()
+
+    removed = []
+    for blob in unreferenced:
+        deleted = db.query(ImageBlob).filter(ImageBlob.content_hash == blob.content_hash,
+                                             ImageBlob.ref_count <= 0).delete(synchronize_session=False)
+        if deleted:
+            db.query(ImageBlobChunk).filter(ImageBlobChunk.content_hash == blob.content_hash).delete(
+                synchronize_session=False)
+            removed.append(blob.content_hash)
+    db.commit()
+
+    # Файлы удаляются только после фиксации: при откате транзакции содержимое должно сохраниться
+    known_hashes = {content_hash for (content_hash,) in db.query(ImageBlob.content_hash)}
+    swept = list(storage.orphans(known_hashes, grace_seconds))
+    for content_hash in swept:
+        storage.delete(content_hash)
+
+    removed_hashes = set(removed)
+    return {"blobs": len(removed), "orphans": len([name for name in swept if name not in removed_hashes])}
+
+
+def build_storage(kind: str = IMAGE_STORAGE) -> ImageStorage:
+    if kind == "db":
+        return DatabaseImageStorage()
+    if kind == "local":
+        return LocalImageStorage(IMAGE_DIR)
+    raise ValueError(f"Неизвестное хранилище изображений: {kind}")
+
+
+image_storage = build_storage()
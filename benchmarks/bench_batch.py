@@ -0,0 +1,79 @@
+"""Пропускная способность пакетной вставки против поштучного create_pereval.
+
+Запуск: python -m benchmarks.bench_batch --items 500 --images 1 [--db-url postgresql://...]
+По умолчанию используется файл SQLite во временном каталоге.
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import PerevalRepository
+from benchmarks.bench_api import make_image
+from app.database import Base
+from app.schemas import PerevalCreate
+
+
+def make_items(count: int, images: int, prefix: str):
+    rng = random.Random(prefix)
+    return [PerevalCreate(**{
+        "title": f"Перевал {i}",
+        "user": {"email": f"{prefix}{i % 50}@example.com", "fam": "Иванов", "name": "Иван"},
+        "coords": {"latitude": 43 + i / 1e4, "longitude": 42 + i / 1e4, "height": 3000 + i % 500},
+        "level": {"summer": "1А"},
+        "images": [{"img": base64.b64encode(make_image(rng, 2)).decode(), "title": f"Фото {j}"}
+                   for j in range(images)],
+    }) for i in range(count)]
+
+
+def measure(engine, label, insert):
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    try:
+        insert()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    elapsed = time.perf_counter() - started
+    return {"mode": label, "seconds": round(elapsed, 3), "statements": statements}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--images", type=int, default=1)
+    parser.add_argument("--db-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(args.db_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, autoflush=False)
+
+        loop_items = make_items(args.items, args.images, "loop")
+        batch_items = make_items(args.items, args.images, "batch")
+        with Session() as db:
+            loop = measure(engine, "loop", lambda: [PerevalRepository.create_pereval(db, item) for item in loop_items])
+        with Session() as db:
+            batch = measure(engine, "batch", lambda: PerevalRepository.create_perevals_batch(db, batch_items))
+        engine.dispose()
+
+    for result in (loop, batch):
+        result["items_per_second"] = round(args.items / result["seconds"], 1)
+    print(json.dumps({"items": args.items, "images_per_item": args.images, "results": [loop, batch],
+                      "speedup": round(loop["seconds"] / batch["seconds"], 1)}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
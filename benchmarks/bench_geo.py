@@ -0,0 +1,97 @@
+"""Поиск перевалов по области на большом наборе координат.
+
+Заполняет файл SQLite (или базу по --db-url) N точками в районе 35-55 с.ш., 30-90 в.д. и
+замеряет запросы bbox, radius и k ближайших через PerevalRepository, а также для сравнения
+тот же bbox простым фильтром по широте/долготе без индекса ячеек.
+
+Запуск: python -m benchmarks.bench_geo --count 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.crud import PerevalRepository, _pereval_list_query
+from app.database import Base
+from app.geo import grid_cells
+from app.models import Coords, PerevalAdded, User
+
+CHUNK = 50_000
+
+
+def seed(engine, count: int, rng: random.Random):
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "email": "bench@example.com", "fam": "Иванов", "name": "Иван"}])
+        for start in range(0, count, CHUNK):
+            ids = range(start + 1, min(start + CHUNK, count) + 1)
+            coords = []
+            for coord_id in ids:
+                latitude, longitude = rng.uniform(35, 55), rng.uniform(30, 90)
+                coords.append({"id": coord_id, "latitude": latitude, "longitude": longitude,
+                               "height": rng.uniform(1000, 7000), **grid_cells(latitude, longitude)})
+            conn.execute(insert(Coords), coords)
+            conn.execute(insert(PerevalAdded), [{"id": i, "title": f"Перевал {i}", "user_id": 1, "coord_id": i,
+                                                 "status": "new"} for i in ids])
+
+
+def timed(run, repeat: int) -> dict:
+    samples = []
+    found = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = len(run())
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"p50_ms": round(statistics.median(samples), 2),
+            "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 2), "found_last": found}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--db-url")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(args.db_url or f"sqlite:///{os.path.join(workdir, 'geo.db')}")
+        Base.metadata.create_all(engine)
+        started = time.perf_counter()
+        seed(engine, args.count, rng)
+        seeded = time.perf_counter() - started
+
+        points = [(rng.uniform(37, 53), rng.uniform(32, 88)) for _ in range(args.repeat)]
+        point = iter(points * 4)
+        with sessionmaker(bind=engine)() as db:
+            def bbox():
+                lat, lon = next(point)
+                return PerevalRepository.search_perevals_in_bbox(db, lon, lat, lon + 1, lat + 0.5, limit=1000)
+
+            def bbox_without_index():
+                lat, lon = next(point)
+                return _pereval_list_query(db).filter(
+                    Coords.latitude.between(lat, lat + 0.5), Coords.longitude.between(lon, lon + 1)
+                ).order_by(PerevalAdded.id).limit(1000).all()
+
+            results = {
+                "bbox_1x0.5deg": timed(bbox, args.repeat),
+                "bbox_1x0.5deg_no_cell_index": timed(bbox_without_index, min(args.repeat, 5)),
+                "radius_25km": timed(lambda: PerevalRepository.search_perevals_in_radius(db, *next(point), 25),
+                                     args.repeat),
+                "nearest_10": timed(lambda: PerevalRepository.search_nearest_perevals(db, *next(point), 10),
+                                    args.repeat),
+            }
+        engine.dispose()
+
+    print(json.dumps({"count": args.count, "seed_seconds": round(seeded, 1), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
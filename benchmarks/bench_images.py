@@ -0,0 +1,84 @@
+"""Обработка изображений при приеме (app.imaging): пропускная способность по числу процессов пула.
+
+Для каждого числа процессов обрабатывается один и тот же набор JPEG: проверка, миниатюра,
+удаление большого EXIF. 0 - обработка в вызывающем потоке, как при FSTR_IMAGE_WORKERS=0.
+Ускорение ограничено числом ядер машины (cpu_count в результатах).
+
+Запуск:
+    python -m benchmarks.bench_images --workers 0,1,2,4 --images 32 --size 2000
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="0,1,2,4", help="Число процессов пула, через запятую")
+    parser.add_argument("--images", type=int, default=32, help="Изображений в наборе")
+    parser.add_argument("--size", type=int, default=2000, help="Сторона изображения в пикселях")
+    parser.add_argument("--exif-kb", type=int, default=48, help="Размер EXIF в каждом изображении, КБ")
+    parser.add_argument("--output", help="Файл для результатов в JSON")
+    return parser.parse_args(argv)
+
+
+def make_jpeg(size: int, exif_kb: int, seed: int) -> bytes:
+    from PIL import Image
+
+    image = Image.effect_noise((size, size), 32 + seed % 64).convert("RGB")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    # UserComment: большой EXIF, как у снимков с миниатюрой и данными производителя
+    exif.get_ifd(0x8769)[0x9286] = b"ASCII\x00\x00\x00" + b"x" * (exif_kb * 1024)
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90, exif=exif)
+    return output.getvalue()
+
+
+def measure(datas, workers: int) -> dict:
+    from app import imaging
+
+    if workers == 0:
+        started = time.perf_counter()
+        for data in datas:
+            imaging.process_image(data)
+        elapsed = time.perf_counter() - started
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            # Первый проход запускает процессы и импортирует Pillow - в замер не входит
+            imaging.process_many(datas[:workers], executor=pool)
+            started = time.perf_counter()
+            imaging.process_many(datas, executor=pool)
+            elapsed = time.perf_counter() - started
+    return {"seconds": round(elapsed, 3), "images_per_second": round(len(datas) / elapsed, 1)}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # БД не нужна, но app.config читается при импорте app.imaging
+    os.environ.setdefault("FSTR_DB_URL", "sqlite://")
+    os.environ.setdefault("FSTR_DB_ASYNC", "0")
+    datas = [make_jpeg(args.size, args.exif_kb, seed) for seed in range(args.images)]
+    results = {f"workers_{workers}": measure(datas, workers)
+               for workers in (int(value) for value in args.workers.split(","))}
+    baseline = results.get("workers_0")
+    if baseline:
+        for result in results.values():
+            result["speedup"] = round(baseline["seconds"] / result["seconds"], 2)
+
+    result = {"config": vars(args),
+              "environment": {"python": platform.python_version(), "cpu_count": os.cpu_count()},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, ensure_ascii=False, indent=2)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
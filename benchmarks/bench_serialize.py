@@ -0,0 +1,104 @@
+"""Сериализация ответа GET /submitData/{id}: с валидацией и без нее.
+
+validated - прежний путь: словарь, PerevalResponse(**data) с полной валидацией, model_dump_json().encode().
+direct - текущий путь: словарь из записи ORM сразу в bytes через pydantic_core.to_json.
+Записи ORM собираются в памяти, без БД. Для каждого пути: время на ответ и пик выделенной памяти.
+
+Запуск:
+    python -m benchmarks.bench_serialize --images 0,10,100 --repeat 2000
+"""
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", default="0,10,100", help="Число изображений у перевала, через запятую")
+    parser.add_argument("--repeat", type=int, default=2000, help="Сериализаций на замер")
+    parser.add_argument("--output", help="Файл для результатов в JSON")
+    return parser.parse_args(argv)
+
+
+def make_pereval(images: int):
+    from app.models import Coords, Image, PerevalAdded, User
+
+    return PerevalAdded(
+        id=1, status="new", date_added=datetime.now(), version=3, beauty_title="пер.", title="Казбек",
+        other_titles="Казбек Северный", connect="", add_time=datetime.now(),
+        level_spring="1А", level_summer="1Б", level_autumn=None, level_winter="2А",
+        user=User(email="user@example.com", phone="+79990000000", fam="Иванов", name="Иван", otc="Иванович"),
+        coords=Coords(latitude=42.7, longitude=44.52, height=5033.0),
+        images=[Image(id=index, title=f"Фото {index}", size=250_000, content_hash=f"{index:064x}",
+                      mime_type="image/jpeg") for index in range(1, images + 1)],
+    )
+
+
+def validated(pereval) -> bytes:
+    from app.schemas import PerevalResponse
+
+    data = {
+        "id": pereval.id, "status": pereval.status, "date_added": pereval.date_added, "version": pereval.version,
+        "beauty_title": pereval.beauty_title, "title": pereval.title, "other_titles": pereval.other_titles,
+        "connect": pereval.connect, "add_time": pereval.add_time,
+        "user": {"email": pereval.user.email, "phone": pereval.user.phone, "fam": pereval.user.fam,
+                 "name": pereval.user.name, "otc": pereval.user.otc},
+        "coords": {"latitude": pereval.coords.latitude, "longitude": pereval.coords.longitude,
+                   "height": pereval.coords.height},
+        "level": {"spring": pereval.level_spring, "summer": pereval.level_summer,
+                  "autumn": pereval.level_autumn, "winter": pereval.level_winter},
+        "images": [{"id": image.id, "title": image.title, "size": image.size, "content_hash": image.content_hash,
+                    "mime_type": image.mime_type, "width": image.width, "height": image.height,
+                    "url": f"/images/{image.id}", "thumbnail_url": None} for image in pereval.images],
+    }
+    return PerevalResponse(**data).model_dump_json().encode()
+
+
+def direct(pereval) -> bytes:
+    from pydantic_core import to_json
+    from app.crud import _pereval_response_data
+
+    return to_json(_pereval_response_data(pereval))
+
+
+def measure(serialize, pereval, repeat: int) -> dict:
+    serialize(pereval)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        serialize(pereval)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    serialize(pereval)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"us_per_response": round(elapsed / repeat * 1_000_000, 1), "peak_alloc_kb": round(peak / 1024, 1)}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # БД не нужна, но app.crud при импорте создает движок по FSTR_DB_URL
+    os.environ.setdefault("FSTR_DB_URL", "sqlite://")
+    os.environ.setdefault("FSTR_DB_ASYNC", "0")
+    results = {}
+    for images in (int(value) for value in args.images.split(",")):
+        pereval = make_pereval(images)
+        assert validated(pereval) == direct(pereval)
+        paths = {name: measure(serialize, pereval, args.repeat)
+                 for name, serialize in (("validated", validated), ("direct", direct))}
+        paths["speedup"] = round(paths["validated"]["us_per_response"] / paths["direct"]["us_per_response"], 2)
+        results[f"images_{images}"] = paths
+
+    result = {"config": vars(args), "environment": {"python": platform.python_version()}, "results": results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, ensure_ascii=False, indent=2)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
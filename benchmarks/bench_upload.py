@@ -0,0 +1,105 @@
+"""Пиковое потребление памяти сервером при отправке перевала с крупным изображением.
+
+Сравнивает JSON с изображением в base64 (POST /submitData/) и multipart/form-data
+(POST /submitData/upload). Для каждого режима поднимается отдельный процесс uvicorn
+с базой SQLite во временном каталоге; пик RSS берется из VmHWM в /proc/<pid>/status.
+
+Запуск: python -m benchmarks.bench_upload --size-mb 20
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_api import make_image
+
+PEREVAL = {
+    "title": "Бенчмарк",
+    "user": {"email": "bench@example.com", "fam": "Иванов", "name": "Иван"},
+    "coords": {"latitude": 43.3, "longitude": 42.4, "height": 3200},
+    "level": {},
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _memory_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError(f"{field} недоступно")
+
+
+def _start_server(workdir: str):
+    port = _free_port()
+    env = dict(os.environ, FSTR_DB_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", FSTR_DB_ASYNC="0")
+    # Приложение не создает таблицы при запуске: схема ставится миграциями
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(base_url + "/openapi.json")
+            return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Сервер не запустился")
+
+
+def run(mode: str, image_path: str) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        server, base_url = _start_server(workdir)
+        try:
+            baseline = _memory_kb(server.pid, "VmRSS")
+            started = time.perf_counter()
+            if mode == "json":
+                with open(image_path, "rb") as image:
+                    payload = dict(PEREVAL, images=[{"img": base64.b64encode(image.read()).decode(), "title": "big"}])
+                response = httpx.post(base_url + "/submitData/", json=payload, timeout=300)
+            else:
+                with open(image_path, "rb") as image:
+                    response = httpx.post(base_url + "/submitData/upload", data={"data": json.dumps(PEREVAL)},
+                                          files={"images": ("big.png", image, "image/png")}, timeout=300)
+            elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            peak = _memory_kb(server.pid, "VmHWM")
+        finally:
+            server.terminate()
+            server.wait()
+    return {"mode": mode, "seconds": round(elapsed, 3), "baseline_rss_mb": round(baseline / 1024, 1),
+            "peak_rss_mb": round(peak / 1024, 1), "peak_growth_mb": round((peak - baseline) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix=".png") as image:
+        image.write(make_image(random.Random(), args.size_mb * 1024))
+        image.flush()
+        results = [run(mode, image.name) for mode in ("json", "multipart")]
+
+    print(json.dumps({"size_mb": args.size_mb, "results": results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
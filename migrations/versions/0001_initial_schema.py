@@ -0,0 +1,141 @@
+"""Исходная схема
+
+Таблицы в том виде, в каком их создавал Base.metadata.create_all до появления миграций.
+Существующую базу того времени достаточно отметить: alembic stamp 0001, затем alembic upgrade head.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('coords',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('height', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('coords', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_coords_id'), ['id'], unique=False)
+
+    op.create_table('images',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_added', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('img', sa.LargeBinary(), nullable=False),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_images_id'), ['id'], unique=False)
+
+    op.create_table('pereval_areas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('id_parent', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('pereval_areas', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_pereval_areas_id'), ['id'], unique=False)
+
+    op.create_table('spr_activities_types',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('spr_activities_types', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_spr_activities_types_id'), ['id'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('phone', sa.String(), nullable=True),
+    sa.Column('fam', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('otc', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_id'), ['id'], unique=False)
+
+    op.create_table('pereval_added',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_added', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('beauty_title', sa.String(), nullable=True),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('other_titles', sa.String(), nullable=True),
+    sa.Column('connect', sa.String(), nullable=True),
+    sa.Column('add_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('coord_id', sa.Integer(), nullable=True),
+    sa.Column('level_spring', sa.String(length=2), nullable=True),
+    sa.Column('level_summer', sa.String(length=2), nullable=True),
+    sa.Column('level_winter', sa.String(length=2), nullable=True),
+    sa.Column('level_autumn', sa.String(length=2), nullable=True),
+    sa.Column('status', sa.String(), server_default='new', nullable=False),
+    sa.CheckConstraint("status IN ('new', 'pending', 'accepted', 'rejected')", name='check_status_values'),
+    sa.ForeignKeyConstraint(['coord_id'], ['coords.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_pereval_added_id'), ['id'], unique=False)
+
+    op.create_table('pereval_images',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('id_pereval', sa.Integer(), nullable=True),
+    sa.Column('id_image', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['id_image'], ['images.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_pereval'], ['pereval_added.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('pereval_images', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_pereval_images_id'), ['id'], unique=False)
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('pereval_images', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pereval_images_id'))
+
+    op.drop_table('pereval_images')
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pereval_added_id'))
+
+    op.drop_table('pereval_added')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_id'))
+
+    op.drop_table('users')
+    with op.batch_alter_table('spr_activities_types', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_spr_activities_types_id'))
+
+    op.drop_table('spr_activities_types')
+    with op.batch_alter_table('pereval_areas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pereval_areas_id'))
+
+    op.drop_table('pereval_areas')
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_images_id'))
+
+    op.drop_table('images')
+    with op.batch_alter_table('coords', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_coords_id'))
+
+    op.drop_table('coords')
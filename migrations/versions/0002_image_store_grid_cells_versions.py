@@ -0,0 +1,79 @@
+"""Хранилище изображений, ячейки сетки координат, версии перевалов
+
+После обновления существующей базы: python -m app.manage reindex-coords (ячейки для старых
+координат) и python -m app.manage migrate-images (перенос images.img в хранилище).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_blobs',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('mime_type', sa.String(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('date_added', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('data', sa.LargeBinary(), nullable=True),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    with op.batch_alter_table('coords', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cell_lat', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('cell_lon', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_coords_cell', ['cell_lat', 'cell_lon'], unique=False)
+
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('size', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('mime_type', sa.String(), nullable=True))
+        batch_op.alter_column('img',
+               existing_type=sa.LargeBinary(),
+               nullable=True)
+        batch_op.create_index(batch_op.f('ix_images_content_hash'), ['content_hash'], unique=False)
+
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_pereval_added_coord_id'), ['coord_id'], unique=False)
+        batch_op.create_index('ix_pereval_added_user_id_id', ['user_id', 'id'], unique=False)
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.drop_index('ix_pereval_added_user_id_id')
+        batch_op.drop_index(batch_op.f('ix_pereval_added_coord_id'))
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_images_content_hash'))
+        batch_op.alter_column('img',
+               existing_type=sa.LargeBinary(),
+               nullable=False)
+        batch_op.drop_column('mime_type')
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('size')
+
+    with op.batch_alter_table('coords', schema=None) as batch_op:
+        batch_op.drop_index('ix_coords_cell')
+        batch_op.drop_column('cell_lon')
+        batch_op.drop_column('cell_lat')
+
+    op.drop_table('image_blobs')
@@ -0,0 +1,44 @@
+"""Индексы для частых запросов
+
+Списки перевалов пользователя за период, фильтры по статусу и дате, изображения перевала.
+В PostgreSQL индексы строятся CREATE INDEX CONCURRENTLY, не блокируя запись в таблицы.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ('ix_pereval_added_user_id_date_added', 'pereval_added', ['user_id', 'date_added'], False),
+    ('ix_pereval_added_status_id', 'pereval_added', ['status', 'id'], False),
+    ('ix_pereval_added_date_added', 'pereval_added', ['date_added'], False),
+    ('uq_pereval_images_pereval_image', 'pereval_images', ['id_pereval', 'id_image'], True),
+    ('ix_pereval_images_id_image', 'pereval_images', ['id_image'], False),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
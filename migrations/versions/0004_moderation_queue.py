@@ -0,0 +1,42 @@
+"""Очередь модерации
+
+Кто и когда взял перевал в работу, частичный индекс по записям со статусом new.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('moderator', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_pereval_added_new_queue', 'pereval_added', ['id'], unique=False,
+                        postgresql_where=sa.text("status = 'new'"), sqlite_where=sa.text("status = 'new'"),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_pereval_added_new_queue', table_name='pereval_added', postgresql_concurrently=True)
+
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.drop_column('claimed_at')
+        batch_op.drop_column('moderator')
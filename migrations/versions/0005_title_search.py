@@ -0,0 +1,88 @@
+"""Поиск по названиям перевалов
+
+Колонка search_text - названия в единой латинской записи (app.search.search_text).
+В PostgreSQL по ней строятся GIN-индексы tsvector и pg_trgm; в остальных СУБД поиск
+идет по индексу в памяти процесса, и индексы не нужны.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import search_text
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# Индексы есть только в PostgreSQL, поэтому их нет в моделях (см. include_object в env.py)
+POSTGRESQL_INDEXES = {
+    'ix_pereval_added_search_tsv':
+        "USING gin (to_tsvector('simple', coalesce(search_text, '')))",
+    'ix_pereval_added_search_trgm':
+        "USING gin (search_text gin_trgm_ops)",
+}
+
+pereval_added = sa.table(
+    'pereval_added',
+    sa.column('id', sa.Integer),
+    sa.column('title', sa.String),
+    sa.column('beauty_title', sa.String),
+    sa.column('other_titles', sa.String),
+    sa.column('search_text', sa.String),
+)
+
+
+def _backfill() -> None:
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(pereval_added.c.id, pereval_added.c.title, pereval_added.c.beauty_title,
+                      pereval_added.c.other_titles)
+            .where(pereval_added.c.id > last_id).order_by(pereval_added.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        connection.execute(
+            pereval_added.update().where(pereval_added.c.id == sa.bindparam('row_id')),
+            [{'row_id': row.id, 'search_text': search_text(row.title, row.beauty_title, row.other_titles)}
+             for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_text', sa.String(), nullable=True))
+
+    if not op.get_context().as_sql:
+        _backfill()
+
+    if op.get_context().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        with op.get_context().autocommit_block():
+            for name, definition in POSTGRESQL_INDEXES.items():
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON pereval_added {definition}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name in POSTGRESQL_INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.drop_column('search_text')
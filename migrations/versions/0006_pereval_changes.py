@@ -0,0 +1,61 @@
+"""Журнал изменений перевалов для GET /sync
+
+Для уже существующих перевалов записывается по одному изменению с текущей версией,
+чтобы клиент с курсором 0 получил все записи.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+pereval_added = sa.table(
+    'pereval_added',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('version', sa.Integer),
+    sa.column('updated_at', sa.DateTime(timezone=True)),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    pereval_changes = op.create_table(
+        'pereval_changes',
+        sa.Column('seq', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+        sa.Column('pereval_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['pereval_id'], ['pereval_added.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True,
+    )
+    op.create_index('ix_pereval_changes_user_id_seq', 'pereval_changes', ['user_id', 'seq'], unique=False)
+    op.create_index('ix_pereval_changes_pereval_id_seq', 'pereval_changes', ['pereval_id', 'seq'], unique=False)
+
+    op.execute(pereval_changes.insert().from_select(
+        ['pereval_id', 'user_id', 'version', 'changed_at'],
+        sa.select(pereval_added.c.id, pereval_added.c.user_id, pereval_added.c.version,
+                  sa.func.coalesce(pereval_added.c.updated_at, sa.func.now()))
+        .order_by(pereval_added.c.id)
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pereval_changes_pereval_id_seq', table_name='pereval_changes')
+    op.drop_index('ix_pereval_changes_user_id_seq', table_name='pereval_changes')
+    op.drop_table('pereval_changes')
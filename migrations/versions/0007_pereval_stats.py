@@ -0,0 +1,71 @@
+"""Счетчики перевалов для GET /stats
+
+Таблица заполняется по существующим перевалам тем же подсчетом, что и команда
+python -m app.manage rebuild-stats (app.stats.count_buckets).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.stats import SEASONS, count_buckets
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+pereval_added = sa.table(
+    'pereval_added',
+    sa.column('coord_id', sa.Integer),
+    sa.column('status', sa.String),
+    *(sa.column(f'level_{season}', sa.String) for season in SEASONS),
+    sa.column('date_added', sa.DateTime(timezone=True)),
+)
+coords = sa.table(
+    'coords',
+    sa.column('id', sa.Integer),
+    sa.column('height', sa.Float),
+)
+
+
+def _backfill(pereval_stats) -> None:
+    rows = op.get_bind().execute(
+        sa.select(pereval_added.c.status, *(pereval_added.c[f'level_{season}'] for season in SEASONS),
+                  coords.c.height, pereval_added.c.date_added)
+        .select_from(pereval_added.outerjoin(coords, coords.c.id == pereval_added.c.coord_id))
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    counts = count_buckets(rows)
+    if counts:
+        op.bulk_insert(pereval_stats, [{'dimension': dimension, 'bucket': bucket, 'count': count}
+                                       for (dimension, bucket), count in sorted(counts.items())])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    pereval_stats = op.create_table(
+        'pereval_stats',
+        sa.Column('dimension', sa.String(length=32), nullable=False),
+        sa.Column('bucket', sa.String(length=64), nullable=False),
+        sa.Column('count', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), server_default='0',
+                  nullable=False),
+        sa.PrimaryKeyConstraint('dimension', 'bucket'),
+    )
+
+    if not op.get_context().as_sql:
+        _backfill(pereval_stats)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('pereval_stats')
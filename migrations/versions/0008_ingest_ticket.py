@@ -0,0 +1,40 @@
+"""Квитанция очереди приема
+
+Номер квитанции из очереди app.ingest сохраняется в перевале: при повторной обработке
+после сбоя уже записанный перевал находится по уникальному индексу и не дублируется.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ingest_ticket', sa.String(length=32), nullable=True))
+
+    with op.get_context().autocommit_block():
+        op.create_index('uq_pereval_added_ingest_ticket', 'pereval_added', ['ingest_ticket'], unique=True,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('uq_pereval_added_ingest_ticket', table_name='pereval_added', postgresql_concurrently=True)
+
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.drop_column('ingest_ticket')
@@ -0,0 +1,44 @@
+"""Размеры и миниатюры изображений
+
+Размеры изображения и ссылка на миниатюру в image_blobs заполняются при приеме (app.imaging);
+для записей до миграции - командой python -m app.manage generate-thumbnails.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('thumbnail_hash', sa.String(length=64), nullable=True))
+
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_images_thumbnail_hash'), 'images', ['thumbnail_hash'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_images_thumbnail_hash'), table_name='images', postgresql_concurrently=True)
+
+    with op.batch_alter_table('images', schema=None) as batch_op:
+        batch_op.drop_column('thumbnail_hash')
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
@@ -0,0 +1,80 @@
+"""Дерево районов: привязка перевалов и таблица замыкания
+
+Таблица замыкания заполняется по существующим районам тем же расчетом, что и команда
+python -m app.manage rebuild-areas (app.areas.closure_rows).
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.areas import closure_rows
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+pereval_areas = sa.table(
+    'pereval_areas',
+    sa.column('id', sa.Integer),
+    sa.column('id_parent', sa.Integer),
+    sa.column('title', sa.String),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    pereval_area_closure = op.create_table(
+        'pereval_area_closure',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('descendant_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ancestor_id'], ['pereval_areas.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['descendant_id'], ['pereval_areas.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id'),
+    )
+    op.create_index('ix_pereval_area_closure_descendant_id', 'pereval_area_closure',
+                    ['descendant_id', 'ancestor_id'], unique=False)
+    op.create_table(
+        'pereval_area_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), server_default='0',
+                  nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('area_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_pereval_added_area_id', 'pereval_areas', ['area_id'], ['id'])
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_pereval_added_area_id_id', 'pereval_added', ['area_id', 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+    if not op.get_context().as_sql:
+        rows = op.get_bind().execute(sa.select(pereval_areas.c.id, pereval_areas.c.id_parent, pereval_areas.c.title))
+        closure = closure_rows(rows)
+        if closure:
+            op.bulk_insert(pereval_area_closure, closure)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_pereval_added_area_id_id', table_name='pereval_added', postgresql_concurrently=True)
+
+    with op.batch_alter_table('pereval_added', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_pereval_added_area_id', type_='foreignkey')
+        batch_op.drop_column('area_id')
+
+    op.drop_table('pereval_area_version')
+    op.drop_index('ix_pereval_area_closure_descendant_id', table_name='pereval_area_closure')
+    op.drop_table('pereval_area_closure')
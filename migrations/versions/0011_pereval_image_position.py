@@ -0,0 +1,33 @@
+"""Порядок изображений перевала
+
+pereval_images.position - позиция изображения в списке перевала, как в запросе, которым
+оно добавлено. У записей до миграции позиция 0: они упорядочиваются по id_image, как раньше.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('pereval_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('position', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('pereval_images', schema=None) as batch_op:
+        batch_op.drop_column('position')
@@ -0,0 +1,42 @@
+"""Содержимое изображений порциями
+
+В хранилище db новое содержимое пишется в image_blob_chunks порциями по IMAGE_CHUNK_SIZE,
+не собираясь в памяти целиком. Записи до миграции остаются в image_blobs.data
+(chunk_size пуст) и читаются оттуда.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, Sequence[str], None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'image_blob_chunks',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('content_hash', 'seq'),
+    )
+    with op.batch_alter_table('image_blobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('chunk_size', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('image_blobs', schema=None) as batch_op:
+        batch_op.drop_column('chunk_size')
+    op.drop_table('image_blob_chunks')
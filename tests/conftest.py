@@ -1,9 +1,20 @@
+import os
 import pytest
+
+# Тестам не нужен PostgreSQL: приложение поднимается поверх SQLite
+os.environ.setdefault("FSTR_DB_URL", "sqlite://")
+os.environ.setdefault("FSTR_DB_ASYNC", "0")
+# Изображения обрабатываются в потоке теста; пул процессов проверяется отдельно в test_imaging
+os.environ.setdefault("FSTR_IMAGE_WORKERS", "0")
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 from app.main import app
 from app.database import Base, get_db
+from app.cache import pereval_cache, user_id_cache
+from app.search import title_index
+from app.areas import area_tree
 
 engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -11,6 +22,20 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 Base.metadata.create_all(bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # id перевалов и пользователей повторяются между тестами: каждый тест откатывает свою транзакцию
+    pereval_cache.clear()
+    user_id_cache.clear()
+    title_index.clear()
+    area_tree.invalidate()
+    yield
+    pereval_cache.clear()
+    user_id_cache.clear()
+    title_index.clear()
+    area_tree.invalidate()
+
+
 @pytest.fixture(scope="function")
 def db():
     connection = engine.connect()
@@ -0,0 +1,32 @@
+import struct
+import zlib
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def make_png(seed: int = 0, width: int = 8, height: int = 8) -> bytes:
+    """Собирает корректный PNG (RGB, 8 бит); разные seed дают разное содержимое."""
+    rows = b"".join(
+        b"\x00" + bytes((seed + x * 7 + y * 13 + c * 31) % 256 for x in range(width) for c in range(3))
+        for y in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", header)
+            + _chunk(b"IDAT", zlib.compress(rows)) + _chunk(b"IEND", b""))
+
+
+@contextmanager
+def capture_sql(db):
+    """Собирает тексты SQL-запросов, выполненных через соединение сессии db."""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    engine = db.get_bind().engine
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
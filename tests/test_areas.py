@@ -0,0 +1,123 @@
+import copy
+from app.areas import AreaTreeCache
+from app.crud import PerevalRepository
+from app.models import PerevalAreaClosure
+from tests.helpers import capture_sql
+
+
+def _area(client, title, parent_id=None):
+    response = client.post("/areas", json={"title": title, "parent_id": parent_id})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _pereval(client, data, title, area_id):
+    data = copy.deepcopy(data)
+    data.update(title=title, area_id=area_id)
+    response = client.post("/submitData/", json=data)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _titles(client, area_id, **params):
+    response = client.get(f"/areas/{area_id}/perevals", params=params)
+    assert response.status_code == 200, response.text
+    return [pereval["title"] for pereval in response.json()]
+
+
+def _closure(db):
+    return sorted(db.query(PerevalAreaClosure.ancestor_id, PerevalAreaClosure.descendant_id,
+                           PerevalAreaClosure.depth).all())
+
+
+def test_area_tree(client):
+    caucasus = _area(client, "Кавказ")
+    elbrus = _area(client, "Приэльбрусье", caucasus)
+    baksan = _area(client, "Баксан", elbrus)
+    alps = _area(client, "Альпы")
+
+    assert client.get("/areas", params={"depth": 1}).json() == [
+        {"id": caucasus, "title": "Кавказ", "parent_id": None,
+         "children": [{"id": elbrus, "title": "Приэльбрусье", "parent_id": caucasus, "children": []}]},
+        {"id": alps, "title": "Альпы", "parent_id": None, "children": []},
+    ]
+    detail = client.get(f"/areas/{baksan}").json()
+    assert [area["title"] for area in detail["path"]] == ["Кавказ", "Приэльбрусье"]
+    assert client.get("/areas/100500").status_code == 404
+
+
+def test_subtree_perevals_in_one_query(client, db, test_pereval_data):
+    caucasus = _area(client, "Кавказ")
+    elbrus = _area(client, "Приэльбрусье", caucasus)
+    baksan = _area(client, "Баксан", elbrus)
+    alps = _area(client, "Альпы")
+    _pereval(client, test_pereval_data, "Джантуган", baksan)
+    _pereval(client, test_pereval_data, "Монблан", alps)
+    _pereval(client, test_pereval_data, "Казбек", caucasus)
+    _pereval(client, test_pereval_data, "Без района", None)
+
+    _titles(client, caucasus)
+    with capture_sql(db) as statements:
+        assert _titles(client, caucasus) == ["Джантуган", "Казбек"]
+    assert len(statements) == 1
+    assert _titles(client, elbrus) == ["Джантуган"]
+    assert _titles(client, caucasus, limit=1) == ["Джантуган"]
+
+    assert client.get(f"/areas/{alps}/perevals").json()[0]["title"] == "Монблан"
+    assert client.get("/areas/100500/perevals").status_code == 404
+
+
+def test_move_keeps_closure_consistent(client, db, test_pereval_data):
+    caucasus = _area(client, "Кавказ")
+    elbrus = _area(client, "Приэльбрусье", caucasus)
+    baksan = _area(client, "Баксан", elbrus)
+    alps = _area(client, "Альпы")
+    pereval_id = _pereval(client, test_pereval_data, "Джантуган", baksan)
+
+    moved = client.patch(f"/areas/{elbrus}", json={"parent_id": alps, "title": "Эльбрус"})
+    assert moved.status_code == 200, moved.text
+    assert moved.json()["path"] == [{"id": alps, "title": "Альпы"}]
+    assert _titles(client, caucasus) == []
+    assert _titles(client, alps) == ["Джантуган"]
+
+    client.patch(f"/areas/{baksan}", json={"parent_id": None})
+    assert _titles(client, alps) == []
+    client.patch(f"/submitData/{pereval_id}", json={"area_id": alps})
+    assert _titles(client, alps) == ["Джантуган"]
+
+    incremental = _closure(db)
+    assert PerevalRepository.rebuild_area_closure(db) == {"areas": 4, "closure": len(incremental)}
+    assert _closure(db) == incremental
+
+
+def test_move_into_own_subtree_rejected(client):
+    caucasus = _area(client, "Кавказ")
+    elbrus = _area(client, "Приэльбрусье", caucasus)
+    response = client.patch(f"/areas/{caucasus}", json={"parent_id": elbrus})
+    assert response.status_code == 400
+
+
+def test_unknown_area_rejected(client, test_pereval_data):
+    items = client.post("/submitData/batch", json=[dict(test_pereval_data, area_id=100500),
+                                                   test_pereval_data]).json()["items"]
+    assert [item["status"] for item in items] == [400, 201]
+    assert client.post("/submitData/", json=dict(test_pereval_data, area_id=100500)).status_code == 400
+
+
+def test_tree_cache_checks_version():
+    now = [0.0]
+    version = [1]
+    rows = [(1, 1, "Кавказ")]
+    cache = AreaTreeCache(check_seconds=5, clock=lambda: now[0])
+    load = lambda: cache.get(lambda: version[0], lambda: list(rows))
+
+    assert 1 in load()
+    # Другой процесс добавил район: до проверки версии отдается прежнее дерево
+    rows.append((2, 1, "Приэльбрусье"))
+    version[0] = 2
+    assert 2 not in load()
+    now[0] = 5.0
+    assert load().path(2) == [{"id": 1, "title": "Кавказ"}]
+    now[0] = 10.0
+    load()
+    assert cache.loads == 2
@@ -0,0 +1,175 @@
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from app import imaging
+from app.main import app
+from app.database import Base, get_db
+from app.crud import AsyncPerevalRepository
+from app.schemas import PerevalCreate, PerevalUpdate
+from tests.helpers import make_png
+
+
+@pytest.fixture
+def async_session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}", poolclass=NullPool)
+
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_schema())
+    yield async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def async_client(async_session_factory):
+
+    async def override_get_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+
+
+def test_async_repository(async_session_factory, test_pereval_data):
+    async def scenario():
+        async with async_session_factory() as db:
+            pereval = await AsyncPerevalRepository.create_pereval(db, PerevalCreate(**test_pereval_data))
+
+            update_data = PerevalUpdate.model_validate({"title": "Обновленное название"})
+            result = await AsyncPerevalRepository.update_pereval(db, pereval.id, update_data)
+            assert result["state"] == 1
+
+            detail = await AsyncPerevalRepository.get_pereval_or_404(db, pereval.id)
+            perevals = await AsyncPerevalRepository.get_perevals_by_email(db, "string@example.com")
+            exported = [rows async for rows in AsyncPerevalRepository.iter_export(db)]
+            return detail, perevals, exported
+
+    detail, perevals, exported = asyncio.run(scenario())
+
+    assert detail.title == "Обновленное название"
+    assert detail.status == "new"
+    assert len(perevals) == 1
+    assert perevals[0]["user_email"] == "string@example.com"
+    assert [[row["id"] for row in rows] for rows in exported] == [[detail.id]]
+    assert exported[0][0]["images"] == []
+
+
+def test_async_api(async_client, test_pereval_data):
+    response = async_client.post("/submitData/", json=test_pereval_data)
+    assert response.status_code == 201
+    pereval_id = response.json()["id"]
+
+    response = async_client.get(f"/submitData/{pereval_id}")
+    assert response.status_code == 200
+    assert response.json()["user"]["email"] == "string@example.com"
+
+    response = async_client.get("/submitData/999999")
+    assert response.status_code == 404
+
+
+def _with_images(data, *images):
+    return dict(data, images=[{"img": base64.b64encode(img).decode(), "title": f"Фото {i}"}
+                              for i, img in enumerate(images)])
+
+
+@pytest.fixture
+def sync_image_processing(monkeypatch):
+    """Изображения, которые синхронный код разбирал сам: внутри run_sync он ждал бы пул
+    процессов в потоке цикла событий."""
+    pending = []
+    prepare_uploads = imaging.prepare_uploads
+
+    def recording_prepare_uploads(uploads):
+        pending.extend(upload for upload in uploads if upload.processed is None)
+        return prepare_uploads(uploads)
+
+    monkeypatch.setattr(imaging, "prepare_uploads", recording_prepare_uploads)
+    return pending
+
+
+def test_async_batch_reports_invalid_images_once(async_client, test_pereval_data, sync_image_processing):
+    items = async_client.post("/submitData/batch", json=[
+        _with_images(test_pereval_data, make_png(1)), _with_images(test_pereval_data, b"not an image")
+    ]).json()["items"]
+    assert [item["status"] for item in items] == [201, 400]
+    assert "Некорректное изображение" in items[1]["message"]
+    assert sync_image_processing == []
+
+
+def test_async_update_reports_invalid_images_once(async_client, test_pereval_data, sync_image_processing):
+    pereval_id = async_client.post("/submitData/", json=_with_images(test_pereval_data, make_png(1))).json()["id"]
+    update = _with_images({}, make_png(1), b"not an image")
+    # state = 0 отдается кодом 204 без тела
+    assert async_client.patch(f"/submitData/{pereval_id}", json=update).status_code == 204
+    assert sync_image_processing == []
+
+    update = _with_images({}, make_png(2), make_png(1))
+    assert async_client.patch(f"/submitData/{pereval_id}", json=update).json()["state"] == 1
+    images = async_client.get(f"/submitData/{pereval_id}").json()["images"]
+    assert [image["title"] for image in images] == ["Фото 0", "Фото 1"]
+    assert all(image["thumbnail_url"] for image in images)
+    assert sync_image_processing == []
+
+
+# Режим задается при импорте app.config и app.database, поэтому приложение с FSTR_DB_ASYNC=1
+# поднимается в отдельном процессе и работает через настоящую зависимость get_async_db
+ASYNC_MODE_SCRIPT = """
+import json, sys
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app import database
+from app.main import app
+
+assert database.get_session is database.get_async_db
+database.Base.metadata.create_all(database.engine)
+statements = {"primary": 0, "replica": 0}
+
+def counter(name):
+    def count(*args):
+        statements[name] += 1
+    return count
+
+event.listen(database.async_engine.sync_engine, "before_cursor_execute", counter("primary"))
+event.listen(database.async_replica_pool.engines[0].sync_engine, "before_cursor_execute", counter("replica"))
+
+with TestClient(app) as client:
+    pereval_id = client.post("/submitData/", json=json.loads(sys.argv[1])).json()["id"]
+    client.cookies.clear()
+    detail = client.get(f"/submitData/{pereval_id}").json()
+    written = dict(statements)
+    state = client.patch(f"/submitData/{pereval_id}", json={"title": "Новое название"}).json()["state"]
+    updated = client.get(f"/submitData/{pereval_id}").json()
+print(json.dumps({"title": detail["title"], "state": state, "updated_title": updated["title"],
+                  "written": written, "statements": statements}))
+"""
+
+
+def test_async_mode_through_get_async_db(tmp_path, test_pereval_data):
+    path = tmp_path / "async-mode.db"
+    env = dict(os.environ, FSTR_DB_ASYNC="1", FSTR_DB_URL=f"sqlite:///{path}",
+               FSTR_DB_ASYNC_URL=f"sqlite+aiosqlite:///{path}", FSTR_DB_REPLICA_URLS="",
+               FSTR_DB_REPLICA_ASYNC_URLS=f"sqlite+aiosqlite:///{path}", FSTR_IMAGE_WORKERS="0")
+    completed = subprocess.run([sys.executable, "-c", ASYNC_MODE_SCRIPT, json.dumps(test_pereval_data)],
+                               cwd=os.path.dirname(os.path.dirname(__file__)), env=env,
+                               capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    result = json.loads(completed.stdout.splitlines()[-1])
+
+    assert result["title"] == "Тестовый перевал"
+    assert result["state"] == 1 and result["updated_title"] == "Новое название"
+    # Отправка - через основную БД, чтение без cookie - через асинхронную реплику,
+    # чтение сразу после PATCH - снова через основную
+    assert result["written"]["primary"] > 0 and result["written"]["replica"] > 0
+    assert result["statements"]["primary"] > result["written"]["primary"] + 1
+    assert result["statements"]["replica"] == result["written"]["replica"]
@@ -0,0 +1,52 @@
+import base64
+import copy
+from app.crud import PerevalRepository
+from app.models import User
+from app.schemas import PerevalCreate
+from tests.helpers import make_png, capture_sql
+
+
+def test_submit_batch(client, db, test_pereval_data):
+    with_image = copy.deepcopy(test_pereval_data)
+    with_image["images"] = [{"img": base64.b64encode(make_png(1)).decode(), "title": "Седловина"}]
+    bad_image = copy.deepcopy(test_pereval_data)
+    bad_image["images"] = [{"img": "не base64", "title": "Фото"}]
+    no_title = copy.deepcopy(test_pereval_data)
+    del no_title["title"]
+
+    response = client.post("/submitData/batch", json=[test_pereval_data, with_image, bad_image, no_title])
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["failed"]) == (2, 2)
+    assert [item["status"] for item in data["items"]] == [201, 201, 400, 422]
+    assert [item["index"] for item in data["items"]] == [0, 1, 2, 3]
+
+    first_id, second_id = data["items"][0]["id"], data["items"][1]["id"]
+    assert client.get(f"/submitData/{first_id}").json()["images"] == []
+    image = client.get(f"/submitData/{second_id}").json()["images"][0]
+    assert image["title"] == "Седловина"
+    assert client.get(image["url"]).content == make_png(1)
+    assert db.query(User).filter(User.email == "string@example.com").count() == 1
+
+
+def test_batch_statement_count_does_not_grow(db, test_pereval_data):
+    def count_statements(size):
+        items = []
+        for i in range(size):
+            item = copy.deepcopy(test_pereval_data)
+            item["user"]["email"] = f"user{size}-{i}@example.com"
+            item["images"] = [{"img": base64.b64encode(make_png(size * 100 + i)).decode(), "title": "Фото"}]
+            items.append(PerevalCreate(**item))
+
+        with capture_sql(db) as statements:
+            results = PerevalRepository.create_perevals_batch(db, items)
+        assert all(result["id"] for result in results)
+        return len(statements)
+
+    assert count_statements(2) == count_statements(20)
+
+
+def test_batch_too_large(client, test_pereval_data, monkeypatch):
+    monkeypatch.setattr("app.main.BATCH_MAX_ITEMS", 1)
+    response = client.post("/submitData/batch", json=[test_pereval_data, test_pereval_data])
+    assert response.status_code == 413
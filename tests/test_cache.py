@@ -0,0 +1,85 @@
+import fnmatch
+from app.cache import InMemoryCacheBackend, RedisCacheBackend, ResponseCache, pereval_cache
+from tests.helpers import capture_sql
+
+
+class FakeRedis:
+    """Минимальная замена клиента Redis для тестов."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = value
+
+    def delete(self, *names):
+        for name in names:
+            self.data.pop(name, None)
+
+    def scan_iter(self, match="*"):
+        return [name for name in self.data if fnmatch.fnmatch(name, match)]
+
+
+def test_detail_is_served_from_cache(client, db, test_pereval_data):
+    pereval_id = client.post("/submitData/", json=test_pereval_data).json()["id"]
+    before = pereval_cache.stats()
+
+    first = client.get(f"/submitData/{pereval_id}")
+    with capture_sql(db) as statements:
+        second = client.get(f"/submitData/{pereval_id}")
+
+    assert second.json() == first.json()
+    # Проверяется только версия перевала
+    assert len(statements) == 1
+    assert "pereval_added.version" in statements[0]
+    assert "coords" not in statements[0] and "images" not in statements[0]
+    stats = pereval_cache.stats()
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["hits"] - before["hits"] == 1
+    assert client.get("/cache/stats").json()["hits"] == stats["hits"]
+
+
+def test_update_invalidates_cache(client, test_pereval_data):
+    pereval_id = client.post("/submitData/", json=test_pereval_data).json()["id"]
+    client.get(f"/submitData/{pereval_id}")
+
+    invalidations = pereval_cache.stats()["invalidations"]
+    client.patch(f"/submitData/{pereval_id}", json={"title": "Новое название"})
+
+    assert pereval_cache.stats()["invalidations"] == invalidations + 1
+    assert client.get(f"/submitData/{pereval_id}").json()["title"] == "Новое название"
+
+
+def test_lru_eviction_and_ttl():
+    now = [0.0]
+    backend = InMemoryCacheBackend(max_entries=2, max_bytes=10, clock=lambda: now[0])
+    backend.set("a", b"1", ttl=5)
+    backend.set("b", b"2", ttl=5)
+    backend.get("a")
+    backend.set("c", b"3", ttl=5)
+
+    assert backend.get("b") is None
+    assert backend.get("a") == b"1"
+    assert backend.evictions == 1
+
+    backend.set("big", b"x" * 9, ttl=5)
+    assert backend.evictions == 2
+    assert backend.get("c") is None
+    assert len(backend) == 2
+
+    now[0] = 6
+    assert backend.get("big") is None
+
+
+def test_redis_backend():
+    client = FakeRedis()
+    cache = ResponseCache(RedisCacheBackend(client), ttl=60, namespace="pereval")
+    cache.set(1, b"{}")
+    assert client.data == {"fstr:pereval:1": b"{}"}
+    assert cache.get(1) == b"{}"
+    cache.invalidate(1)
+    assert cache.get(1) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "invalidations": 1}
@@ -0,0 +1,48 @@
+import base64
+from tests.helpers import make_png, capture_sql
+
+
+def test_detail_etag_and_304(client, db, test_pereval_data):
+    pereval_id = client.post("/submitData/", json=test_pereval_data).json()["id"]
+
+    response = client.get(f"/submitData/{pereval_id}")
+    etag = response.headers["etag"]
+    assert response.json()["version"] == 1
+
+    with capture_sql(db) as statements:
+        response = client.get(f"/submitData/{pereval_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert len(statements) == 1
+    assert "users" not in statements[0] and "coords" not in statements[0]
+
+
+def test_every_write_changes_etag(client, test_pereval_data):
+    pereval_id = client.post("/submitData/", json=test_pereval_data).json()["id"]
+    etags = [client.get(f"/submitData/{pereval_id}").headers["etag"]]
+
+    client.patch(f"/submitData/{pereval_id}", json={"coords": {"latitude": 1, "longitude": 2, "height": 3}})
+    etags.append(client.get(f"/submitData/{pereval_id}").headers["etag"])
+
+    images = [{"img": base64.b64encode(make_png(7)).decode(), "title": "Новое фото"}]
+    client.patch(f"/submitData/{pereval_id}", json={"images": images})
+    response = client.get(f"/submitData/{pereval_id}", headers={"If-None-Match": etags[-1]})
+    assert response.status_code == 200
+    etags.append(response.headers["etag"])
+
+    assert len(set(etags)) == 3
+    assert response.json()["version"] == 3
+
+
+def test_list_etag_and_304(client, test_pereval_data):
+    pereval_id = client.post("/submitData/", json=test_pereval_data).json()["id"]
+    params = {"user__email": "string@example.com"}
+
+    etag = client.get("/submitData/", params=params).headers["etag"]
+    response = client.get("/submitData/", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    client.patch(f"/submitData/{pereval_id}", json={"title": "Новое название"})
+    response = client.get("/submitData/", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
@@ -1,7 +1,16 @@
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pytest
+from pydantic_core import to_json
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.cache import user_id_cache
 from app.crud import PerevalRepository
-from app.schemas import PerevalCreate, PerevalUpdate
-from app.models import PerevalAdded
+from app.database import Base
+from app.schemas import PerevalCreate, PerevalResponse, PerevalUpdate
+from app.models import PerevalAdded, User
+from tests.helpers import capture_sql, make_png
 
 def test_create_pereval(db, test_pereval_data):
     pereval_data = PerevalCreate(**test_pereval_data)
@@ -21,6 +30,17 @@ def test_get_pereval(db, test_pereval_data):
     assert result.model_dump()['title'] == "Тестовый перевал"
 
 
+def test_detail_without_validation_matches_validated(db, test_pereval_data):
+    test_pereval_data["images"] = [{"img": base64.b64encode(make_png(seed)).decode(), "title": f"Фото {seed}"}
+                                   for seed in range(3)]
+    pereval = PerevalRepository.create_pereval(db, PerevalCreate(**test_pereval_data))
+
+    data = PerevalRepository.get_pereval_data_or_404(db, pereval.id)
+
+    # Быстрый путь должен давать те же байты, что и валидация через PerevalResponse
+    assert to_json(data) == PerevalResponse.model_validate(data).model_dump_json().encode()
+    assert [image["url"] for image in data["images"]] == [f"/images/{image['id']}" for image in data["images"]]
+
 
 def test_update_pereval(db, test_pereval_data):
     pereval_data = PerevalCreate(**test_pereval_data)
@@ -42,4 +62,44 @@ def test_get_perevals_by_email(db, test_pereval_data):
     result = PerevalRepository.get_perevals_by_email(db, "string@example.com")
 
     assert len(result) > 0
-    assert result[0]["user_email"] == "string@example.com"
\ No newline at end of file
+    assert result[0]["user_email"] == "string@example.com"
+
+
+def test_user_upsert_is_single_statement(db, test_pereval_data):
+    first = PerevalRepository.create_pereval(db, PerevalCreate(**test_pereval_data))
+    user_id_cache.clear()
+    with capture_sql(db) as statements:
+        second = PerevalRepository.create_pereval(db, PerevalCreate(**{
+            **test_pereval_data, "user": {**test_pereval_data["user"], "fam": "Петров"}}))
+
+    assert second.user_id == first.user_id
+    assert second.user.fam == "Иванов"
+    assert not any(statement.startswith("SELECT") and "FROM users" in statement for statement in statements)
+    assert sum("ON CONFLICT (email) DO UPDATE" in statement for statement in statements) == 1
+
+    with capture_sql(db) as statements:
+        PerevalRepository.create_pereval(db, PerevalCreate(**test_pereval_data))
+    # Повторная отправка: id пользователя берется из кэша
+    assert not any("INSERT INTO users" in statement for statement in statements)
+
+
+def test_concurrent_first_submissions(tmp_path, test_pereval_data):
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    workers = 8
+    barrier = threading.Barrier(workers)
+
+    def submit(_):
+        with Session() as db:
+            barrier.wait()
+            return PerevalRepository.create_pereval(db, PerevalCreate(**test_pereval_data)).user_id
+
+    with ThreadPoolExecutor(workers) as pool:
+        user_ids = list(pool.map(submit, range(workers)))
+
+    with Session() as db:
+        assert db.query(User).count() == 1
+        assert db.query(PerevalAdded).count() == workers
+    assert set(user_ids) == {user_ids[0]}
+    engine.dispose()
@@ -0,0 +1,63 @@
+import base64
+import csv
+import io
+import json
+import tracemalloc
+from sqlalchemy import insert
+from app.crud import PerevalRepository
+from app.export import ndjson_chunk
+from app.models import PerevalAdded, User, Coords
+from tests.helpers import make_png
+
+
+def test_export_ndjson_and_csv(client, db, test_pereval_data):
+    first = client.post("/submitData/", json=test_pereval_data).json()["id"]
+    second = client.post("/submitData/", json={
+        **test_pereval_data, "images": [{"title": "Седловина", "img": base64.b64encode(make_png(1)).decode()}]}).json()["id"]
+    db.query(PerevalAdded).filter(PerevalAdded.id == second).update({"status": "accepted"})
+
+    response = client.get("/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [first, second]
+    assert rows[0]["user_email"] == "string@example.com"
+    assert rows[0]["height"] == 3200
+    assert rows[0]["images"] == []
+    assert rows[1]["images"][0]["title"] == "Седловина"
+    assert rows[1]["images"][0]["url"] == f"/images/{rows[1]['images'][0]['id']}"
+
+    response = client.get("/export", params={"format": "csv", "images": "none", "status": "accepted"})
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row["id"]) for row in rows] == [second]
+    assert "images" not in rows[0]
+
+    response = client.get("/export", params={"format": "csv", "date_to": "2000-01-01T00:00:00"})
+    assert response.text.splitlines() == [response.text.splitlines()[0]]
+    assert response.text.splitlines()[0].endswith(",images")
+
+
+def test_export_memory_is_bounded(db):
+    total = 100_000
+    user_id = db.execute(insert(User).values(email="bulk@example.com", fam="Иванов", name="Иван")).inserted_primary_key[0]
+    db.execute(insert(Coords), [{"id": i, "latitude": 45.0, "longitude": 7.0, "height": i % 5000}
+                                for i in range(1, total + 1)])
+    db.execute(insert(PerevalAdded), [{"id": i, "user_id": user_id, "coord_id": i, "title": f"Перевал {i}",
+                                       "status": "new"} for i in range(1, total + 1)])
+
+    tracemalloc.start()
+    try:
+        exported = 0
+        size = 0
+        for rows in PerevalRepository.iter_export(db, with_images=False, chunk_size=1000):
+            exported += len(rows)
+            size += len(ndjson_chunk(rows))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert exported == total
+    # Выгрузка занимает десятки мегабайт, а пик памяти ограничен размером одной порции
+    assert size > 20 * 1024 * 1024
+    assert peak < 8 * 1024 * 1024
@@ -0,0 +1,65 @@
+import base64
+import pytest
+from tests.helpers import capture_sql, make_png
+
+
+@pytest.fixture
+def pereval_id(client, test_pereval_data):
+    test_pereval_data["images"] = [{"img": base64.b64encode(make_png()).decode(), "title": "Фото"}]
+    return client.post("/submitData/", json=test_pereval_data).json()["id"]
+
+
+def test_status_check_is_single_table_select(client, db, pereval_id):
+    with capture_sql(db) as statements:
+        response = client.get(f"/submitData/{pereval_id}", params={"fields": "status"})
+
+    assert response.status_code == 200
+    assert response.json() == {"id": pereval_id, "status": "new", "version": 1}
+    assert len(statements) == 1
+    assert "JOIN" not in statements[0]
+    assert "FROM pereval_added" in statements[0]
+    assert "title" not in statements[0]
+
+
+def test_fields_load_only_requested_relationships(client, db, pereval_id, test_pereval_data):
+    with capture_sql(db) as statements:
+        body = client.get(f"/submitData/{pereval_id}", params={"fields": "status,coords"}).json()
+
+    assert list(body) == ["coords", "id", "status", "version"]
+    assert body["coords"]["height"] == test_pereval_data["coords"]["height"]
+    assert len(statements) == 1
+    assert "coords" in statements[0] and "users" not in statements[0]
+
+
+def test_include_images(client, db, pereval_id):
+    with capture_sql(db) as statements:
+        body = client.get(f"/submitData/{pereval_id}", params={"fields": "title", "include": "images"}).json()
+
+    assert set(body) == {"id", "title", "images", "version"}
+    assert body["images"][0]["url"] == f"/images/{body['images'][0]['id']}"
+    assert len(statements) == 2  # перевал и его изображения
+
+
+def test_full_response_unchanged(client, pereval_id):
+    full = client.get(f"/submitData/{pereval_id}")
+    assert "images" in full.json() and "user" in full.json()
+    assert client.get(f"/submitData/{pereval_id}", params={"include": "images"}).json() == full.json()
+
+
+def test_partial_response_etag(client, pereval_id):
+    full_etag = client.get(f"/submitData/{pereval_id}").headers["etag"]
+    response = client.get(f"/submitData/{pereval_id}", params={"fields": "status"})
+    etag = response.headers["etag"]
+
+    assert etag != full_etag
+    not_modified = client.get(f"/submitData/{pereval_id}", params={"fields": "status"},
+                              headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    client.patch(f"/submitData/{pereval_id}", json={"title": "Правка"})
+    assert client.get(f"/submitData/{pereval_id}", params={"fields": "status"},
+                      headers={"If-None-Match": etag}).status_code == 200
+
+
+@pytest.mark.parametrize("params", [{"fields": "status,password"}, {"fields": "status", "include": "user"}])
+def test_unknown_fields_rejected(client, pereval_id, params):
+    assert client.get(f"/submitData/{pereval_id}", params=params).status_code == 400
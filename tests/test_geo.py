@@ -0,0 +1,65 @@
+import copy
+import pytest
+from app.geo import haversine_km
+
+
+@pytest.fixture
+def passes(client, test_pereval_data):
+    points = {
+        "elbrus": (43.35, 42.44, 5642),
+        "kazbek": (42.70, 44.52, 5033),
+        "dombai": (43.29, 41.64, 4046),
+        "kamchatka": (56.06, 160.64, 4750),
+        "chukotka": (65.00, -179.90, 1200),
+    }
+    ids = {}
+    for name, (latitude, longitude, height) in points.items():
+        data = copy.deepcopy(test_pereval_data)
+        data["title"] = name
+        data["coords"] = {"latitude": latitude, "longitude": longitude, "height": height}
+        ids[name] = client.post("/submitData/", json=data).json()["id"]
+    return ids
+
+
+def _titles(response):
+    assert response.status_code == 200, response.text
+    return [item["title"] for item in response.json()]
+
+
+def test_search_bbox(client, passes):
+    assert _titles(client.get("/perevals/search", params={"bbox": "41,42,45,44"})) == ["elbrus", "kazbek", "dombai"]
+    assert _titles(client.get("/perevals/search", params={"bbox": "41,42,45,44", "height_min": 5000})) == \
+        ["elbrus", "kazbek"]
+    # Прямоугольник через 180-й меридиан
+    assert _titles(client.get("/perevals/search", params={"bbox": "150,50,-170,70"})) == ["kamchatka", "chukotka"]
+
+
+def test_search_radius(client, passes):
+    response = client.get("/perevals/search", params={"lat": 43.35, "lon": 42.44, "radius_km": 100})
+    assert _titles(response) == ["elbrus", "dombai"]
+    distances = [item["distance_km"] for item in response.json()]
+    assert distances[0] == 0
+    assert distances[1] == pytest.approx(haversine_km(43.35, 42.44, 43.29, 41.64), abs=1e-3)
+
+
+def test_search_nearest(client, passes):
+    response = client.get("/perevals/search", params={"lat": 43.0, "lon": 43.0, "k": 2})
+    assert _titles(response) == ["elbrus", "dombai"]
+
+    response = client.get("/perevals/search", params={"lat": 64.0, "lon": 179.0, "k": 1})
+    assert _titles(response) == ["chukotka"]
+
+    response = client.get("/perevals/search", params={"lat": 43.0, "lon": 43.0, "k": 10})
+    assert len(response.json()) == 5
+
+
+def test_search_requires_mode(client):
+    assert client.get("/perevals/search").status_code == 400
+    assert client.get("/perevals/search", params={"lat": 1, "lon": 1, "k": 1, "radius_km": 5}).status_code == 400
+    assert client.get("/perevals/search", params={"bbox": "1,2,3"}).status_code == 400
+
+
+def test_updated_coords_are_reindexed(client, passes):
+    client.patch(f"/submitData/{passes['dombai']}",
+                 json={"coords": {"latitude": 56.0, "longitude": 160.0, "height": 4046}})
+    assert _titles(client.get("/perevals/search", params={"bbox": "150,50,170,60"})) == ["dombai", "kamchatka"]
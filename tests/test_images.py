@@ -0,0 +1,59 @@
+import base64
+import hashlib
+from tests.helpers import make_png, capture_sql
+
+
+def _submit_with_image(client, test_pereval_data, img_bytes):
+    test_pereval_data["images"] = [{"img": base64.b64encode(img_bytes).decode(), "title": "Седловина"}]
+    response = client.post("/submitData/", json=test_pereval_data)
+    assert response.status_code == 201
+    return client.get(f"/submitData/{response.json()['id']}").json()["images"][0]
+
+
+def test_detail_returns_image_metadata_without_blob(client, db, test_pereval_data):
+    img_bytes = make_png(1, 64, 64)
+    test_pereval_data["images"] = [{"img": base64.b64encode(img_bytes).decode(), "title": "Седловина"}]
+    pereval_id = client.post("/submitData/", json=test_pereval_data).json()["id"]
+
+    with capture_sql(db) as statements:
+        image = client.get(f"/submitData/{pereval_id}").json()["images"][0]
+
+    assert image["title"] == "Седловина"
+    assert image["size"] == len(img_bytes)
+    assert image["content_hash"] == hashlib.sha256(img_bytes).hexdigest()
+    assert image["url"] == f"/images/{image['id']}"
+    assert "img" not in image
+    assert not any("images.img" in statement for statement in statements)
+
+
+def test_image_stream_etag_and_range(client, test_pereval_data):
+    img_bytes = make_png(2, 200, 200)
+    image = _submit_with_image(client, test_pereval_data, img_bytes)
+
+    response = client.get(image["url"])
+    assert response.status_code == 200
+    assert response.content == img_bytes
+    etag = response.headers["etag"]
+    assert etag == f'"{image["content_hash"]}"'
+
+    response = client.get(image["url"], headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(image["url"], headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == img_bytes[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(img_bytes)}"
+
+    response = client.get(image["url"], headers={"Range": "bytes=-5"})
+    assert response.status_code == 206
+    assert response.content == img_bytes[-5:]
+
+    response = client.get(image["url"], headers={"Range": f"bytes={len(img_bytes)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(img_bytes)}"
+
+
+def test_image_not_found(client):
+    response = client.get("/images/999999")
+    assert response.status_code == 404
@@ -0,0 +1,126 @@
+import base64
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image as PILImage
+from app import imaging, storage
+from app.crud import ImageUpload, PerevalRepository
+from app.models import Image
+from tests.helpers import make_png
+
+
+def _with_images(data, *images):
+    return dict(data, images=[{"img": base64.b64encode(img).decode(), "title": f"Фото {i}"}
+                              for i, img in enumerate(images)])
+
+
+def make_jpeg(width: int = 64, height: int = 32, exif_bytes: int = 0, orientation: int = 6) -> bytes:
+    exif = PILImage.Exif()
+    exif[0x0112] = orientation
+    if exif_bytes:
+        exif.get_ifd(0x8769)[0x9286] = b"ASCII\x00\x00\x00" + b"x" * exif_bytes
+    output = io.BytesIO()
+    PILImage.new("RGB", (width, height), (200, 30, 30)).save(output, "JPEG", exif=exif)
+    return output.getvalue()
+
+
+def test_non_image_rejected(client, db, test_pereval_data):
+    response = client.post("/submitData/", json=_with_images(test_pereval_data, b"not an image"))
+    assert response.status_code == 400
+    assert db.query(Image).count() == 0
+
+    items = client.post("/submitData/batch", json=[
+        _with_images(test_pereval_data, make_png(1)), _with_images(test_pereval_data, b"<html></html>")
+    ]).json()["items"]
+    assert [item["status"] for item in items] == [201, 400]
+    assert "Некорректное изображение" in items[1]["message"]
+
+
+def test_thumbnail_endpoint(client, test_pereval_data):
+    original = make_png(3, 600, 300)
+    pereval_id = client.post("/submitData/", json=_with_images(test_pereval_data, original)).json()["id"]
+    image = client.get(f"/submitData/{pereval_id}").json()["images"][0]
+    assert (image["width"], image["height"]) == (600, 300)
+    # Оригинал хранится байт в байт
+    assert client.get(image["url"]).content == original
+
+    response = client.get(image["thumbnail_url"])
+    assert response.status_code == 200 and response.headers["content-type"] == "image/jpeg"
+    with PILImage.open(io.BytesIO(response.content)) as thumbnail:
+        assert thumbnail.format == "JPEG" and thumbnail.size == (256, 128)
+    cached = client.get(image["thumbnail_url"], headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+
+
+def test_oversized_exif_stripped_keeping_orientation():
+    data = make_jpeg(exif_bytes=30_000)
+    result = imaging.process_image(data, max_exif_bytes=16 * 1024)
+    stripped = imaging.rewrite(io.BytesIO(data), result.exif_edits).read()
+    assert len(stripped) < len(data) - 25_000
+    with PILImage.open(io.BytesIO(stripped)) as image:
+        assert image.getexif()[0x0112] == 6
+        assert image.size == (64, 32)
+    # Ориентация учтена в миниатюре: снимок повернут
+    with PILImage.open(io.BytesIO(result.thumbnail)) as thumbnail:
+        assert thumbnail.size == (32, 64)
+
+    assert imaging.process_image(make_jpeg(exif_bytes=100)).exif_edits == []
+
+
+def test_spooled_upload_passed_by_path(monkeypatch):
+    monkeypatch.setattr(imaging, "SPOOL_MAX_SIZE", 1024)
+    data = make_jpeg(exif_bytes=30_000)
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024)
+    spooled.write(data)
+    upload = ImageUpload(title="Фото", file=spooled)
+
+    # Загрузка на диске не читается в память: процессу пула передается путь к ее копии
+    source = imaging._source(upload)
+    assert source == upload.file.name and os.path.getsize(source) == len(data)
+    assert imaging._source(upload) == source
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        result, = imaging.process_many([source], executor=pool)
+    assert (result.width, result.height) == (64, 32)
+
+    assert imaging.prepare_uploads([upload]) == [None]
+    assert upload.file is not spooled
+    assert len(upload.file.read()) < len(data) - 25_000
+
+
+def test_process_pool():
+    datas = [make_png(seed, 40, 20) for seed in range(4)] + [b"GIF89a broken"]
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = imaging.process_many(datas, executor=pool)
+    assert [(result.width, result.height) for result in results[:4]] == [(40, 20)] * 4
+    assert isinstance(results[4], imaging.InvalidImage)
+
+
+def test_generate_thumbnails_for_legacy_images(db):
+    blob = storage.store_blob(db, io.BytesIO(make_png(7, 20, 10)))
+    db.add_all([Image(title="Старое фото", size=blob.size, content_hash=blob.content_hash, mime_type=blob.mime_type),
+                Image(title="Не изображение", content_hash=storage.store_blob(db, io.BytesIO(b"text")).content_hash)])
+    db.commit()
+
+    assert PerevalRepository.generate_thumbnails(db, batch_size=1) == {"generated": 1, "invalid": 1}
+    image = db.query(Image).filter(Image.title == "Старое фото").one()
+    assert (image.width, image.height) == (20, 10) and image.thumbnail_hash is not None
+
+
+def test_generated_thumbnails_change_the_pereval(client, db, test_pereval_data):
+    pereval_id = client.post("/submitData/", json=_with_images(test_pereval_data, make_png(8, 20, 10))).json()["id"]
+    # Изображение как до app.imaging: без размеров и миниатюры
+    db.query(Image).update({"width": None, "height": None, "thumbnail_hash": None})
+    db.commit()
+    response = client.get(f"/submitData/{pereval_id}")
+    assert response.json()["images"][0]["thumbnail_url"] is None
+    since = client.get("/sync", params={"since": 0}).json()["cursor"]
+
+    assert PerevalRepository.generate_thumbnails(db)["generated"] == 1
+
+    response = client.get(f"/submitData/{pereval_id}", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 200
+    image = response.json()["images"][0]
+    assert image["thumbnail_url"] is not None and (image["width"], image["height"]) == (20, 10)
+    assert [item["id"] for item in client.get("/sync", params={"since": since}).json()["changes"]] == [pereval_id]
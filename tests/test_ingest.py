@@ -0,0 +1,102 @@
+import copy
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import ingest
+from app.crud import PerevalRepository
+from app.ingest import IngestQueue, IngestWorker, RetryLater
+from app.models import PerevalAdded
+from app.schemas import PerevalCreate
+from tests.helpers import capture_sql
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = IngestQueue(str(tmp_path / "ingest.sqlite3"))
+    monkeypatch.setattr(ingest, "ingest_queue", queue)
+    yield queue
+    queue.close()
+
+
+def _submit(client, data, title):
+    data = copy.deepcopy(data)
+    data["title"] = title
+    response = client.post("/submitData/", json=data)
+    assert response.status_code == 202, response.text
+    return response.json()["ticket"]
+
+
+def _ticket(client, ticket):
+    response = client.get(f"/tickets/{ticket}")
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_queued_submission_is_written_by_worker(client, db, queue, test_pereval_data):
+    ticket = _submit(client, test_pereval_data, "Из очереди")
+    assert _ticket(client, ticket)["status"] == "queued"
+    assert db.query(PerevalAdded).count() == 0
+
+    assert IngestWorker(queue, session_factory=lambda: db).drain_once() == 1
+    result = _ticket(client, ticket)
+    assert result["status"] == "done" and result["finished_at"] is not None
+    assert client.get(f"/submitData/{result['id']}").json()["title"] == "Из очереди"
+    assert queue.depth() == 0
+
+
+def test_worker_writes_batch_in_one_transaction(client, db, queue, test_pereval_data):
+    tickets = [_submit(client, test_pereval_data, f"Перевал {index}") for index in range(5)]
+    with capture_sql(db) as statements:
+        assert IngestWorker(queue, session_factory=lambda: db, batch_size=10).drain_once() == 5
+    assert sum(statement.startswith("INSERT INTO pereval_added") for statement in statements) == 1
+    ids = [_ticket(client, ticket)["id"] for ticket in tickets]
+    assert [client.get(f"/submitData/{pereval_id}").json()["title"] for pereval_id in ids] == [
+        f"Перевал {index}" for index in range(5)]
+
+
+def test_replay_after_crash_does_not_duplicate(client, db, queue, tmp_path, test_pereval_data):
+    lost = _submit(client, test_pereval_data, "Не записан")
+    written = _submit(client, test_pereval_data, "Записан до сбоя")
+    # Процесс взял записи в работу, записал вторую в БД и упал, не отметив ее в очереди
+    items = {item.ticket: item for item in queue.take(10)}
+    PerevalRepository.create_perevals_batch(db, [PerevalCreate.model_validate_json(items[written].payload)],
+                                            [written])
+
+    restarted = IngestQueue(queue.path)
+    try:
+        assert restarted.recover(startup=True) == 2
+        assert IngestWorker(restarted, session_factory=lambda: db).drain_once() == 2
+    finally:
+        restarted.close()
+    assert _ticket(client, lost)["status"] == "done"
+    assert _ticket(client, written)["status"] == "done"
+    assert db.query(PerevalAdded).filter(PerevalAdded.title == "Записан до сбоя").count() == 1
+
+
+def test_unavailable_database_keeps_queue(client, queue, test_pereval_data):
+    class Unavailable:
+        def query(self, *args):
+            raise OperationalError("SELECT", {}, Exception("connection refused"))
+
+        def close(self):
+            pass
+
+    ticket = _submit(client, test_pereval_data, "Подождет")
+    with pytest.raises(RetryLater):
+        IngestWorker(queue, session_factory=Unavailable).drain_once()
+    assert _ticket(client, ticket)["status"] == "queued"
+
+
+def test_invalid_item_fails_alone(client, db, queue, test_pereval_data):
+    good = _submit(client, test_pereval_data, "Хороший")
+    bad_data = {**test_pereval_data, "images": [{"img": "не base64", "title": "Фото"}]}
+    bad = _submit(client, bad_data, "Плохой")
+
+    IngestWorker(queue, session_factory=lambda: db).drain_once()
+    assert _ticket(client, good)["status"] == "done"
+    failed = _ticket(client, bad)
+    assert failed["status"] == "failed" and failed["id"] is None
+    assert "изображения" in failed["message"]
+
+
+def test_unknown_ticket(client, queue):
+    assert client.get("/tickets/missing").status_code == 404
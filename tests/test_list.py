@@ -0,0 +1,51 @@
+from app.crud import PerevalRepository
+from app.models import PerevalAdded
+from app.schemas import PerevalCreate
+from tests.helpers import capture_sql
+
+
+def test_list_keyset_pagination(client, test_pereval_data):
+    ids = [client.post("/submitData/", json=test_pereval_data).json()["id"] for _ in range(5)]
+
+    response = client.get("/submitData/", params={"user__email": "string@example.com", "limit": 2})
+    assert [item["id"] for item in response.json()] == ids[:2]
+    next_after = response.headers["x-next-after-id"]
+
+    response = client.get("/submitData/", params={"user__email": "string@example.com", "limit": 2,
+                                                  "after_id": next_after})
+    assert [item["id"] for item in response.json()] == ids[2:4]
+
+    response = client.get("/submitData/", params={"user__email": "string@example.com", "limit": 2,
+                                                  "after_id": ids[3]})
+    assert [item["id"] for item in response.json()] == ids[4:]
+    assert "x-next-after-id" not in response.headers
+
+
+def test_list_filters(client, db, test_pereval_data):
+    first = client.post("/submitData/", json=test_pereval_data).json()["id"]
+    second = client.post("/submitData/", json=test_pereval_data).json()["id"]
+    db.query(PerevalAdded).filter(PerevalAdded.id == second).update({"status": "accepted"})
+
+    response = client.get("/submitData/", params={"user__email": "string@example.com", "status": "accepted"})
+    assert [item["id"] for item in response.json()] == [second]
+
+    response = client.get("/submitData/", params={"user__email": "string@example.com", "status": "unknown"})
+    assert response.status_code == 422
+
+    response = client.get("/submitData/", params={"user__email": "string@example.com",
+                                                  "date_from": "2000-01-01T00:00:00"})
+    assert {item["id"] for item in response.json()} == {first, second}
+    response = client.get("/submitData/", params={"user__email": "string@example.com",
+                                                  "date_to": "2000-01-01T00:00:00"})
+    assert response.json() == []
+
+
+def test_list_is_single_query(db, test_pereval_data):
+    PerevalRepository.create_pereval(db, PerevalCreate(**test_pereval_data))
+
+    with capture_sql(db) as statements:
+        result = PerevalRepository.get_perevals_by_email(db, "string@example.com")
+
+    assert len(result) == 1
+    assert len(statements) == 1
+    assert "images" not in statements[0]
@@ -0,0 +1,90 @@
+import logging
+import threading
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+from app.metrics import MetricsMiddleware, Histogram, instrument_engine, render_metrics
+
+
+def _sample(body: str, prefix: str) -> float:
+    return sum(float(line.rsplit(" ", 1)[1]) for line in body.splitlines() if line.startswith(prefix))
+
+
+def test_metrics_endpoint(client, db, test_pereval_data):
+    instrument_engine(db.get_bind().engine, "test")
+    pereval_id = client.post("/submitData/", json=test_pereval_data).json()["id"]
+    client.get(f"/submitData/{pereval_id}")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    labels = 'method="GET",route="/submitData/{pereval_id}"'
+    assert _sample(body, f'fstr_http_request_duration_seconds_count{{{labels},status="200"}}') >= 1
+    assert _sample(body, f'fstr_http_request_queries_sum{{{labels}}}') >= 1
+    assert _sample(body, f'fstr_http_request_db_seconds_count{{{labels}}}') >= 1
+    assert "fstr_cache_misses_total" in body
+
+
+def test_query_count_warning(tmp_path, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", poolclass=QueuePool, pool_size=2, max_overflow=1)
+    instrument_engine(engine, "metrics-test", max_overflow=1)
+
+    def get_db():
+        with Session(engine) as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/items/{count}")
+    def items(count: int, db=Depends(get_db)):
+        for _ in range(count):
+            db.execute(text("select 1"))
+
+    client = TestClient(MetricsMiddleware(app, query_count_warning=3))
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        client.get("/items/3")
+        assert not caplog.records
+        client.get("/items/4")
+    assert "/items/4: 4 SQL-запросов" in caplog.records[0].getMessage()
+
+    body = render_metrics()
+    assert _sample(body, 'fstr_http_request_queries_sum{method="GET",route="/items/{count}"}') >= 7
+    assert _sample(body, 'fstr_db_pool_checkout_wait_seconds_count{engine="metrics-test"}') >= 1
+    assert 'fstr_db_pool_capacity{engine="metrics-test"} 3' in body
+    assert 'fstr_db_pool_saturation{engine="metrics-test"} 0.0' in body
+    engine.dispose()
+
+
+def test_pool_checkout_wait(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'wait.db'}", poolclass=QueuePool, pool_size=1, max_overflow=0)
+    instrument_engine(engine, "wait-test")
+    busy = engine.connect()
+    # Единственное соединение пула занято еще 0.2 с: сессия ждет его
+    threading.Timer(0.2, busy.close).start()
+    with Session(engine) as db:
+        db.execute(text("select 1"))
+        db.execute(text("select 1"))
+
+    body = render_metrics()
+    assert _sample(body, 'fstr_db_pool_checkout_wait_seconds_count{engine="wait-test"}') >= 1
+    assert _sample(body, 'fstr_db_pool_checkout_wait_seconds_sum{engine="wait-test"}') >= 0.2
+    engine.dispose()
+
+
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "Тест", (0.1, 1.0), ("route",))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+
+    assert histogram.render() == [
+        "# HELP test_seconds Тест",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/a",le="0.1"} 1',
+        'test_seconds_bucket{route="/a",le="1.0"} 2',
+        'test_seconds_bucket{route="/a",le="+Inf"} 2',
+        'test_seconds_sum{route="/a"} 0.55',
+        'test_seconds_count{route="/a"} 2',
+    ]
@@ -0,0 +1,140 @@
+import base64
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.crud import PerevalRepository
+from app.database import Base
+from app.schemas import AreaCreate, AreaUpdate, PerevalCreate, PerevalUpdate
+from tests.helpers import make_png
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(__file__)), "alembic.ini")
+# Таблицы, которые растут вместе с каталогом: полный просмотр любой из них - регрессия
+LARGE_TABLES = {"users", "coords", "pereval_added", "pereval_images", "images", "image_blobs", "pereval_changes"}
+
+
+def _alembic_config(url: str) -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("sqlalchemy.url", url)
+    # fileConfig из alembic.ini отключил бы логгеры приложения, которые проверяют другие тесты
+    config.attributes["configure_logger"] = False
+    return config
+
+
+@pytest.fixture(scope="module")
+def migrated_engine(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('migrations') / 'fstr.db'}"
+    command.upgrade(_alembic_config(url), "head")
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def seeded(migrated_engine):
+    Session = sessionmaker(bind=migrated_engine, autoflush=False)
+    with Session() as db:
+        ids = []
+        for i in range(200):
+            ids.append(PerevalRepository.create_pereval(db, PerevalCreate(**{
+                "title": f"Перевал {i}",
+                "user": {"email": f"user{i % 20}@example.com", "fam": "Иванов", "name": "Иван"},
+                "coords": {"latitude": 43 + i / 100, "longitude": 42 + i / 100, "height": 3000},
+                "level": {},
+                "images": [{"img": base64.b64encode(make_png(i)).decode(), "title": "Фото"}] if i % 5 == 0 else [],
+            })).id)
+    return Session, ids
+
+
+def test_migrations_match_models(migrated_engine):
+    with migrated_engine.connect() as connection:
+        diff = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+    assert diff == []
+
+
+def test_migrations_downgrade(tmp_path):
+    config = _alembic_config(f"sqlite:///{tmp_path / 'downgrade.db'}")
+    command.upgrade(config, "head")
+    command.downgrade(config, "base")
+    command.upgrade(config, "head")
+
+
+@contextmanager
+def _full_scans(db):
+    """Собирает таблицы, которые читаются целиком, по EXPLAIN QUERY PLAN каждого выполненного запроса."""
+    executed = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            executed.append((statement, parameters))
+
+    engine = db.get_bind().engine
+    event.listen(engine, "before_cursor_execute", listener)
+    scans = []
+    try:
+        yield scans
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    with engine.connect() as connection:
+        for statement, parameters in executed:
+            plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            for row in plan:
+                match = re.match(r"SCAN (\w+)", row[-1])
+                # псевдонимы SQLAlchemy: users_1, pereval_added_1
+                if match and re.sub(r"_\d+$", "", match.group(1)) in LARGE_TABLES:
+                    scans.append((row[-1], statement))
+
+
+def _plan_cases(ids):
+    since = datetime.now() - timedelta(days=1)
+    return {
+        "detail": lambda db: PerevalRepository.get_pereval_or_404(db, ids[0]),
+        "version": lambda db: PerevalRepository.get_pereval_version_or_404(db, ids[0]),
+        "list": lambda db: PerevalRepository.get_perevals_by_email(db, "user1@example.com", after_id=ids[5]),
+        "list_filtered": lambda db: PerevalRepository.get_perevals_by_email(
+            db, "user1@example.com", status="new", date_from=since),
+        "list_versions": lambda db: PerevalRepository.get_pereval_versions_by_email(
+            db, "user1@example.com", date_from=since, date_to=datetime.now() + timedelta(days=1)),
+        "update_images": lambda db: PerevalRepository.update_pereval(db, ids[5], PerevalUpdate.model_validate(
+            {"title": "Новое название", "images": [{"img": base64.b64encode(make_png(1000)).decode(),
+                                                     "title": "Новое фото"}]})),
+        "image": lambda db: PerevalRepository.read_image_chunk(
+            db, PerevalRepository.get_pereval_or_404(db, ids[10]).images[0].id, 0, 100),
+        "export_status": lambda db: list(PerevalRepository.iter_export(db, status="accepted")),
+        "bbox": lambda db: PerevalRepository.search_perevals_in_bbox(db, 42.0, 43.0, 42.5, 43.5),
+        "radius": lambda db: PerevalRepository.search_perevals_in_radius(db, 43.5, 42.5, 20),
+        "nearest": lambda db: PerevalRepository.search_nearest_perevals(db, 43.5, 42.5, 3),
+        "claim": lambda db: PerevalRepository.claim_perevals(db, "anna", 5),
+        "decision": lambda db: PerevalRepository.decide_perevals(db, ids[:3], "accepted", "anna"),
+        "queue": lambda db: PerevalRepository.get_moderation_queue_stats(db),
+        "sync": lambda db: PerevalRepository.get_changes(db, len(ids) - 5),
+        "sync_user": lambda db: PerevalRepository.get_changes(db, len(ids) - 5, "user1@example.com"),
+        "stats": lambda db: PerevalRepository.get_stats(db, date_from=since.date()),
+        "ingest_replay": lambda db: PerevalRepository.get_ingested_ids(db, ["a" * 32, "b" * 32]),
+        "area_perevals": lambda db: _area_perevals(db, ids),
+    }
+
+
+def _area_perevals(db, ids):
+    caucasus = PerevalRepository.create_area(db, AreaCreate(title="Кавказ"))["id"]
+    elbrus = PerevalRepository.create_area(db, AreaCreate(title="Приэльбрусье"))["id"]
+    PerevalRepository.update_area(db, elbrus, AreaUpdate(parent_id=caucasus))
+    PerevalRepository.update_pereval(db, ids[7], PerevalUpdate(area_id=elbrus))
+    return PerevalRepository.get_area_perevals(db, caucasus, after_id=ids[0])
+
+
+@pytest.mark.parametrize("case", list(_plan_cases([0] * 11)))
+def test_no_full_scans(seeded, case):
+    Session, ids = seeded
+    with Session() as db:
+        with _full_scans(db) as scans:
+            _plan_cases(ids)[case](db)
+    assert scans == []
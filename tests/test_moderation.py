@@ -0,0 +1,66 @@
+from app.models import PerevalAdded
+
+
+def _submit(client, test_pereval_data, count):
+    return [client.post("/submitData/", json=test_pereval_data).json()["id"] for _ in range(count)]
+
+
+def test_claim_takes_oldest_new_once(client, test_pereval_data):
+    ids = _submit(client, test_pereval_data, 5)
+
+    first = client.post("/moderation/claim", json={"moderator": "anna", "limit": 2}).json()
+    second = client.post("/moderation/claim", json={"moderator": "boris", "limit": 10}).json()
+    third = client.post("/moderation/claim", json={"moderator": "anna", "limit": 10}).json()
+
+    assert [item["id"] for item in first] == ids[:2]
+    assert [item["id"] for item in second] == ids[2:]
+    assert {item["status"] for item in first + second} == {"pending"}
+    assert third == []
+    assert client.post("/moderation/claim", json={"moderator": "anna", "limit": 0}).status_code == 422
+
+
+def test_claim_bumps_version(client, test_pereval_data):
+    pereval_id = _submit(client, test_pereval_data, 1)[0]
+    etag = client.get(f"/submitData/{pereval_id}").headers["etag"]
+
+    client.post("/moderation/claim", json={"moderator": "anna"})
+
+    response = client.get(f"/submitData/{pereval_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+    # Запись на модерации редактировать нельзя
+    assert client.patch(f"/submitData/{pereval_id}", json={"title": "Правка"}).status_code == 204
+    assert client.get(f"/submitData/{pereval_id}").json()["title"] == test_pereval_data["title"]
+
+
+def test_decision_updates_in_one_statement(client, db, test_pereval_data):
+    from tests.helpers import capture_sql
+
+    ids = _submit(client, test_pereval_data, 4)
+    client.post("/moderation/claim", json={"moderator": "anna", "limit": 2})
+    db.query(PerevalAdded).filter(PerevalAdded.id == ids[3]).update({"status": "rejected"})
+
+    with capture_sql(db) as statements:
+        response = client.post("/moderation/decision", json={"ids": ids + [10_000], "status": "accepted",
+                                                             "moderator": "boris"})
+    # ids[0] и ids[1] захвачены другим модератором, ids[3] уже отклонен
+    assert response.json() == {"updated": [ids[2]], "skipped": [ids[0], ids[1], ids[3], 10_000]}
+    assert sum(statement.startswith("UPDATE pereval_added") for statement in statements) == 1
+
+    response = client.post("/moderation/decision", json={"ids": ids[:2], "status": "rejected", "moderator": "anna"})
+    assert response.json() == {"updated": ids[:2], "skipped": []}
+    assert client.get(f"/submitData/{ids[0]}").json()["status"] == "rejected"
+
+
+def test_queue_stats(client, test_pereval_data):
+    assert client.get("/moderation/queue").json() == {
+        "new": 0, "pending": 0, "oldest_new_id": None, "oldest_new_date": None, "oldest_new_age_seconds": None}
+
+    ids = _submit(client, test_pereval_data, 3)
+    client.post("/moderation/claim", json={"moderator": "anna", "limit": 1})
+
+    stats = client.get("/moderation/queue").json()
+    assert stats["new"] == 2
+    assert stats["pending"] == 1
+    assert stats["oldest_new_id"] == ids[1]
+    assert 0 <= stats["oldest_new_age_seconds"] < 60
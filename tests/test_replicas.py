@@ -0,0 +1,91 @@
+import copy
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import database
+from app.cache import user_id_cache
+from app.crud import PerevalRepository
+from app.database import Base, get_db, replica_pool
+from app.main import app
+from app.replicas import STICKY_COOKIE
+from app.schemas import PerevalCreate
+
+
+def _file_engine(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def databases(tmp_path, monkeypatch):
+    """Основная БД и две реплики - отдельные файлы SQLite; репликация не настроена, поэтому
+    по содержимому видно, откуда прочитан ответ."""
+    primary = _file_engine(tmp_path / "primary.db")
+    replicas = [_file_engine(tmp_path / f"replica{index}.db") for index in range(2)]
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=primary))
+    # Фикстура client подменяет get_db тестовой сессией; здесь нужна настоящая маршрутизация
+    monkeypatch.setitem(app.dependency_overrides, get_db, get_db)
+    replica_pool.set_engines(replicas)
+    yield primary, replicas
+    replica_pool.set_engines([])
+    for engine in (primary, *replicas):
+        engine.dispose()
+
+
+def _submit(client, data, title):
+    data = copy.deepcopy(data)
+    data["title"] = title
+    response = client.post("/submitData/", json=data)
+    assert response.status_code == 201, response.text
+    return response
+
+
+def _titles(client, email):
+    response = client.get("/submitData/", params={"user__email": email})
+    assert response.status_code == 200, response.text
+    return [item["title"] for item in response.json()]
+
+
+def test_reads_go_to_replicas_round_robin(databases, test_pereval_data):
+    _, replicas = databases
+    email = test_pereval_data["user"]["email"]
+    for index, engine in enumerate(replicas):
+        user_id_cache.clear()  # в каждом файле пользователь создается заново
+        with sessionmaker(bind=engine)() as db:
+            PerevalRepository.create_pereval(db, PerevalCreate(**{**test_pereval_data, "title": f"реплика {index}"}))
+
+    client = TestClient(app)
+    assert [_titles(client, email) for _ in range(4)] == [["реплика 0"], ["реплика 1"]] * 2
+
+
+def test_client_reads_own_writes_from_primary(databases, test_pereval_data):
+    email = test_pereval_data["user"]["email"]
+    client = TestClient(app)
+
+    response = _submit(client, test_pereval_data, "новый")
+    assert STICKY_COOKIE in response.cookies
+    # Запись на основной БД; реплики ее еще не получили, но автор видит ее сразу
+    assert _titles(client, email) == ["новый"]
+    assert client.get(f"/submitData/{response.json()['id']}").status_code == 200
+
+    other_client = TestClient(app)
+    assert _titles(other_client, email) == []
+
+    client.cookies.set(STICKY_COOKIE, "0")  # срок истек
+    assert _titles(client, email) == []
+
+
+def test_unhealthy_replica_falls_back(databases, test_pereval_data, tmp_path):
+    primary, replicas = databases
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    replica_pool.set_engines([broken])
+    _submit(TestClient(app), test_pereval_data, "основная")
+
+    assert _titles(TestClient(app), test_pereval_data["user"]["email"]) == ["основная"]
+    assert replica_pool.is_down(broken)
+
+    replica_pool.set_engines([broken, replicas[0]])
+    replica_pool.connect()  # broken снова недоступна, берется следующая
+    assert replica_pool.is_down(broken)
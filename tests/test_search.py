@@ -0,0 +1,111 @@
+import copy
+import pytest
+from sqlalchemy.dialects import postgresql
+from app.crud import _text_search_postgresql_query
+from app.search import NgramIndex, normalize, search_text
+
+
+@pytest.fixture
+def titled(client, test_pereval_data):
+    titles = {
+        "kazbek": ("Казбек", None),
+        "dzhantugan": ("Джантуган", "Перевал Джантуган"),
+        "tsey": ("Цей", None),
+        "elbrus": ("Elbrus Saddle", "Седловина Эльбруса"),
+    }
+    ids = {}
+    for name, (title, other_titles) in titles.items():
+        data = copy.deepcopy(test_pereval_data)
+        data["title"] = title
+        data["other_titles"] = other_titles
+        ids[name] = client.post("/submitData/", json=data).json()["id"]
+    return ids
+
+
+def _found(client, q, **params):
+    response = client.get("/perevals/search", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return [item["id"] for item in response.json()]
+
+
+def test_normalize_transliterates_cyrillic():
+    assert normalize("Казбек") == normalize("Kazbek") == "kazbek"
+    assert normalize("Цей") == normalize("Tsey") == "cei"
+    assert normalize("Джантуган") == normalize("Dzhantugan")
+    assert search_text("Перевал  Юный!", None, "") == "yunyi"
+
+
+@pytest.mark.parametrize("q, name", [
+    ("Kazbek", "kazbek"),
+    ("казбэк", "kazbek"),
+    ("Dzhantugan", "dzhantugan"),
+    ("джантугн", "dzhantugan"),
+    ("Tsey", "tsey"),
+    ("эльбрус", "elbrus"),
+])
+def test_search_by_title(client, titled, q, name):
+    assert _found(client, q)[0] == titled[name]
+
+
+def test_search_results_are_ranked(client, titled):
+    response = client.get("/perevals/search", params={"q": "казбек"})
+    scores = [item["score"] for item in response.json()]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == 1.0
+    assert _found(client, "совсем другое") == []
+
+
+def test_search_applies_height_filter(client, titled):
+    assert _found(client, "kazbek", height_min=3000) == [titled["kazbek"]]
+    assert _found(client, "kazbek", height_min=4000) == []
+
+
+def test_search_sees_updated_title(client, titled):
+    _found(client, "kazbek")  # индекс построен до правки
+    client.patch(f"/submitData/{titled['tsey']}", json={"title": "Ушба"})
+
+    assert _found(client, "ushba") == [titled["tsey"]]
+    assert titled["tsey"] not in _found(client, "Цей")
+
+
+def test_search_rejects_mixed_modes(client):
+    assert client.get("/perevals/search", params={"q": "kazbek", "bbox": "41,42,45,44"}).status_code == 400
+    assert client.get("/perevals/search", params={"q": "k"}).status_code == 422
+
+
+def test_index_applies_updates_made_during_build():
+    index = NgramIndex()
+
+    def rows():
+        index.add(2, "ushba")  # пришло во время построения
+        return [(1, "kazbek"), (2, "cei")]
+
+    index.load(rows)
+    assert index.search("ushba", 10) == [(2, 1.0)]
+    assert index.search("cei", 10) == []
+
+
+def test_index_checks_at_most_max_checked():
+    class CountingDict(dict):
+        reads = 0
+
+        def __getitem__(self, key):
+            CountingDict.reads += 1
+            return super().__getitem__(key)
+
+    index = NgramIndex(max_checked=50)
+    index.load(lambda: [(i, f"kazbet {i}") for i in range(1, 1001)] + [(5000, "kazbek")])
+    index._documents = CountingDict(index._documents)
+
+    # Точное совпадение содержит самые редкие триграммы запроса и проверяется первым
+    found = index.search("kazbek", 10)
+    assert found[0] == (5000, 1.0) and len(found) == 10
+    assert CountingDict.reads <= 2 * 50
+
+
+def test_postgresql_query_uses_indexed_expressions(db):
+    sql = str(_text_search_postgresql_query(db, "Казбек", 10, None, None).statement.compile(
+        dialect=postgresql.dialect()))
+    # Выражения должны совпадать с индексами миграции 0005
+    assert "to_tsvector('simple', coalesce(pereval_added.search_text, ''))" in sql
+    assert "%(param_1)s <%% pereval_added.search_text" in sql
@@ -0,0 +1,71 @@
+import copy
+from datetime import datetime, timedelta, timezone
+from app.crud import PerevalRepository
+from tests.helpers import capture_sql
+
+
+def _pereval(data, height, **levels):
+    data = copy.deepcopy(data)
+    data["coords"]["height"] = height
+    data["level"] = levels
+    return data
+
+
+def _stats(client, **params):
+    response = client.get("/stats", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_stats_empty(client):
+    assert _stats(client) == {"total": 0, "status": {}, "height": {}, "day": {},
+                              "level": {"spring": {}, "summer": {}, "autumn": {}, "winter": {}}}
+
+
+def test_stats_follow_every_write_path(client, test_pereval_data):
+    first = client.post("/submitData/", json=_pereval(test_pereval_data, 3200, summer="1А")).json()["id"]
+    client.post("/submitData/batch", json=[_pereval(test_pereval_data, 2900, summer="1А", winter="2Б"),
+                                            _pereval(test_pereval_data, 3499, spring="1Б")])
+    second = client.post("/submitData/", json=_pereval(test_pereval_data, 4100)).json()["id"]
+
+    client.patch(f"/submitData/{second}", json={"coords": {"latitude": 45.0, "longitude": 7.0, "height": 2600},
+                                                "level": {"spring": "3А", "autumn": "2А"}})
+    client.post("/moderation/claim", json={"moderator": "anna", "limit": 2})
+    client.post("/moderation/decision", json={"ids": [first], "status": "accepted"})
+    client.post("/moderation/decision", json={"ids": [second], "status": "rejected"})
+
+    today = datetime.now(timezone.utc).date().isoformat()
+    stats = _stats(client)
+    assert stats == {
+        "total": 4,
+        "status": {"new": 1, "pending": 1, "accepted": 1, "rejected": 1},
+        "level": {"spring": {"1Б": 1, "3А": 1}, "summer": {"1А": 2}, "autumn": {"2А": 1}, "winter": {"2Б": 1}},
+        "height": {"2500-3000": 2, "3000-3500": 2},
+        "day": {today: 4},
+    }
+
+
+def test_rebuild_matches_incremental(client, db, test_pereval_data):
+    ids = [client.post("/submitData/", json=_pereval(test_pereval_data, 1000 + 700 * index, summer="1А"))
+           .json()["id"] for index in range(4)]
+    client.patch(f"/submitData/{ids[0]}", json={"level": {"summer": "2Б"}})
+    client.post("/moderation/decision", json={"ids": ids[:2], "status": "accepted"})
+    incremental = _stats(client)
+
+    assert PerevalRepository.rebuild_stats(db) == {"perevals": 4, "buckets": 9}
+    assert _stats(client) == incremental
+
+
+def test_stats_do_not_read_perevals(client, db, test_pereval_data):
+    client.post("/submitData/batch", json=[test_pereval_data] * 3)
+    with capture_sql(db) as statements:
+        assert _stats(client)["total"] == 3
+    assert not any("pereval_added" in statement for statement in statements)
+
+
+def test_stats_day_range(client, test_pereval_data):
+    client.post("/submitData/", json=test_pereval_data)
+    today = datetime.now(timezone.utc).date()
+    assert _stats(client, date_from=(today + timedelta(days=1)).isoformat()) == {
+        **_stats(client), "day": {}}
+    assert _stats(client, date_to=today.isoformat())["day"] == {today.isoformat(): 1}
@@ -0,0 +1,258 @@
+import base64
+import hashlib
+import io
+import os
+from contextlib import contextmanager
+import pytest
+from PIL import Image as PILImage
+from sqlalchemy import event
+from app import storage
+from app.crud import PerevalRepository
+from app.models import Image, ImageBlob, ImageBlobChunk
+from tests.helpers import make_png
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    local = storage.LocalImageStorage(str(tmp_path / "images"))
+    monkeypatch.setattr(storage, "image_storage", local)
+    return local
+
+
+def _with_images(data, *images):
+    return dict(data, images=[{"img": base64.b64encode(img).decode(), "title": f"Фото {i}"}
+                              for i, img in enumerate(images)])
+
+
+def _blob_files(root):
+    return [name for _, _, names in os.walk(root) for name in names]
+
+
+def test_identical_uploads_stored_once(client, db, local_storage, test_pereval_data):
+    img_bytes = make_png(5, 32, 32)
+    content_hash = hashlib.sha256(img_bytes).hexdigest()
+
+    first = client.post("/submitData/", json=_with_images(test_pereval_data, img_bytes)).json()["id"]
+    client.post("/submitData/", json=_with_images(test_pereval_data, img_bytes))
+
+    thumbnail_hash = db.query(Image.thumbnail_hash).filter(Image.content_hash == content_hash).limit(1).scalar()
+    assert sorted(_blob_files(local_storage.root)) == sorted([content_hash, thumbnail_hash])
+    assert os.path.exists(os.path.join(local_storage.root, content_hash[:2], content_hash[2:4], content_hash))
+    blob = db.get(ImageBlob, content_hash)
+    assert blob.ref_count == 2
+    assert blob.mime_type == "image/png"
+
+    image = client.get(f"/submitData/{first}").json()["images"][0]
+    response = client.get(image["url"], headers={"Range": "bytes=0-7"})
+    assert response.content == img_bytes[:8]
+    assert response.headers["content-type"] == "image/png"
+
+
+def test_replaced_images_are_collected(client, db, local_storage, test_pereval_data):
+    old_bytes, new_bytes = make_png(1), make_png(2)
+    pereval_id = client.post("/submitData/", json=_with_images(test_pereval_data, old_bytes)).json()["id"]
+
+    update = _with_images({}, new_bytes)
+    assert client.patch(f"/submitData/{pereval_id}", json=update).json()["state"] == 1
+
+    old_hash = hashlib.sha256(old_bytes).hexdigest()
+    assert db.get(ImageBlob, old_hash).ref_count == 0
+
+    # Вместе с изображением освобождается и его миниатюра
+    result = storage.collect_garbage(db, grace_seconds=0)
+    assert result == {"blobs": 2, "orphans": 0}
+    assert db.get(ImageBlob, old_hash) is None
+    new_image = db.query(Image).filter(Image.content_hash == hashlib.sha256(new_bytes).hexdigest()).one()
+    assert sorted(_blob_files(local_storage.root)) == sorted([new_image.content_hash, new_image.thumbnail_hash])
+
+
+def test_gc_removes_orphan_files(db, local_storage):
+    orphan = local_storage.path("ab" * 32)
+    os.makedirs(os.path.dirname(orphan))
+    open(orphan, "wb").close()
+
+    assert storage.collect_garbage(db, grace_seconds=3600)["orphans"] == 0
+    assert storage.collect_garbage(db, grace_seconds=0)["orphans"] == 1
+    assert not os.path.exists(orphan)
+
+
+def test_migrate_legacy_images(db, local_storage):
+    legacy = [make_png(seed) for seed in (1, 2, 1)]
+    db.add_all(Image(img=img, title="Старое фото") for img in legacy)
+    db.commit()
+
+    assert PerevalRepository.migrate_legacy_images(db, batch_size=2) == 3
+
+    images = db.query(Image).order_by(Image.id).all()
+    assert all(image.img is None for image in images)
+    assert [image.content_hash for image in images] == [hashlib.sha256(img).hexdigest() for img in legacy]
+    assert db.get(ImageBlob, images[0].content_hash).ref_count == 2
+    assert len(_blob_files(local_storage.root)) == 2
+
+
+def test_migrated_images_change_the_pereval(client, db, local_storage, test_pereval_data):
+    legacy = make_png(3)
+    pereval_id = client.post("/submitData/", json=_with_images(test_pereval_data, legacy)).json()["id"]
+    # Изображение как до хранилища по SHA-256: содержимое в images.img
+    db.query(Image).update({"img": legacy, "content_hash": None, "size": None, "mime_type": None})
+    db.commit()
+    response = client.get(f"/submitData/{pereval_id}")
+    assert response.json()["images"][0]["content_hash"] is None
+
+    assert PerevalRepository.migrate_legacy_images(db) == 1
+
+    response = client.get(f"/submitData/{pereval_id}", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 200
+    assert response.json()["images"][0]["content_hash"] == hashlib.sha256(legacy).hexdigest()
+
+
+def test_concurrent_first_upload_of_same_content(db):
+    data = make_png(9)
+    content_hash = hashlib.sha256(data).hexdigest()
+
+    checks = []
+
+    def insert_after_check(conn, cursor, statement, *args):
+        # Другая транзакция записала то же содержимое между проверкой и INSERT
+        if statement.lstrip().startswith("SELECT image_blobs.content_hash") and not checks:
+            checks.append(statement)
+            cursor.connection.execute("INSERT INTO image_blobs (content_hash, size, ref_count) VALUES (?, ?, 1)",
+                                      (content_hash, len(data)))
+
+    engine = db.get_bind().engine
+    event.listen(engine, "after_cursor_execute", insert_after_check)
+    try:
+        storage.store_blob(db, io.BytesIO(data))
+    finally:
+        event.remove(engine, "after_cursor_execute", insert_after_check)
+    assert db.get(ImageBlob, content_hash).ref_count == 2
+
+
+def test_garbage_collected_between_check_and_update(db):
+    data = os.urandom(3000)
+    content_hash = storage.store_blob(db, io.BytesIO(data), storage.DatabaseImageStorage()).content_hash
+    storage.release_blobs(db, [content_hash])
+    db.commit()
+
+    checks = []
+
+    def collect_after_check(conn, cursor, statement, *args):
+        # Сборщик мусора удалил освобожденное содержимое между проверкой и UPDATE счетчика
+        if statement.lstrip().startswith("SELECT image_blobs.content_hash") and not checks:
+            checks.append(statement)
+            cursor.connection.execute("DELETE FROM image_blob_chunks WHERE content_hash = ?", (content_hash,))
+            cursor.connection.execute("DELETE FROM image_blobs WHERE content_hash = ?", (content_hash,))
+
+    engine = db.get_bind().engine
+    event.listen(engine, "after_cursor_execute", collect_after_check)
+    try:
+        storage.store_blob(db, io.BytesIO(data), storage.DatabaseImageStorage())
+    finally:
+        event.remove(engine, "after_cursor_execute", collect_after_check)
+    db.commit()
+
+    blob = db.get(ImageBlob, content_hash)
+    assert blob.ref_count == 1
+    assert storage.DatabaseImageStorage().read(db, blob, 0, len(data)) == data
+    assert storage.collect_garbage(db, grace_seconds=0)["blobs"] == 0
+
+
+def test_gc_keeps_rewritten_files(db, local_storage):
+    data = make_png(4)
+    content_hash = storage.store_blob(db, io.BytesIO(data)).content_hash
+    storage.release_blobs(db, [content_hash])
+    db.commit()
+    path = local_storage.path(content_hash)
+    os.utime(path, (0, 0))
+
+    # Строка удалена сборщиком, но файл до его прохода по файлам снова записан store_blobs
+    db.query(ImageBlob).delete()
+    db.commit()
+    local_storage.write(db, ImageBlob(content_hash=content_hash), io.BytesIO(data))
+    assert storage.collect_garbage(db, grace_seconds=3600)["orphans"] == 0
+    assert os.path.exists(path)
+
+
+def test_database_storage_reads_ranges_across_chunks(db, monkeypatch):
+    monkeypatch.setattr(storage, "IMAGE_CHUNK_SIZE", 1000)
+    monkeypatch.setattr(storage, "CHUNKS_PER_INSERT", 2)
+    data = os.urandom(4500)
+    info = storage.store_blob(db, io.BytesIO(data), storage.DatabaseImageStorage())
+    db.commit()
+
+    blob = db.get(ImageBlob, info.content_hash)
+    assert blob.chunk_size == 1000 and blob.data is None
+    assert db.query(ImageBlobChunk).filter(ImageBlobChunk.content_hash == info.content_hash).count() == 5
+    database = storage.DatabaseImageStorage()
+    for offset, length in ((0, 4500), (999, 2), (1500, 2000), (4000, 1000), (10, 0)):
+        assert database.read(db, blob, offset, length) == data[offset:offset + length]
+
+    storage.release_blobs(db, [info.content_hash])
+    db.commit()
+    assert storage.collect_garbage(db, grace_seconds=0)["blobs"] == 1
+    assert db.query(ImageBlobChunk).count() == 0
+
+
+def _noise_png(size: int = 200) -> bytes:
+    output = io.BytesIO()
+    # Случайные пиксели: PNG почти не сжимается, и содержимое каждый раз разное
+    PILImage.frombytes("RGB", (size, size), os.urandom(size * size * 3)).save(output, "PNG")
+    return output.getvalue()
+
+
+@contextmanager
+def _bytes_written(db):
+    """Суммарный размер значений, переданных в INSERT и UPDATE."""
+    written = [0]
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE")):
+            for row in parameters if executemany else [parameters]:
+                values = row.values() if isinstance(row, dict) else row
+                written[0] += sum(len(value) for value in values if isinstance(value, (bytes, memoryview, str)))
+
+    engine = db.get_bind().engine
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield written
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_image_update_writes_only_the_change(client, db, test_pereval_data):
+    first, second, third, replacement = (_noise_png() for _ in range(4))
+    pereval_id = client.post("/submitData/", json=_with_images(test_pereval_data, first, second, third)).json()["id"]
+    before = client.get(f"/submitData/{pereval_id}").json()["images"]
+
+    # Изменилось только название второго изображения
+    update = _with_images({}, first, second, third)
+    update["images"][1]["title"] = "Седловина"
+    with _bytes_written(db) as written:
+        assert client.patch(f"/submitData/{pereval_id}", json=update).json()["state"] == 1
+    assert written[0] < 2000
+    after = client.get(f"/submitData/{pereval_id}").json()["images"]
+    assert [image["id"] for image in after] == [image["id"] for image in before]
+    assert [image["title"] for image in after] == ["Фото 0", "Седловина", "Фото 2"]
+
+    # Одно изображение заменено: записывается одно новое содержимое и его миниатюра
+    with _bytes_written(db) as written:
+        response = client.patch(f"/submitData/{pereval_id}", json=_with_images({}, first, replacement, third))
+        assert response.json()["state"] == 1, response.text
+    assert len(replacement) < written[0] < len(replacement) * 1.5
+    after = client.get(f"/submitData/{pereval_id}").json()["images"]
+    # Порядок - как в запросе: новое изображение на месте замененного
+    assert [after[0]["id"], after[2]["id"]] == [before[0]["id"], before[2]["id"]]
+    assert client.get(after[1]["url"]).content == replacement
+
+    # Перестановка меняет только позиции
+    with _bytes_written(db) as written:
+        response = client.patch(f"/submitData/{pereval_id}", json=_with_images({}, third, first, replacement))
+        assert response.json()["state"] == 1, response.text
+    assert written[0] < 2000
+    reordered = client.get(f"/submitData/{pereval_id}").json()["images"]
+    assert [image["id"] for image in reordered] == [after[2]["id"], after[0]["id"], after[1]["id"]]
+
+    # Содержимое удаленного изображения и его миниатюры освобождено
+    removed = db.get(ImageBlob, hashlib.sha256(second).hexdigest())
+    assert removed.ref_count == 0
+    assert storage.collect_garbage(db, grace_seconds=0)["blobs"] == 2
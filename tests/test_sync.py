@@ -0,0 +1,110 @@
+import copy
+from datetime import datetime, timedelta, timezone
+import pytest
+from app import crud
+from app.crud import PerevalRepository
+from app.models import PerevalChange
+
+
+def _submit(client, data, title, email=None):
+    data = copy.deepcopy(data)
+    data["title"] = title
+    if email:
+        data["user"]["email"] = email
+    return client.post("/submitData/", json=data).json()["id"]
+
+
+def _sync(client, since, **params):
+    response = client.get("/sync", params={"since": since, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture(autouse=True)
+def no_settle(monkeypatch):
+    # В тестах все изменения уже зафиксированы: курсор может сдвигаться сразу
+    monkeypatch.setattr(crud, "SYNC_SETTLE_SECONDS", -3600)
+
+
+def test_sync_returns_changes_after_cursor(client, test_pereval_data):
+    first = _submit(client, test_pereval_data, "Первый")
+    second = _submit(client, test_pereval_data, "Второй")
+
+    initial = _sync(client, 0)
+    assert [item["id"] for item in initial["changes"]] == [first, second]
+    assert initial["has_more"] is False
+    assert _sync(client, initial["cursor"])["changes"] == []
+
+    client.patch(f"/submitData/{first}", json={"title": "Первый, правка"})
+    client.post("/moderation/decision", json={"ids": [second], "status": "accepted"})
+    delta = _sync(client, initial["cursor"])
+    assert [(item["id"], item["title"], item["status"], item["version"]) for item in delta["changes"]] == [
+        (first, "Первый, правка", "new", 2), (second, "Второй", "accepted", 2)]
+    assert delta["cursor"] > initial["cursor"]
+
+
+def test_sync_filters_by_user_and_pages(client, test_pereval_data):
+    ids = [_submit(client, test_pereval_data, f"Перевал {index}") for index in range(5)]
+    _submit(client, test_pereval_data, "Чужой", email="other@example.com")
+
+    email = test_pereval_data["user"]["email"]
+    page = _sync(client, 0, user__email=email, limit=3)
+    assert [item["id"] for item in page["changes"]] == ids[:3]
+    assert page["has_more"] is True
+    rest = _sync(client, page["cursor"], user__email=email, limit=3)
+    assert [item["id"] for item in rest["changes"]] == ids[3:]
+    assert rest["has_more"] is False
+    assert _sync(client, 0, user__email="nobody@example.com") == {"cursor": 0, "has_more": False,
+                                                                    "retry_after": None, "changes": []}
+
+
+def test_every_write_path_is_logged(client, db, test_pereval_data):
+    pereval_id = _submit(client, test_pereval_data, "Один")
+    client.post("/submitData/batch", json=[test_pereval_data])
+    client.patch(f"/submitData/{pereval_id}", json={"title": "Правка"})
+    client.post("/moderation/claim", json={"moderator": "anna", "limit": 1})
+    client.post("/moderation/decision", json={"ids": [pereval_id], "status": "rejected", "moderator": "anna"})
+
+    logged = db.query(PerevalChange.pereval_id, PerevalChange.version).order_by(PerevalChange.seq).all()
+    assert [tuple(row) for row in logged] == [(pereval_id, 1), (pereval_id + 1, 1), (pereval_id, 2),
+                                              (pereval_id, 3), (pereval_id, 4)]
+
+
+def test_recent_changes_do_not_move_cursor(client, test_pereval_data, monkeypatch):
+    monkeypatch.setattr(crud, "SYNC_SETTLE_SECONDS", 3600)
+    pereval_id = _submit(client, test_pereval_data, "Свежий")
+
+    result = _sync(client, 0)
+    assert [item["id"] for item in result["changes"]] == [pereval_id]
+    assert result["cursor"] == 0
+
+
+def test_unsettled_page_is_not_replayed(client, db, test_pereval_data, monkeypatch):
+    monkeypatch.setattr(crud, "SYNC_SETTLE_SECONDS", 3600)
+    settled = _submit(client, test_pereval_data, "Старый")
+    for index in range(3):
+        _submit(client, test_pereval_data, f"Свежий {index}")
+    change = db.query(PerevalChange).filter(PerevalChange.pereval_id == settled).one()
+    change.changed_at = datetime.now(timezone.utc) - timedelta(hours=2)
+    db.commit()
+
+    # Полная порция из одних неустоявшихся изменений: сразу запрашивать ее снова незачем
+    response = client.get("/sync", params={"since": change.seq, "limit": 2})
+    result = response.json()
+    assert result["cursor"] == change.seq and result["has_more"] is False
+    assert 3500 < result["retry_after"] <= 3600
+    assert response.headers["retry-after"] == str(result["retry_after"])
+
+    # Курсор доходит до последнего устоявшегося изменения
+    result = _sync(client, 0, limit=2)
+    assert result["changes"][0]["id"] == settled
+    assert result["cursor"] == change.seq and result["has_more"] is False
+
+
+def test_prune_keeps_latest_change(client, db, test_pereval_data):
+    pereval_id = _submit(client, test_pereval_data, "Один")
+    for index in range(3):
+        client.patch(f"/submitData/{pereval_id}", json={"title": f"Правка {index}"})
+
+    assert PerevalRepository.prune_changes(db, timedelta(days=-1)) == 3
+    assert [item["version"] for item in _sync(client, 0)["changes"]] == [4]
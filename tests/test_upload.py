@@ -0,0 +1,53 @@
+import json
+from tests.helpers import make_png
+
+
+def test_submit_multipart(client, test_pereval_data):
+    first, second = make_png(1), make_png(2)
+    response = client.post(
+        "/submitData/upload",
+        data={"data": json.dumps(test_pereval_data), "titles": ["Подъем"]},
+        files=[("images", ("up.png", first, "image/png")), ("images", ("down.png", second, "image/png"))],
+    )
+    assert response.status_code == 201
+    pereval_id = response.json()["id"]
+
+    images = client.get(f"/submitData/{pereval_id}").json()["images"]
+    assert [image["title"] for image in images] == ["Подъем", "down.png"]
+    assert client.get(images[0]["url"]).content == first
+    assert client.get(images[1]["url"]).content == second
+
+
+def test_submit_multipart_invalid_data(client, test_pereval_data):
+    del test_pereval_data["title"]
+    response = client.post("/submitData/upload", data={"data": json.dumps(test_pereval_data)})
+    assert response.status_code == 422
+
+
+def test_submit_invalid_base64_rejected(client, test_pereval_data):
+    test_pereval_data["images"] = [{"img": "это не base64", "title": "Фото"}]
+    response = client.post("/submitData/", json=test_pereval_data)
+    assert response.status_code == 400
+
+
+def test_update_multipart_replaces_images(client, test_pereval_data):
+    response = client.post(
+        "/submitData/upload",
+        data={"data": json.dumps(test_pereval_data)},
+        files=[("images", ("old.png", make_png(1), "image/png"))],
+    )
+    pereval_id = response.json()["id"]
+
+    new_image = make_png(3)
+    response = client.patch(
+        f"/submitData/{pereval_id}/upload",
+        data={"data": json.dumps({"title": "Новое название"})},
+        files=[("images", ("new.png", new_image, "image/png"))],
+    )
+    assert response.status_code == 200
+    assert response.json()["state"] == 1
+
+    pereval = client.get(f"/submitData/{pereval_id}").json()
+    assert pereval["title"] == "Новое название"
+    assert [image["title"] for image in pereval["images"]] == ["new.png"]
+    assert client.get(pereval["images"][0]["url"]).content == new_image